@@ -0,0 +1,145 @@
+# Crawl archive: every analyzed page, with what the rules read from it.
+#
+# With CRAWL_ARCHIVE_DIR set, each crawled page is appended after its analysis
+# (before its raw DOM is released) as one JSON record: rendered text, HTML or
+# located nodes, metadata and the issues found at the time. After the last page
+# of a site a "crawl" record closes it. Each process writes its own file, one
+# gzip stream shared by all its records (pages of a site repeat most of their
+# markup, so this compresses far better than one stream per record), rotated
+# daily:
+#   <dir>/crawl-<YYYYMMDD>-<HHMMSS>-<pid>.jsonl.gz
+# Every record is flushed (Z_SYNC_FLUSH) as it is written, so a crash only
+# costs the gzip trailer: readers get every record up to the cut.
+# replay.py re-runs the current rules over these records, without a browser.
+# Pages reused from an earlier scan (incremental) or served from the crawl
+# cache have no DOM left and are not archived again.
+
+import datetime
+import glob
+import gzip
+import json
+import os
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .cache import RULES_VERSION, content_digest
+
+CRAWL_ARCHIVE_DIR = os.getenv("CRAWL_ARCHIVE_DIR", "")  # empty: no archive
+CRAWL_ARCHIVE_MAX_AGE = int(os.getenv("CRAWL_ARCHIVE_MAX_AGE", str(90 * 24 * 3600)))  # seconds
+CRAWL_ARCHIVE_LEVEL = int(os.getenv("CRAWL_ARCHIVE_LEVEL", "6"))  # gzip compression, 1-9
+
+FORMAT_VERSION = 1
+
+# Page keys kept in the archive, besides the DOM and the issues
+PAGE_KEYS = ("url", "order", "text", "screenshot", "crops", "tier", "network")
+
+
+class CrawlArchive:
+    """Appends page and crawl records to the day's archive file of this process."""
+
+    def __init__(self, directory: str = CRAWL_ARCHIVE_DIR, level: int = CRAWL_ARCHIVE_LEVEL,
+                 max_age: int = CRAWL_ARCHIVE_MAX_AGE):
+        self.directory = directory
+        self.level = level
+        self.max_age = max_age
+        self.pages = 0
+        self.bytes = 0
+        self._path: Optional[str] = None
+        self._day: Optional[datetime.date] = None
+        self._file = None
+        self._compressor = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def add_page(self, crawl: str, page: Dict, issues: List[Dict]) -> bool:
+        """Archives a page that still has its DOM ('html' or 'nodes'); False when it has none."""
+        if "html" not in page and "nodes" not in page:
+            return False
+        record = {"type": "page", "crawl": crawl, "content_digest": content_digest(page), "issues": issues}
+        record.update((key, page[key]) for key in PAGE_KEYS if key in page)
+        record.update((key, page[key]) for key in ("html", "nodes") if key in page)
+        self._write(record)
+        self.pages += 1
+        return True
+
+    def add_crawl(self, crawl: str, pages: List[Dict], result: Dict):
+        """Closes a crawl: its site (the first page in crawl order) and the score it got."""
+        if not pages:
+            return
+        site = min(pages, key=lambda page: page.get("order", []))["url"]
+        self._write({"type": "crawl", "crawl": crawl, "site": site, "pages": len(pages),
+                     "score": result["score"], "status": result["status"]})
+
+    def close(self):
+        """Ends the current file (gzip trailer included)."""
+        with self._lock:
+            self._close()
+
+    def stats(self) -> Dict:
+        return {"directory": self.directory, "pages": self.pages, "bytes": self.bytes, "file": self._path}
+
+    def _write(self, record: Dict):
+        record.update(v=FORMAT_VERSION, rules_version=RULES_VERSION, archived_at=time.time())
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            if self._day != datetime.date.today():
+                self._open()
+            data = self._compressor.compress(line) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+            self._file.write(data)
+            self._file.flush()
+            self.bytes += len(data)
+
+    def _open(self):
+        self._close()
+        now = datetime.datetime.now()
+        self._day = now.date()
+        self._path = os.path.join(self.directory, f"crawl-{now:%Y%m%d-%H%M%S}-{os.getpid()}.jsonl.gz")
+        self._file = open(self._path, "wb")
+        self._compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip format
+        self._prune()
+
+    def _close(self):
+        if self._file is not None:
+            self._file.write(self._compressor.flush())
+            self._file.close()
+            self._file = None
+            self._day = None
+
+    def _prune(self):
+        cutoff = time.time() - self.max_age
+        for path in glob.glob(os.path.join(self.directory, "crawl-*.jsonl.gz")):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+def archive_files(paths: Iterable[str]) -> List[str]:
+    """Archive files from file and directory arguments, oldest first."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, "crawl-*.jsonl.gz")))
+        else:
+            files.append(path)
+    return sorted(files, key=lambda path: (os.path.basename(path), path))
+
+
+def read_records(files: Iterable[str]) -> Iterator[Dict]:
+    """
+    Every record of the given archive files, in write order per file. Files still
+    being written (or cut short by a crash) are read up to their last whole record.
+    """
+    for path in files:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            try:
+                for line in f:
+                    if line.endswith("\n"):
+                        yield json.loads(line)
+            except EOFError:
+                print(f"Archive {path}: no gzip trailer (still open or cut short), read up to its end")
+            except (gzip.BadGzipFile, zlib.error, json.JSONDecodeError) as e:
+                print(f"Archive {path}: stopped at a damaged record ({type(e).__name__})")
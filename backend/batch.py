@@ -0,0 +1,178 @@
+"""
+Portfolio scanning: analyzes many sites with global and per-host concurrency
+limits over one shared browser pool, streaming a JSONL record per finished site.
+
+Usage (from the repository root):
+    python -m backend.batch sites.txt -o results.jsonl [--incremental]
+
+Re-running with the same output file resumes: sites that already have a
+successful record are skipped, failed ones are retried.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+from urllib.parse import urlparse
+
+from .urls import normalize_url
+
+# Sites analyzed at once, and at once per host (several sites can share a host)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_PER_HOST_LIMIT = int(os.getenv("BATCH_PER_HOST_LIMIT", "1"))
+
+# Site analyzer signature: url -> analysis result (see compliance.analyze_compliance)
+SiteAnalyzer = Callable[[str], Awaitable[Dict]]
+
+
+def read_urls(lines: Iterable[str]) -> List[str]:
+    """URLs from a list or file lines; blank lines, '#' comments and duplicates are dropped."""
+    urls = []
+    seen = set()
+    for line in lines:
+        url = line.split("#", 1)[0].strip()
+        if not url:
+            continue
+        if "://" not in url:
+            url = "https://" + url
+        if normalize_url(url) not in seen:
+            seen.add(normalize_url(url))
+            urls.append(url)
+    return urls
+
+
+def finished_urls(path: str) -> Set[str]:
+    """Normalized URLs that already have a successful record in a JSONL output file."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # line cut short by an interruption
+            if record.get("ok"):
+                done.add(normalize_url(record["url"]))
+    return done
+
+
+async def run_batch(urls: List[str], analyze: SiteAnalyzer, concurrency: int = BATCH_CONCURRENCY,
+                    per_host_limit: int = BATCH_PER_HOST_LIMIT,
+                    skip: Optional[Set[str]] = None) -> AsyncIterator[Dict]:
+    """
+    Analyzes every URL (except normalized URLs in `skip`) and yields one record per
+    site as soon as it finishes:
+    {'url', 'ok', 'result' or 'error', 'elapsed_ms', 'finished_at'}
+    """
+    skip = skip or set()
+    pending = [url for url in urls if normalize_url(url) not in skip]
+    limit = asyncio.Semaphore(max(1, concurrency))
+    host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    async def scan(url: str) -> Dict:
+        host = urlparse(url).netloc.lower()
+        host_limit = host_limits.setdefault(host, asyncio.Semaphore(max(1, per_host_limit)))
+        async with host_limit, limit:
+            start = time.perf_counter()
+            record = {"url": url}
+            try:
+                result = await analyze(url)
+                if result["scanned_pages"] == 0:
+                    record.update(ok=False, error="Nenhuma página pôde ser analisada.")
+                else:
+                    record.update(ok=True, result=result)
+            except Exception as e:
+                record.update(ok=False, error=f"{type(e).__name__}: {e}")
+            record["elapsed_ms"] = round((time.perf_counter() - start) * 1000)
+            record["finished_at"] = datetime.now(timezone.utc).isoformat()
+            return record
+
+    tasks = [asyncio.create_task(scan(url)) for url in pending]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _run_cli(args) -> int:
+    from .archive import CrawlArchive
+    from .browser_pool import BrowserPool
+    from .cache import ANALYSIS_CACHE_TTL, CacheLevel
+    from .compliance import analyze_stream, create_analysis_executor
+    from .crawler import iter_site
+    from .fingerprints import FingerprintStore
+    from .http_fetch import create_http_client
+    from .screenshots import ScreenshotStore
+
+    with open(args.urls, encoding="utf-8") as f:
+        urls = read_urls(f)
+    skip = set() if args.restart else finished_urls(args.output)
+    print(f"{len(urls)} sites, {len(skip & {normalize_url(u) for u in urls})} already done")
+
+    pool = BrowserPool()
+    await pool.start()
+    executor = create_analysis_executor()
+    cache = CacheLevel("analysis", ANALYSIS_CACHE_TTL)
+    fingerprints = FingerprintStore()
+    # No server will be around to take deferred screenshots later
+    # (pages served by the HTTP tier with --fetch tiered have none)
+    screenshots = ScreenshotStore(mode="eager")
+    http_client = create_http_client() if args.fetch == "tiered" else None
+    archive = CrawlArchive(args.archive) if args.archive else None
+
+    async def analyze(url: str) -> Dict:
+        pages = iter_site(url, max_pages=args.max_pages, pool=pool, screenshots=screenshots,
+                          fingerprints=fingerprints if args.incremental else None,
+                          fetch=args.fetch, http_client=http_client)
+        return await analyze_stream(pages, executor=executor, cache=cache, fingerprints=fingerprints, archive=archive)
+
+    failures = 0
+    try:
+        with open(args.output, "w" if args.restart else "a", encoding="utf-8") as out:
+            async for record in run_batch(urls, analyze, args.concurrency, args.per_host, skip):
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                if record["ok"]:
+                    print(f"[ok] {record['url']}: {record['result']['score']} ({record['result']['status']}) "
+                          f"in {record['elapsed_ms'] / 1000:.1f} s")
+                else:
+                    failures += 1
+                    print(f"[erro] {record['url']}: {record['error']}")
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        if http_client is not None:
+            await http_client.aclose()
+        if archive is not None:
+            archive.close()
+        await pool.stop()
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze a portfolio of sites, one JSONL record per site.")
+    parser.add_argument("urls", help="file with one URL per line ('#' starts a comment)")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl", help="JSONL output (appended to, for resuming)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="sites analyzed at once")
+    parser.add_argument("--per-host", type=int, default=BATCH_PER_HOST_LIMIT, help="sites analyzed at once per host")
+    parser.add_argument("--max-pages", type=int, default=3, help="pages crawled per site")
+    parser.add_argument("--incremental", action="store_true", help="reuse pages unchanged since the last scan")
+    parser.add_argument("--fetch", choices=("browser", "tiered"), default="browser",
+                        help="tiered: plain HTTP first, browser only when needed (those pages get no screenshot)")
+    parser.add_argument("--archive", default=os.getenv("CRAWL_ARCHIVE_DIR", ""),
+                        help="directory the crawled pages are archived in (e.g. crawl_archive), for backend.replay")
+    parser.add_argument("--restart", action="store_true", help="ignore (and overwrite) previous results")
+    args = parser.parse_args()
+
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+    sys.exit(asyncio.run(_run_cli(args)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+from playwright.async_api import async_playwright
+from contextlib import asynccontextmanager
+import asyncio
+import os
+import time
+from typing import Dict, Optional
+
+from .metrics import STAGE_SECONDS
+
+# Pool sizing (overridable through environment variables)
+MAX_CONTEXTS = int(os.getenv("BROWSER_POOL_MAX_CONTEXTS", "4"))
+RECYCLE_AFTER_PAGES = int(os.getenv("BROWSER_POOL_RECYCLE_PAGES", "200"))
+
+# Browser context with more permissive settings (shared by every crawl)
+CONTEXT_OPTIONS = {
+    "viewport": {'width': 1280, 'height': 800},
+    "user_agent": 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    "ignore_https_errors": True,
+}
+
+
+class _BrowserSlot:
+    """One launched Chromium plus the bookkeeping needed to retire it."""
+
+    def __init__(self, browser, generation: int):
+        self.browser = browser
+        self.generation = generation
+        self.pages = 0
+        self.active = 0
+        self.alive = True
+
+
+class BrowserPool:
+    """
+    Long-lived Chromium shared by all analyses.
+    Each caller gets its own isolated BrowserContext (cookies, cache, storage).
+    The browser is replaced after RECYCLE_AFTER_PAGES pages or when it crashes.
+    """
+
+    def __init__(self, max_contexts: int = MAX_CONTEXTS, recycle_after_pages: int = RECYCLE_AFTER_PAGES):
+        self.max_contexts = max_contexts
+        self.recycle_after_pages = recycle_after_pages
+        self._semaphore = asyncio.Semaphore(max_contexts)
+        self._lock = asyncio.Lock()
+        self._playwright = None
+        self._current: Optional[_BrowserSlot] = None
+        self._retiring = set()
+        self._generation = 0
+        self._waiting = 0
+        self._launches = 0
+        self._crashes = 0
+        self._pages_total = 0
+
+    async def start(self):
+        """Starts Playwright and warms up the first browser."""
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        try:
+            async with self._lock:
+                await self._ensure_browser()
+        except Exception as e:
+            # Not fatal: the next context() call will retry the launch
+            print(f"Browser pool warm-up failed: {e}")
+
+    async def stop(self):
+        """Closes every browser and stops Playwright."""
+        async with self._lock:
+            slots = list(self._retiring)
+            if self._current:
+                slots.append(self._current)
+            self._current = None
+            self._retiring.clear()
+            for slot in slots:
+                await self._close_slot(slot)
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+
+    @asynccontextmanager
+    async def context(self):
+        """Hands out an isolated browser context, waiting if the pool is full."""
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        try:
+            async with self._lock:
+                slot = await self._ensure_browser()
+                try:
+                    context = await slot.browser.new_context(**CONTEXT_OPTIONS)
+                except Exception as e:
+                    # Browser died (or is failing) between launches: replace it once and retry
+                    print(f"Browser pool: new_context failed ({e}), relaunching")
+                    await self._replace(slot)
+                    slot = await self._ensure_browser()
+                    try:
+                        context = await slot.browser.new_context(**CONTEXT_OPTIONS)
+                    except Exception:
+                        # Not retried again: the next caller starts from a fresh browser
+                        await self._replace(slot)
+                        raise
+                slot.active += 1
+
+            context.on("page", lambda _page: self._count_page(slot))
+            try:
+                yield context
+            finally:
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+                async with self._lock:
+                    slot.active -= 1
+                    await self._maybe_retire(slot)
+        finally:
+            self._semaphore.release()
+
+    def stats(self) -> Dict:
+        """Pool occupancy snapshot."""
+        current = self._current
+        slots = list(self._retiring) + ([current] if current else [])
+        return {
+            "max_contexts": self.max_contexts,
+            "active_contexts": sum(s.active for s in slots),
+            "waiting": self._waiting,
+            "browser_generation": current.generation if current else None,
+            "browser_pages": current.pages if current else 0,
+            "recycle_after_pages": self.recycle_after_pages,
+            "retiring_browsers": len(self._retiring),
+            "launches": self._launches,
+            "crashes": self._crashes,
+            "pages_total": self._pages_total,
+        }
+
+    # --- internals (call with self._lock held) ---
+
+    async def _ensure_browser(self) -> _BrowserSlot:
+        if self._current and self._current.alive and self._current.browser.is_connected():
+            return self._current
+        if self._current:
+            self._mark_dead(self._current)
+
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        mark = time.perf_counter()
+        browser = await self._playwright.chromium.launch(headless=True)
+        STAGE_SECONDS.observe("browser_launch", time.perf_counter() - mark)
+        self._generation += 1
+        self._launches += 1
+        slot = _BrowserSlot(browser, self._generation)
+        browser.on("disconnected", lambda _browser: self._on_disconnected(slot))
+        self._current = slot
+        print(f"Browser pool: launched Chromium (generation {slot.generation})")
+        return slot
+
+    def _count_page(self, slot: _BrowserSlot):
+        slot.pages += 1
+        self._pages_total += 1
+        if slot is self._current and slot.pages >= self.recycle_after_pages:
+            # Stop handing out this browser; it closes once its last context is done
+            self._retiring.add(slot)
+            self._current = None
+
+    def _on_disconnected(self, slot: _BrowserSlot):
+        if slot.alive:
+            self._crashes += 1
+            print(f"Browser pool: Chromium generation {slot.generation} disconnected")
+        self._mark_dead(slot)
+
+    def _mark_dead(self, slot: _BrowserSlot):
+        slot.alive = False
+        if slot is self._current:
+            self._current = None
+        self._retiring.discard(slot)
+
+    async def _replace(self, slot: _BrowserSlot):
+        # Stops handing out a browser that failed to open a context. One still
+        # connected is closed, not left running: right away, or by its last
+        # context when other crawls still use it
+        if slot is self._current:
+            self._current = None
+        if slot.active and slot.browser.is_connected():
+            self._retiring.add(slot)
+        else:
+            self._retiring.discard(slot)
+            await self._close_slot(slot)
+
+    async def _maybe_retire(self, slot: _BrowserSlot):
+        if slot in self._retiring and slot.active == 0:
+            self._retiring.discard(slot)
+            await self._close_slot(slot)
+
+    async def _close_slot(self, slot: _BrowserSlot):
+        slot.alive = False
+        try:
+            await slot.browser.close()
+        except Exception:
+            pass
@@ -0,0 +1,214 @@
+# Two-level result cache in front of /api/analyze.
+#
+#   crawl cache     normalized URL (+ crawl settings) -> crawled pages without
+#                   their raw DOM (a hit is only usable while their analysis is cached), short TTL
+#   analysis cache  hash of page content + RULES_VERSION -> page issues, long TTL
+#
+# Editing any file the findings depend on (RULE_FILES: the rules, the rule engine,
+# the matchers and the text/DOM indexes) changes RULES_VERSION, which invalidates
+# the analysis entries (and so the cached crawls, which lack the DOM to re-analyze)
+# and the incremental fingerprints.
+
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from .urls import normalize_url
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")           # "memory" or "sqlite"
+CACHE_PATH = os.getenv("CACHE_PATH", "cache.sqlite3")
+CRAWL_CACHE_TTL = int(os.getenv("CRAWL_CACHE_TTL", "3600"))        # seconds
+ANALYSIS_CACHE_TTL = int(os.getenv("ANALYSIS_CACHE_TTL", "604800"))  # seconds
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(256 * 1024 * 1024)))  # per level
+
+_BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+# dom_index.py decides which text is read and how a finding is located (skipped
+# tags, node paths, location labels), so it counts as part of the rules
+RULE_FILES = ("rules.py", "rule_engine.py", "compliance.py", "matcher.py", "rates.py",
+              "normalized_text.py", "dom_index.py")
+
+def _rules_version() -> str:
+    """Hash of the files that define the rules."""
+    digest = hashlib.sha256()
+    for name in RULE_FILES:
+        with open(os.path.join(_BACKEND_DIR, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+RULES_VERSION = _rules_version()
+
+
+class MemoryStore:
+    """LRU dict with per-entry expiry, bounded by the (JSON) size of its values."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires, size, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, key: str, value: Any, ttl: int, size: int):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.time() + ttl, size, value)
+            self.size += size
+            while self.size > self.max_bytes and len(self._entries) > 1:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key: str):
+        _expires, size, _value = self._entries.pop(key)
+        self.size -= size
+
+
+class SQLiteStore:
+    """Same interface as MemoryStore, persisted in a SQLite file (survives restarts)."""
+
+    def __init__(self, path: str, table: str, max_bytes: int):
+        self.path = path
+        self.table = table
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT, expires REAL, accessed REAL, size INTEGER)"
+        )
+        self._db.commit()
+
+    @property
+    def size(self) -> int:
+        with self._lock:
+            return self._db.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._db.execute(f"SELECT value, expires FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < time.time():
+                self._db.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute(f"UPDATE {self.table} SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: int, size: int):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires, accessed, size) VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(value), now + ttl, now, size),
+            )
+            self._db.execute(f"DELETE FROM {self.table} WHERE expires < ?", (now,))
+            # Evict least recently used rows until the table fits
+            total = self._db.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+            if total > self.max_bytes:
+                freed = 0
+                victims = []
+                for victim_key, victim_size in self._db.execute(
+                        f"SELECT key, size FROM {self.table} WHERE key != ? ORDER BY accessed", (key,)):
+                    if total - freed <= self.max_bytes:
+                        break
+                    victims.append((victim_key,))
+                    freed += victim_size
+                self._db.executemany(f"DELETE FROM {self.table} WHERE key = ?", victims)
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute(f"DELETE FROM {self.table}")
+            self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class CacheLevel:
+    """One cache level: a store plus its TTL and hit/miss counters."""
+
+    def __init__(self, name: str, ttl: int, backend: str = CACHE_BACKEND, max_bytes: int = CACHE_MAX_BYTES):
+        self.name = name
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        if backend == "sqlite":
+            self.store = SQLiteStore(CACHE_PATH, f"{name}_cache", max_bytes)
+        else:
+            self.store = MemoryStore(max_bytes)
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.store.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any):
+        self.store.set(key, value, self.ttl, len(json.dumps(value)))
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.store),
+            "bytes": self.store.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "ttl": self.ttl,
+        }
+
+
+def crawl_key(url: str, **settings) -> str:
+    """Normalized URL plus the crawl settings that change what is stored."""
+    extras = "|".join(f"{name}={settings[name]}" for name in sorted(settings))
+    return f"{normalize_url(url)}|{extras}"
+
+def content_digest(page: Dict) -> str:
+    """Hash of what the rules read from a page (kept on the page once its raw DOM is released)."""
+    if 'content_digest' in page:
+        return page['content_digest']
+    digest = hashlib.sha256(page['text'].encode('utf-8'))
+    if 'html' in page:
+        digest.update(page['html'].encode('utf-8'))
+    if 'nodes' in page:
+        digest.update(json.dumps(page['nodes'], sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+def content_key(page: Dict) -> str:
+    """Analysis cache key: page content tied to the current rules version."""
+    return f"{RULES_VERSION}:{content_digest(page)}"
+
+def without_dom(page: Dict) -> Dict:
+    """Copy of a page without its raw DOM ('html'/'nodes'), for the crawl cache."""
+    stripped = {key: value for key, value in page.items() if key not in ('html', 'nodes')}
+    stripped['content_digest'] = content_digest(page)
+    return stripped
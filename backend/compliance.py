@@ -1,286 +1,321 @@
-from typing import List, Dict
-import re
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncIterable, Awaitable, Callable, List, Dict, Optional, Tuple
+import asyncio
+import os
+import time
+import uuid
 
-async def analyze_compliance(pages_data: List[Dict]) -> Dict:
+from .rules import FORBIDDEN_TERMS
+from .matcher import FORBIDDEN_FOLDED, FORBIDDEN_PATTERN, first_occurrences
+from .normalized_text import NormalizedText, clean
+from .dom_index import DomTextIndex, TextNode, describe_tag
+from .rates import ACCOMPANIED, TAEG, UNACCOMPANIED, Rate, extract_rates, offer_path, text_index
+from .rule_engine import PageContext, artifact, rule, run_rules
+from .cache import CacheLevel, content_digest, content_key
+from .fingerprints import FingerprintStore
+from .archive import CrawlArchive
+from .metrics import STAGE_SECONDS, observe_timings, timed
+
+# Processes used for per-page analysis (0 = analyze in a thread of the API process)
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", str(os.cpu_count() or 1)))
+
+# Terms are looked up in the page's normalized text (see normalized_text.py):
+# accents and case do not matter, words are matched whole, "*" lets the last one go on
+
+# Rule 0.1: terms that identify a credit-related site
+# (one entry per word now that accents are folded; the activity's own name counts too)
+CREDIT_KEYWORDS = ["crédito*", "financiamento*", "empréstimo*", "hipotecário*", "mútuo*", "taeg", "tan", "mtic",
+                   "intermediário de crédito"]
+
+# Rule 1: terms that accompany the registration number
+REGISTRATION_TERMS = ["registo*", "autorizado*", "licença*", "n.º", "nº", "número*"]
+
+# --- Page artifacts (built lazily, once per page) ---
+
+@artifact("normalized")
+def build_normalized(ctx: PageContext) -> NormalizedText:
+    # Accent-folded text with its word vocabulary, shared by every keyword lookup
+    return NormalizedText(ctx.page['text'])
+
+@artifact("text")
+def build_text(ctx: PageContext) -> str:
+    # The folded text itself: lowercase, line breaks and whitespace runs collapsed to one
+    # space (phrases split across lines, e.g. footer columns, read as one)
+    return ctx.build("normalized").text
+
+@artifact("dom_index")
+def build_dom_index(ctx: PageContext) -> Optional[DomTextIndex]:
+    # Text nodes already located in the browser (extract="browser"): nothing to parse
+    if 'nodes' in ctx.page:
+        return DomTextIndex([TextNode(n['text'], n['tag'], tuple(n['classes']), n['path']) for n in ctx.page['nodes']])
+    # One parse into a text-node array: every location lookup is answered from it
+    if 'html' not in ctx.page:
+        return None
+    try:
+        return DomTextIndex.from_html(ctx.page['html'])
+    except Exception as e:
+        print(f"Could not index HTML of {ctx.url}: {e}")
+        return None
+
+@artifact("rates")
+def build_rates(ctx: PageContext) -> List[Rate]:
+    # Every percentage with its labels and classification (see rates.py);
+    # without a DOM, from the page text (a TAEG anywhere then covers every rate)
+    dom_index = ctx.build("dom_index")
+    return extract_rates(dom_index if dom_index is not None else text_index(ctx.page['text']))
+
+@artifact("dom_normalized")
+def build_dom_normalized(ctx: PageContext) -> Optional[NormalizedText]:
+    # The DOM text index's text, normalized the same way, to locate terms in its nodes
+    dom_index = ctx.build("dom_index")
+    return NormalizedText(dom_index.text) if dom_index is not None else None
+
+@artifact("forbidden_spans")
+def build_forbidden_spans(ctx: PageContext) -> Dict[str, Tuple[int, int]]:
+    # First occurrence of each forbidden term found: one pass of the precompiled
+    # alternation over the normalized text, skipped when the vocabulary already
+    # rules every term out (most pages)
+    normalized = ctx.build("normalized")
+    if not any(normalized.has_words(term) for term in FORBIDDEN_TERMS):
+        return {}
+    first = first_occurrences(normalized.text, FORBIDDEN_PATTERN)
+    return {FORBIDDEN_FOLDED[folded]: span for folded, span in first.items()}
+
+# --- Rules (run in this order) ---
+
+@rule("Erro de Leitura", requires=["text"], stop=True)
+def rule_content(ctx: PageContext):
+    # Rule 0: Content Check
+    if len(ctx.get("text")) < 200:
+        return [{
+            "rule": "Erro de Leitura",
+            "severity": "high",
+            "description": "Não foi possível ler conteúdo suficiente nesta página.",
+            "suggestion": "Verifique se o site bloqueia bots ou se está acessível.",
+            "context": "Texto extraído insuficiente.",
+            "url": ctx.url,
+            "screenshot": ctx.screenshot
+        }]
+
+@rule("Site Não Identificado como Intermediação", requires=["normalized"])
+def rule_relevance(ctx: PageContext):
+    # Rule 0.1: Context Relevance Check (User Request)
+    # Check if the site is actually about credit
+    normalized = ctx.get("normalized")
+    relevance_score = sum(1 for kw in CREDIT_KEYWORDS if normalized.contains(kw))
+
+    if relevance_score < 2: # Very low threshold, just to catch completely unrelated sites
+        # Not a penalty: summarize_issues turns this into the "Não Aplicável" status
+        return [{
+            "rule": "Site Não Identificado como Intermediação",
+            "severity": "info", # Not a penalty, just info
+            "description": "O site analisado não apresenta conteúdo típico de intermediação de crédito.",
+            "suggestion": "Se este é um site de crédito, adicione termos claros como 'Crédito', 'Financiamento', etc.",
+            "context": "Ausência de termos financeiros chave.",
+            "url": ctx.url,
+            "screenshot": ctx.screenshot,
+            "location_guide": "Análise Global"
+        }]
+
+@rule("Identificação de Registo", requires=["normalized"])
+def rule_identification(ctx: PageContext):
+    # Rule 1: Identification (Aviso n.º 5/2024)
+    # Regex updated to include 'autorizado' which is common
+    # RELAXED RULE: Check for presence of key terms anywhere, not necessarily adjacent
+    # Many footers have "Registo: XXX" .... [Header text] ... "Supervisionado pelo Banco de Portugal"
+    normalized = ctx.get("normalized")
+    has_bdp = normalized.contains("banco de portugal")
+    has_registo = any(normalized.contains(term) for term in REGISTRATION_TERMS)
+
+    if not (has_bdp and has_registo):
+        return [{
+            "rule": "Identificação de Registo",
+            "severity": "high",
+            "description": "Não foi encontrada a menção obrigatória ao registo/autorização E ao Banco de Portugal.",
+            "suggestion": "Certifique-se que tem 'Registo n.º XXX' e 'Banco de Portugal' visíveis no rodapé.",
+            "context": "Falta menção explícita ao regulador ou número de registo.",
+            "url": ctx.url,
+            "screenshot": ctx.screenshot,
+            "location_guide": "Rodapé/Cabeçalho"
+        }]
+    # SUCCESS: Rule 1 passed
+    return [{
+        "rule": "Identificação de Registo",
+        "severity": "success",
+        "description": "A identificação de registo e menção ao Banco de Portugal estão presentes.",
+        "suggestion": "Nada a corrigir.",
+        "context": "Registo e Regulador identificados corretamente.",
+        "url": ctx.url,
+        "screenshot": ctx.screenshot,
+        "location_guide": "Rodapé Encontrado"
+    }]
+
+@rule("Menção à Atividade", requires=["normalized"])
+def rule_activity(ctx: PageContext):
+    # Rule 1.1: Activity Category (Guia Prático)
+    if not ctx.get("normalized").contains("intermediário de crédito"):
+        return [{
+            "rule": "Menção à Atividade",
+            "severity": "high",
+            "description": "A designação 'Intermediário de Crédito' é obrigatória e não foi encontrada.",
+            "suggestion": "Deve identificar-se inequivocamente como 'Intermediário de Crédito' (Vinculado/Acessório/etc).",
+            "context": "Falta a designação da atividade.",
+            "url": ctx.url,
+            "screenshot": ctx.screenshot,
+            "location_guide": "Geral (Todo o Site)"
+        }]
+    return [{
+        "rule": "Menção à Atividade",
+        "severity": "success",
+        "description": "A designação 'Intermediário de Crédito' foi encontrada.",
+        "suggestion": "Manter a designação clara e visível.",
+        "context": "Designação da atividade presente.",
+        "url": ctx.url,
+        "screenshot": ctx.screenshot,
+        "location_guide": "Geral (Todo o Site)"
+    }]
+
+@rule("Termos Proibidos", requires=["normalized", "forbidden_spans", "dom_index", "dom_normalized"])
+def rule_forbidden_terms(ctx: PageContext):
+    # Rule 2: Forbidden Terms (Extended per Aviso 5/2024)
+    normalized = ctx.get("normalized")
+    term_spans = ctx.get("forbidden_spans")
+
+    if not term_spans:
+        return [{
+            "rule": "Termos Proibidos",
+            "severity": "success",
+            "description": "Não foram detetados termos proibidos (ex: 'crédito fácil', 'sem burocracia').",
+            "suggestion": "Continue a usar linguagem clara e objetiva.",
+            "context": "Nenhuma inconformidade detetada.",
+            "url": ctx.url,
+            "screenshot": ctx.screenshot,
+            "location_guide": "Análise Global"
+        }]
+
+    # The DOM is only parsed when there is something to locate
+    dom_index = ctx.get("dom_index")
+    dom_normalized = ctx.get("dom_normalized")
+    # First node holding each term, in one pass over the DOM text (nodes are joined
+    # with NUL, so a match never spans two of them)
+    dom_matches = {FORBIDDEN_FOLDED[folded]: found for folded, found in
+                   dom_index.first_matches(FORBIDDEN_PATTERN, dom_normalized).items()} if dom_index is not None else {}
+
+    issues = []
+    for term, reason in FORBIDDEN_TERMS.items():
+        if term not in term_spans:
+            continue
+
+        # Extract context window
+        context_snippet = f"...{normalized.snippet(*term_spans[term], width=50)}..."
+
+        # Determine Location Guide
+        location = "Texto encontrado na página."
+        located = {}
+        if term in dom_matches:
+            target, start_idx, end_idx = dom_matches[term]
+            location = describe_tag(target)
+            located = {"screenshot": ctx.screenshot_for(target), "node_path": target.path}
+            # Extract context around term
+            context_snippet = f"...{clean(target.text[max(0, start_idx-20):end_idx+20])}..."
+
+        issues.append({
+            "rule": "Termo Proibido Detectado",
+            "severity": "critical",
+            "description": reason,
+            "suggestion": f"Remova a expressão '{term}' e substitua por linguagem mais objetiva.",
+            "context": context_snippet,
+            "url": ctx.url,
+            "screenshot": ctx.screenshot,
+            "location_guide": location,
+            **located
+        })
+    return issues
+
+@rule("Falta de TAEG", requires=["text", "rates"])
+def rule_taeg(ctx: PageContext):
+    # Rule 3: TAEG next to every rate shown
+    # "Top 5%", "100% Online" and the like are not rates (IGNORED_RATE_CONTEXTS)
+    text = ctx.get("text")
+    if "%" not in text:
+        return None
+
+    rates = ctx.get("rates")
+    unaccompanied = [rate for rate in rates if rate.status == UNACCOMPANIED]
+    if not unaccompanied:
+        if not any(rate.status in (TAEG, ACCOMPANIED) for rate in rates):
+            return None
+        return [{
+            "rule": "Exibição de TAEG",
+            "severity": "success",
+            "description": "As taxas apresentadas parecem estar acompanhadas da respetiva TAEG.",
+            "suggestion": "Manter a consistência na apresentação de taxas.",
+            "context": "Contexto adequado encontrado.",
+            "url": ctx.url,
+            "screenshot": ctx.screenshot,
+            "location_guide": "Verificação de Taxas"
+        }]
+
+    # Every unaccompanied rate is reported, one issue per element (offer cards alike
+    # apart, the cells of a simulator table together: see rates.offer_path)
+    by_element: Dict[str, List[Rate]] = {}
+    for rate in unaccompanied:
+        by_element.setdefault(offer_path(rate.node.path), []).append(rate)
+
+    issues = []
+    for element_rates in by_element.values():
+        target = element_rates[0].node
+        path = target.path
+        found_context = f"...{target.text.strip()[:50]}..."
+        values = list(dict.fromkeys(rate.raw.replace(" ", "") for rate in element_rates))
+        if len(values) > 1:
+            found_context += f" (taxas sem TAEG: {', '.join(values[:10])}{', ...' if len(values) > 10 else ''})"
+        location = {"screenshot": ctx.screenshot_for(target), "node_path": path} if path != "text" else {}
+        issues.append({
+            "rule": "Falta de TAEG",
+            "severity": "high",
+            "description": "Existem taxas (%) apresentadas sem a correspondente TAEG.",
+            "suggestion": "Sempre que apresentar taxas de juro, deve apresentar a TAEG com destaque igual ou superior.",
+            "context": found_context,
+            "url": ctx.url,
+            "screenshot": ctx.screenshot,
+            "location_guide": f"{describe_tag(target)} (contém '{target.text.strip()[:20]}...')" if location
+                              else "Geral (Página contém % sem TAEG explícita)",
+            **location
+        })
+    return issues
+
+def analyze_page(page: Dict) -> List[Dict]:
     """
-    Analyzes compliance for each page crawled.
-    pages_data: List of {'url': ..., 'text': ..., 'screenshot': ...}
+    Runs every registered rule against one crawled page.
+    page: {'url': ..., 'text': ..., 'html' or 'nodes': ..., 'screenshot': ...}
+    Returns the list of issues (including "success" entries) for that page.
     """
-    
-    total_score = 100
-    all_issues = []
-    
-    # Analyze each page
-    for page in pages_data:
-        # Normalize text: remove line breaks to handle phrases split across lines (e.g. footer columns)
-        raw_text = page['text'].lower()
-        text = re.sub(r'\s+', ' ', raw_text.replace('\n', ' '))
-        
-        url = page['url']
-        screenshot = page['screenshot']
-        
-        print(f"Analyzing page: {url} | Text length: {len(text)}")
-        
-        page_issues = []
-        
-        # Rule 0: Content Check
-        if len(text) < 200:
-             page_issues.append({
-                "rule": "Erro de Leitura",
-                "severity": "high",
-                "description": "Não foi possível ler conteúdo suficiente nesta página.",
-                "suggestion": "Verifique se o site bloqueia bots ou se está acessível.",
-                "context": "Texto extraído insuficiente.",
-                "url": url,
-                "screenshot": screenshot
-            })
-             total_score -= 100 # Fail immediately
-             all_issues.extend(page_issues)
-             continue
-
-        # Rule 0.1: Context Relevance Check (User Request)
-        # Check if the site is actually about credit
-        credit_keywords = ["crédito", "credito", "financiamento", "empréstimo", "emprestimo", 
-                          "hipotecário", "hipotecario", "mútuo", "mutuo", "taeg", "tan", "mtic"]
-        
-        relevance_score = 0
-        for kw in credit_keywords:
-            if kw in text:
-                relevance_score += 1
-        
-        if relevance_score < 2: # Very low threshold, just to catch completely unrelated sites
-             page_issues.append({
-                "rule": "Site Não Identificado como Intermediação",
-                "severity": "info", # Not a penalty, just info
-                "description": "O site analisado não apresenta conteúdo típico de intermediação de crédito.",
-                "suggestion": "Se este é um site de crédito, adicione termos claros como 'Crédito', 'Financiamento', etc.",
-                "context": "Ausência de termos financeiros chave.",
-                "url": url,
-                "screenshot": screenshot,
-                "location_guide": "Análise Global"
-            })
-             # Don't penalize score heavily if it's just the wrong site, but show it's not compliant/relevant
-             # We assume 100 score (compliant) for a non-credit site? Or 0?
-             # User asked to "say it does not present characteristics".
-             # Let's set a specific status logic later.
-             # For now, we continue but mark it.
-             pass
-
-        # Rule 1: Identification (Aviso n.º 5/2024)
-        # Regex updated to include 'autorizado' which is common
-        # RELAXED RULE: Check for presence of key terms anywhere, not necessarily adjacent
-        # Many footers have "Registo: XXX" .... [Header text] ... "Supervisionado pelo Banco de Portugal"
-        
-        has_bdp = "banco de portugal" in text
-        has_registo = any(term in text for term in ["registo", "autorizado", "licença", "n.º", "nº", "número"])
-        
-        # Rule 1 Check
-        if not (has_bdp and has_registo):
-             # Only penalize if page has substantial text
-            page_issues.append({
-                "rule": "Identificação de Registo",
-                "severity": "high",
-                "description": "Não foi encontrada a menção obrigatória ao registo/autorização E ao Banco de Portugal.",
-                "suggestion": "Certifique-se que tem 'Registo n.º XXX' e 'Banco de Portugal' visíveis no rodapé.",
-                "context": "Falta menção explícita ao regulador ou número de registo.",
-                "url": url,
-                "screenshot": screenshot,
-                "location_guide": "Rodapé/Cabeçalho"
-            })
-            total_score -= 10
-        else:
-             # SUCCESS: Rule 1 passed
-             page_issues.append({
-                "rule": "Identificação de Registo",
-                "severity": "success",
-                "description": "A identificação de registo e menção ao Banco de Portugal estão presentes.",
-                "suggestion": "Nada a corrigir.",
-                "context": "Registo e Regulador identificados corretamente.",
-                "url": url,
-                "screenshot": screenshot,
-                "location_guide": "Rodapé Encontrado"
-            })
-
-        # Rule 1.1: Activity Category (Guia Prático)
-        if "intermediário de crédito" not in text and "intermediario de credito" not in text:
-             page_issues.append({
-                "rule": "Menção à Atividade",
-                "severity": "high",
-                "description": "A designação 'Intermediário de Crédito' é obrigatória e não foi encontrada.",
-                "suggestion": "Deve identificar-se inequivocamente como 'Intermediário de Crédito' (Vinculado/Acessório/etc).",
-                "context": "Falta a designação da atividade.",
-                "url": url,
-                "screenshot": screenshot,
-                "location_guide": "Geral (Todo o Site)"
-            })
-             total_score -= 10
-        else:
-             page_issues.append({
-                "rule": "Menção à Atividade",
-                "severity": "success",
-                "description": "A designação 'Intermediário de Crédito' foi encontrada.",
-                "suggestion": "Manter a designação clara e visível.",
-                "context": "Designação da atividade presente.",
-                "url": url,
-                "screenshot": screenshot,
-                "location_guide": "Geral (Todo o Site)"
-            })
-
-        # Rule 2: Forbidden Terms (Extended per Aviso 5/2024)
-        from .rules import FORBIDDEN_TERMS
-        
-        # Parse HTML for Location Guide
-        soup = None
-        if 'html' in page:
-            from bs4 import BeautifulSoup
-            try:
-                soup = BeautifulSoup(page['html'], 'html.parser')
-                # Remove script and style elements to avoid matching CSS/JS
-                for script in soup(["script", "style"]):
-                    script.extract()
-            except:
-                pass
-
-        for term, reason in FORBIDDEN_TERMS.items():
-            if term in text:
-                # Extract context window
-                start = max(0, text.find(term) - 50)
-                end = min(len(text), text.find(term) + 50)
-                context_snippet = "..." + text[start:end].replace('\n', ' ') + "..."
-                
-                # Dynamic suggestion based on term
-                suggestion_text = f"O termo '{term}' é considerado de risco. Substitua por uma descrição objetiva do processo."
-                if "fácil" in term or "imediato" in term:
-                    suggestion_text = f"Substitua '{term}' por 'processo ágil' ou 'resposta rápida' (condicionado à realidade). Evite promessas de automatismo."
-                elif "sem juros" in term or "0%" in term:
-                    suggestion_text = f"Só pode usar '{term}' se a TAEG for efetivamente 0%. Caso contrário, deve indicar a TAEG correta."
-                elif "garantida" in term:
-                    suggestion_text = f"Remova '{term}'. A concessão de crédito depende sempre da análise de solvabilidade e não pode ser garantida a priori."
-                
-                # Determine Location Guide
-                location_guide = "Texto encontrado na página."
-                if soup:
-                     matches = soup.find_all(string=re.compile(re.escape(term), re.IGNORECASE))
-                     if matches:
-                         # Pick the first one
-                         target = matches[0]
-                         parent = target.parent
-                         tag_name = parent.name
-                         classes = "." + ".".join(parent.get('class', [])) if parent.get('class') else ""
-                         location = f"Tag: <{tag_name}{classes}>"
-                         # Extract context around term
-                         start_idx = target.lower().find(term.lower())
-                         context_snippet = f"...{target[max(0, start_idx-20):start_idx+len(term)+20]}..."
-
-                page_issues.append({
-                    "rule": "Termo Proibido Detectado",
-                    "severity": "critical",
-                    "description": reason,
-                    "suggestion": f"Remova a expressão '{term}' e substitua por linguagem mais objetiva.",
-                    "context": context_snippet,
-                    "url": url,
-                    "screenshot": screenshot,
-                    "location_guide": location
-                })
-                total_score -= 5
-        
-        if not found_forbidden:
-             page_issues.append({
-                "rule": "Termos Proibidos",
-                "severity": "success",
-                "description": "Não foram detetados termos proibidos (ex: 'crédito fácil', 'sem burocracia').",
-                "suggestion": "Continue a usar linguagem clara e objetiva.",
-                "context": "Nenhuma inconformidade detetada.",
-                "url": url,
-                "screenshot": screenshot,
-                "location_guide": "Análise Global"
-            })
-            
-        # Rule 3: TAEG (If numbers/rates are present) changes
-        # Refined to avoid false positives like "Top 5%", "100% Online"
-        
-        has_suspicious_rate = False
-        suspicious_element = None
-        
-        ignored_contexts = ["top", "scoring", "online", "digital", "satisfação", "cliente", "processo", "100%"]
-        
-        pass_check_taeg = False 
-
-        if "%" in text and "taeg" not in text and "taxa anual" not in text:
-            if soup:
-                # Find elements with "%" text
-                elements_with_percent = soup.find_all(string=re.compile(r'\d+([.,]\d+)?\s*%'))
-                
-                for el in elements_with_percent:
-                    text_lower = el.lower()
-                    # Check if this specific occurrence is safe
-                    is_safe = False
-                    for ignore in ignored_contexts:
-                        if ignore in text_lower:
-                            is_safe = True
-                            break
-                    
-                    if not is_safe:
-                        has_suspicious_rate = True
-                        suspicious_element = el
-                        break
-            else:
-                # Fallback for non-HTML text analysis
-                has_suspicious_rate = True
-        elif "%" in text and ("taeg" in text or "taxa anual" in text):
-             pass_check_taeg = True
-
-        if has_suspicious_rate:
-             # Heuristic: if there is a percentage but no mention of TAEG
-             # Try to find the specific element with the % to give a location
-            taeg_location = "Geral (Página contém % sem TAEG explícita)"
-            found_context = "Oferta de valores/taxas sem TAEG explícita"
-            
-            if suspicious_element:
-                target = suspicious_element
-                parent = target.parent
-                tag_name = parent.name
-                classes = "." + ".".join(parent.get('class', [])) if parent.get('class') else ""
-                
-                found_context = f"...{target.strip()[:50]}..."
-                taeg_location = f"Tag: <{tag_name}{classes}> (contém '{target.strip()[:20]}...')"
-
-            page_issues.append({
-                "rule": "Falta de TAEG",
-                "severity": "high",
-                "description": "Existem taxas (%) apresentadas sem a correspondente TAEG.",
-                "suggestion": "Sempre que apresentar taxas de juro, deve apresentar a TAEG com destaque igual ou superior.",
-                "context": found_context,
-                "url": url,
-                "screenshot": screenshot,
-                "location_guide": taeg_location
-            })
-            total_score -= 10
-        elif pass_check_taeg:
-             page_issues.append({
-                "rule": "Exibição de TAEG",
-                "severity": "success",
-                "description": "As taxas apresentadas parecem estar acompanhadas da respetiva TAEG.",
-                "suggestion": "Manter a consistência na apresentação de taxas.",
-                "context": "Contexto adequado encontrado.",
-                "url": url,
-                "screenshot": screenshot,
-                "location_guide": "Verificação de Taxas"
-            })
-            
-        all_issues.extend(page_issues)
+    return analyze_page_timed(page)[0]
 
+def analyze_page_timed(page: Dict) -> Tuple[List[Dict], Dict[str, float]]:
+    """analyze_page plus the ms spent per artifact ("artifact:<name>") and rule ("rule:<name>")."""
+    print(f"Analyzing page: {page['url']} | Text length: {len(page['text'])}")
+    timings: Dict[str, float] = {}
+    issues = run_rules(page, timings=timings)
+    return issues, timings
+
+def summarize_issues(all_issues: List[Dict], scanned_pages: int) -> Dict:
+    """
+    Deduplicates the issues of all pages and computes the final score/status.
+    """
     # Deduplicate issues
     unique_issues = []
     seen_signatures = set()
-    
+
     for issue in all_issues:
         signature = (issue['rule'], issue['description'], issue['context'])
-        
+
         if signature not in seen_signatures:
             seen_signatures.add(signature)
             unique_issues.append(issue)
-    
+
     # Recalculate score based on UNIQUE issues to avoid double penalization for site-wide template errors
     # Reset score to 100 and subtract based on unique findings
     final_score = 100
@@ -291,14 +326,14 @@ async def analyze_compliance(pages_data: List[Dict]) -> Dict:
             final_score -= 5
         elif issue['severity'] == 'low':
             final_score -= 2
-            
+
     final_score = max(0, min(100, final_score)) # Ensure score is between 0 and 100
     # Determine status
     status = "Conforme"
-    
+
     # Check for relevance flag
     is_irrelevant = any(i['rule'] == "Site Não Identificado como Intermediação" for i in unique_issues)
-    
+
     if is_irrelevant:
         status = "Não Aplicável / Sem Conteúdo de Crédito"
         # Filter out other compliance errors if it's not a credit site to avoid confusion?
@@ -317,5 +352,142 @@ async def analyze_compliance(pages_data: List[Dict]) -> Dict:
         "score": max(0, final_score),
         "status": status,
         "issues": unique_issues,
-        "scanned_pages": len(pages_data)
+        "scanned_pages": scanned_pages
     }
+
+def create_analysis_executor(workers: int = ANALYSIS_WORKERS) -> Optional[Executor]:
+    """Process pool for analyze_page, or None to analyze in a thread instead."""
+    if workers <= 0:
+        return None
+    return ProcessPoolExecutor(max_workers=workers)
+
+async def analyze_page_async(page: Dict, executor: Optional[Executor] = None,
+                             cache: Optional[CacheLevel] = None,
+                             fingerprints: Optional[FingerprintStore] = None) -> List[Dict]:
+    """
+    analyze_page off the event loop: in the given process pool when there is one,
+    otherwise in a worker thread.
+    With a cache, pages whose content was already analyzed under the current
+    rules reuse those issues (re-pointed at this page's url/screenshot or crop).
+    Pages the incremental crawl marked as 'reused' keep their previous issues.
+    With a fingerprint store, the page's fingerprint is recorded with its issues.
+    The analysis timings (see analyze_page_timed, plus "analyze" for the whole
+    step) are added to page['timings'] and to the /metrics histograms.
+    """
+    start = time.perf_counter()
+    timings: Dict[str, float] = {}
+    issues = None
+    key = None
+    if page.get('reused'):
+        issues = page['issues']
+    elif cache is not None:
+        key = content_key(page)
+        cached = cache.get(key)
+        if cached is not None:
+            crops = page.get('crops', {})
+            issues = [dict(issue, url=page['url'], screenshot=crops.get(issue.get('node_path'), page['screenshot']))
+                      for issue in cached]
+
+    if issues is None:
+        if executor is not None:
+            try:
+                issues, timings = await asyncio.get_running_loop().run_in_executor(executor, analyze_page_timed, page)
+            except BrokenProcessPool as e:
+                print(f"Analysis pool unavailable ({e}), analyzing in-process: {page['url']}")
+        if issues is None:
+            issues, timings = await asyncio.to_thread(analyze_page_timed, page)
+        if cache is not None:
+            cache.set(key, issues)
+
+    if fingerprints is not None:
+        fingerprints.record(page, issues)
+    # Queue wait in the pool included: this is what the page cost the request
+    timings["analyze"] = round((time.perf_counter() - start) * 1000)
+    observe_timings(timings)
+    # A new dict: pages served from the crawl cache share theirs with the cache
+    page['timings'] = dict(page.get('timings') or {}, **timings)
+    return issues
+
+def release_dom(page: Dict):
+    """
+    Drops a page's raw DOM ('html'/'nodes') once its rules ran; the page keeps
+    the digest its analysis is cached under.
+    """
+    page['content_digest'] = content_digest(page)
+    page.pop('html', None)
+    page.pop('nodes', None)
+
+def _summarize_pages(pages: List[Dict], per_page: List[List[Dict]],
+                     timings: Optional[Dict] = None) -> Dict:
+    """
+    summarize_issues over pages in crawl (BFS) order, plus the pages reused from the last
+    scan and the tier ("http" or "browser") that fetched each page.
+    timings, if given, receives the dedup/scoring time as "score".
+    """
+    timings = {} if timings is None else timings
+    with timed(timings, "score", digits=3):
+        ordered = sorted(zip(pages, per_page), key=lambda item: item[0].get('order', []))
+        all_issues = [issue for _, page_issues in ordered for issue in page_issues]
+        result = summarize_issues(all_issues, len(pages))
+        result['reused_pages'] = [page['url'] for page, _ in ordered if page.get('reused')]
+        result['page_tiers'] = {page['url']: page.get('tier', 'browser') for page, _ in ordered}
+    STAGE_SECONDS.observe("score", timings["score"] / 1000)
+    return result
+
+async def analyze_compliance(pages_data: List[Dict], executor: Optional[Executor] = None,
+                             cache: Optional[CacheLevel] = None,
+                             fingerprints: Optional[FingerprintStore] = None,
+                             timings: Optional[Dict] = None) -> Dict:
+    """
+    Analyzes compliance for each page crawled.
+    pages_data: List of {'url': ..., 'text': ..., 'screenshot': ...}
+    executor: optional process pool; pages are then analyzed in parallel.
+    cache: optional analysis cache (see cache.py).
+    fingerprints: optional store the pages' fingerprints are recorded in (see fingerprints.py).
+    timings: optional dict that receives the site-level stage timings ("score").
+    """
+    # Analyze each page (in parallel), keeping the crawl order for dedup/score
+    per_page = await asyncio.gather(*(analyze_page_async(page, executor, cache, fingerprints) for page in pages_data))
+    return _summarize_pages(pages_data, per_page, timings)
+
+async def analyze_stream(pages: AsyncIterable[Dict], executor: Optional[Executor] = None,
+                         cache: Optional[CacheLevel] = None,
+                         fingerprints: Optional[FingerprintStore] = None,
+                         on_page: Optional[Callable[[Dict, List[Dict]], Awaitable[None]]] = None,
+                         timings: Optional[Dict] = None,
+                         archive: Optional[CrawlArchive] = None) -> Dict:
+    """
+    analyze_compliance over a stream of pages (see crawler.iter_site): each page is
+    analyzed as soon as it arrives, while the crawl goes on, and its raw DOM is
+    released right after its rules ran, so memory does not grow with HTML size x pages.
+    on_page(page, issues), if given, is awaited after each page's analysis.
+    timings: optional dict that receives the site-level stage timings ("score").
+    archive: optional crawl archive each page is written to before its DOM is released (see archive.py).
+    """
+    crawl = uuid.uuid4().hex[:12]
+    archived = 0
+
+    async def analyze(page: Dict) -> List[Dict]:
+        nonlocal archived
+        issues = await analyze_page_async(page, executor, cache, fingerprints)
+        if archive is not None:
+            archived += await asyncio.to_thread(archive.add_page, crawl, page, issues)
+        release_dom(page)
+        if on_page:
+            await on_page(page, issues)
+        return issues
+
+    received: List[Dict] = []
+    tasks = []
+    try:
+        async for page in pages:
+            received.append(page)
+            tasks.append(asyncio.create_task(analyze(page)))
+        per_page = await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+    result = _summarize_pages(received, per_page, timings)
+    if archived:
+        await asyncio.to_thread(archive.add_crawl, crawl, received, result)
+    return result
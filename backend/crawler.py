@@ -1,154 +1,732 @@
 from playwright.async_api import async_playwright
+from contextlib import AsyncExitStack, asynccontextmanager
+from urllib.parse import urlparse
+import asyncio
+import html as html_entities
 import os
-import uuid
-from typing import Dict, List, Tuple
+import re
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 
-# Directory to save screenshots
-SCREENSHOT_DIR = "frontend/screenshots"
-os.makedirs(SCREENSHOT_DIR, exist_ok=True)
+from .browser_pool import BrowserPool, CONTEXT_OPTIONS
+from .fingerprints import FingerprintStore, text_hash
+from .frontier import Frontier
+from .http_fetch import CRAWL_FETCH, FETCH_MODES, create_http_client, fetch_page
+from .metrics import STAGE_SECONDS, observe_timings
+from .screenshots import SCREENSHOT_CROPS, SCREENSHOT_MAX_CROPS, ScreenshotStore
+from .profiles import CRAWL_PROFILE, get_profile, install_resource_blocking
+from .matcher import FORBIDDEN_FOLDED
 
-async def crawl_site(start_url: str, max_pages: int = 3) -> List[Dict]:
+# Pages in flight per crawl, and per host within that crawl (politeness)
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "3"))
+CRAWL_PER_HOST_LIMIT = int(os.getenv("CRAWL_PER_HOST_LIMIT", "3"))
+
+# "browser": one in-page script returns text, links and the located text nodes
+# "html": legacy round trips, ships the full HTML to the backend for parsing
+CRAWL_EXTRACT = os.getenv("CRAWL_EXTRACT", "browser")
+
+# "observer": DOM-ready navigation, fast scroll, exit once the DOM/text settle
+# "fixed": legacy networkidle + 100px auto-scroll + 3 s sleep
+CRAWL_READINESS = os.getenv("CRAWL_READINESS", "observer")
+READY_QUIET_MS = int(os.getenv("READY_QUIET_MS", "500"))    # no DOM mutations for this long = settled
+READY_MAX_MS = int(os.getenv("READY_MAX_MS", "8000"))       # hard cap on the settle phase
+
+# Auto-scroll to bottom to trigger lazy loading
+AUTO_SCROLL_SCRIPT = """
+    async () => {
+        await new Promise((resolve) => {
+            let totalHeight = 0;
+            const distance = 100;
+            const timer = setInterval(() => {
+                const scrollHeight = document.body.scrollHeight;
+                window.scrollBy(0, distance);
+                totalHeight += distance;
+
+                if(totalHeight >= scrollHeight){
+                    clearInterval(timer);
+                    resolve();
+                }
+            }, 100);
+        });
+    }
+"""
+
+# Event-driven readiness (readiness="observer"):
+# jump to the bottom until the page stops growing, then wait until no DOM
+# mutations happened for quietMs and innerText stopped changing (or maxMs).
+# Lazy content is triggered by the jumps; IntersectionObserver-driven loaders
+# fire as soon as their sentinel enters the viewport.
+READY_SCRIPT = """
+    async ({quietMs, maxMs}) => {
+        const start = performance.now();
+        let lastMutation = performance.now();
+        const observer = new MutationObserver(() => { lastMutation = performance.now(); });
+        observer.observe(document.documentElement, {childList: true, subtree: true, characterData: true, attributes: true});
+
+        const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+        const elapsed = () => performance.now() - start;
+
+        // Fast scroll: one jump per viewport, repeated while the page keeps growing
+        let scrolls = 0;
+        let height = -1;
+        while (document.body.scrollHeight !== height && elapsed() < maxMs) {
+            height = document.body.scrollHeight;
+            for (let y = window.scrollY; y < height; y += window.innerHeight) {
+                window.scrollTo(0, y + window.innerHeight);
+                scrolls++;
+                await new Promise(resolve => requestAnimationFrame(resolve));
+            }
+            await sleep(100);
+        }
+        const scrolledAt = elapsed();
+
+        // Quiescence: DOM stable for quietMs and text length unchanged between checks
+        let textLength = document.body.innerText.length;
+        let reason = 'timeout';
+        while (elapsed() < maxMs) {
+            await sleep(100);
+            const currentLength = document.body.innerText.length;
+            const quiet = performance.now() - lastMutation >= quietMs;
+            if (quiet && currentLength === textLength) { reason = 'settled'; break; }
+            textLength = currentLength;
+        }
+        observer.disconnect();
+        window.scrollTo(0, 0);
+        return {scrolls: scrolls, scroll_ms: Math.round(scrolledAt), settle_ms: Math.round(elapsed() - scrolledAt), reason: reason};
+    }
+"""
+
+# Folding of normalized_text.fold (accents and invisible characters dropped,
+# whitespace collapsed, lowercase), so text nodes are matched against the folded
+# terms (matcher.FORBIDDEN_FOLDED) however they spell them
+FOLD_JS = """
+        const foldMarks = /[\\u0300-\\u036f\\u1ab0-\\u1aff\\u1dc0-\\u1dff\\u20d0-\\u20ff\\ufe20-\\ufe2f\\u00ad\\u180e\\u200b-\\u200d\\u2060\\ufeff]/g;
+        const fold = (text) => text.normalize('NFKD').replace(foldMarks, '').replace(/\\s+/g, ' ').toLowerCase();
+"""
+
+# Find and highlight forbidden terms AND regex patterns (rates)
+HIGHLIGHT_SCRIPT = """
+    (terms) => {""" + FOLD_JS + """
+        function highlightText(root, term, isRegex=false) {
+            const walker = document.createTreeWalker(root, NodeFilter.SHOW_TEXT, null, false);
+            let node;
+            const nodesToHighlight = [];
+
+            while (node = walker.nextNode()) {
+                let match = false;
+                if (isRegex) {
+                    if (term.test(node.nodeValue)) match = true;
+                } else {
+                    if (fold(node.nodeValue).includes(term)) match = true;
+                }
+
+                if (match) nodesToHighlight.push(node);
+            }
+
+            nodesToHighlight.forEach(node => {
+                const parent = node.parentNode;
+                if (parent && parent.style) {
+                   parent.setAttribute('data-bdp-flag', '1');  // for CROPS_SCRIPT
+                   if (isRegex) {
+                        // Specific style for Rates/Numbers (Blue/Cyan)
+                        parent.style.border = '3px dashed blue';
+                        parent.style.backgroundColor = '#e0f7fa';
+                        parent.style.color = 'black';
+                   } else {
+                        // Danger terms (Red/Yellow)
+                        parent.style.border = '5px solid red';
+                        parent.style.backgroundColor = 'yellow';
+                        parent.style.color = 'black';
+                   }
+                }
+            });
+        }
+
+        // Highlight forbidden terms
+        terms.forEach(term => {
+            highlightText(document.body, term);
+        });
+
+        // Highlight Potential Rates (Regex for percentages)
+        // Matches number + space? + %
+        const rateRegex = /\\d+([.,]\\d+)?\\s?%/;
+        highlightText(document.body, rateRegex, true);
+    }
+"""
+
+# DOM path of an element, as dom_index builds it: "tag.class" per level, with
+# ":nth-of-type(n)" from the second child with the same tag on (shared by the
+# scripts below, so crops and located text nodes agree on paths)
+DOM_PATH_JS = """
+        const paths = new Map();
+        const positions = new Map();  // parent -> Map(child -> position among the children with its tag)
+
+        function position(el) {
+            const parent = el.parentElement;
+            if (!parent) return 1;
+            let table = positions.get(parent);
+            if (!table) {
+                table = new Map();
+                const counts = {};
+                for (const child of parent.children) {
+                    counts[child.tagName] = (counts[child.tagName] || 0) + 1;
+                    table.set(child, counts[child.tagName]);
+                }
+                positions.set(parent, table);
+            }
+            return table.get(el);
+        }
+
+        function label(el) {
+            const classes = Array.from(el.classList || []);
+            const text = el.tagName.toLowerCase() + classes.map(c => '.' + c).join('');
+            const n = position(el);
+            return n > 1 ? text + ':nth-of-type(' + n + ')' : text;
+        }
+
+        function pathOf(el) {
+            if (paths.has(el)) return paths.get(el);
+            const parent = el.parentElement;
+            const path = parent ? pathOf(parent) + ' > ' + label(el) : label(el);
+            paths.set(el, path);
+            return path;
+        }
+"""
+
+# Document-space boxes (plus a margin) around the elements highlighted above,
+# keyed by the same DOM path the text nodes carry; one crop per distinct path.
+CROPS_SCRIPT = """
+    ({maxCrops, margin}) => {""" + DOM_PATH_JS + """
+
+        const pageWidth = document.documentElement.scrollWidth;
+        const pageHeight = document.documentElement.scrollHeight;
+        const crops = [];
+        const seen = new Set();
+        for (const el of document.querySelectorAll('[data-bdp-flag]')) {
+            if (crops.length >= maxCrops) break;
+            const rect = el.getBoundingClientRect();
+            const path = pathOf(el);
+            if (rect.width === 0 || rect.height === 0 || seen.has(path)) continue;
+            seen.add(path);
+            const x = Math.max(0, rect.left + window.scrollX - margin);
+            const y = Math.max(0, rect.top + window.scrollY - margin);
+            crops.push({
+                path: path, x: x, y: y,
+                width: Math.min(rect.width + 2 * margin, pageWidth - x),
+                height: Math.min(rect.height + 2 * margin, pageHeight - y)
+            });
+        }
+        return crops;
+    }
+"""
+
+# Internal links (same origin as the current page) with their text and whether
+# they sit in the footer, for the frontier's priority scoring
+LINKS_SCRIPT = """
+    () => {
+        return Array.from(document.querySelectorAll('a[href]'))
+            .filter(a => a.href.startsWith(window.location.origin))
+            .map(a => ({
+                url: a.href,
+                text: (a.innerText || '').trim().slice(0, 100),
+                footer: !!a.closest('footer, [class*="footer"], [id*="footer"]')
+            }))
+    }
+"""
+
+# Highlight + extraction in a single DOM walk (extract="browser").
+# Returns the visible text, internal links, and only the text nodes the rules
+# need to locate (forbidden terms, rates and rate labels) with their tag/class/path.
+EXTRACT_SCRIPT = """
+    (terms) => {
+        const rateRegex = /\\d+([.,]\\d+)?\\s*%/;
+        // Same labels as rates.LABEL_PATTERN (located for the TAEG rule, not highlighted)
+        const labelRegex = /\\b(taeg|tan|mtic)\\b|taxa anual|montante total imputado/i;
+        const hidden = new Set(['SCRIPT', 'STYLE', 'NOSCRIPT', 'TEMPLATE']);""" + FOLD_JS + DOM_PATH_JS + """
+
+        const nodes = [];
+        const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT, null, false);
+        let node;
+        while (node = walker.nextNode()) {
+            const parent = node.parentElement;
+            if (!parent || hidden.has(parent.tagName) || !node.nodeValue.trim()) continue;
+
+            const folded = fold(node.nodeValue);
+            const isTerm = terms.some(term => folded.includes(term));
+            const isRate = rateRegex.test(node.nodeValue);
+            const isLabel = labelRegex.test(node.nodeValue);
+            if (!isTerm && !isRate && !isLabel) continue;
+
+            nodes.push({
+                text: node.nodeValue,
+                tag: parent.tagName.toLowerCase(),
+                classes: Array.from(parent.classList),
+                path: pathOf(parent)
+            });
+
+            // Same visual highlight as HIGHLIGHT_SCRIPT
+            if (parent.style && (isTerm || isRate)) {
+                parent.setAttribute('data-bdp-flag', '1');  // for CROPS_SCRIPT
+                if (isTerm) {
+                    parent.style.border = '5px solid red';
+                    parent.style.backgroundColor = 'yellow';
+                } else {
+                    parent.style.border = '3px dashed blue';
+                    parent.style.backgroundColor = '#e0f7fa';
+                }
+                parent.style.color = 'black';
+            }
+        }
+
+        // Same as LINKS_SCRIPT
+        const links = Array.from(document.querySelectorAll('a[href]'))
+            .filter(a => a.href.startsWith(window.location.origin))
+            .map(a => ({
+                url: a.href,
+                text: (a.innerText || '').trim().slice(0, 100),
+                footer: !!a.closest('footer, [class*="footer"], [id*="footer"]')
+            }));
+
+        return { text: document.body.innerText, links: links, nodes: nodes };
+    }
+"""
+
+@asynccontextmanager
+async def _open_context(pool: Optional[BrowserPool] = None):
     """
-    Crawls the site using Playwright.
-    Returns a list of dicts: {'url': str, 'text': str, 'screenshot': str}
+    Yields a browser context: borrowed from the shared pool when available,
+    otherwise from a throwaway browser (standalone scripts).
     """
-    results = []
-    visited_urls = set()
-    queue = [start_url]
-    
+    if pool is not None:
+        async with pool.context() as context:
+            yield context
+        return
+
     async with async_playwright() as p:
+        mark = time.perf_counter()
         browser = await p.chromium.launch(headless=True)
-        # Browser context with more permissive settings
-        context = await browser.new_context(
-            viewport={'width': 1280, 'height': 800},
-            user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            ignore_https_errors=True
-        )
-        
-        while queue and len(visited_urls) < max_pages:
-            url = queue.pop(0)
-            if url in visited_urls:
-                continue
-            
-            visited_urls.add(url)
-            print(f"Crawling (Playwright): {url}")
-            
-            page = await context.new_page()
+        STAGE_SECONDS.observe("browser_launch", time.perf_counter() - mark)
+        try:
+            context = await browser.new_context(**CONTEXT_OPTIONS)
+            yield context
+        finally:
+            await browser.close()
+
+async def _wait_until_ready(page, url: str, readiness: str, timings: Dict) -> Tuple[Optional[Dict], Any]:
+    """
+    Navigates and waits until the page content is complete; fills per-phase timings (ms).
+    Returns (readiness report or None, main document response).
+    """
+    mark = time.perf_counter()
+
+    def phase(name: str):
+        nonlocal mark
+        now = time.perf_counter()
+        timings[name] = round((now - mark) * 1000)
+        mark = now
+
+    if readiness == "fixed":
+        # Increased timeout to 45s and use networkidle to ensure all resources (API, images) are loaded
+        response = await page.goto(url, timeout=45000, wait_until="networkidle")
+        phase("goto")
+        await page.evaluate(AUTO_SCROLL_SCRIPT)
+        phase("scroll")
+        # Extra safety wait for animations/loading after scroll
+        await page.wait_for_timeout(3000)
+        phase("settle")
+        return None, response
+
+    response = await page.goto(url, timeout=45000, wait_until="domcontentloaded")
+    phase("goto")
+    ready = await page.evaluate(READY_SCRIPT, {"quietMs": READY_QUIET_MS, "maxMs": READY_MAX_MS})
+    timings["scroll"] = ready["scroll_ms"]
+    timings["settle"] = ready["settle_ms"]
+    return ready, response
+
+def _screenshot_reusable(previous: Dict, profile: str, screenshots: ScreenshotStore) -> bool:
+    """
+    The previous scan's screenshots (page and crops) can stand in for new ones; they
+    are touched so retention keeps them, and may have been evicted already.
+    """
+    available = screenshots.touch([previous["screenshot"]] + [issue.get("screenshot") for issue in previous["issues"]])
+    if not get_profile(profile)["screenshot"]:
+        return True
+    return bool(previous["screenshot"]) and available
+
+async def _capture(page, screenshots: ScreenshotStore, page_data: Dict):
+    """Full-page screenshot, plus one crop per flagged element when SCREENSHOT_CROPS is on."""
+    options = screenshots.capture_options()
+    # Capture FULL PAGE to ensure we satisfy "screenshot where the problem is"
+    page_data["screenshot"] = screenshots.save(await page.screenshot(full_page=True, **options))
+    if not SCREENSHOT_CROPS:
+        return
+    crops = await page.evaluate(CROPS_SCRIPT, {"maxCrops": SCREENSHOT_MAX_CROPS, "margin": 40})
+    page_data["crops"] = {}
+    for crop in crops:
+        clip = {key: crop[key] for key in ("x", "y", "width", "height")}
+        page_data["crops"][crop["path"]] = screenshots.save(await page.screenshot(clip=clip, full_page=True, **options))
+
+# Start tags of a snapshot (quoted attribute values may contain '>') and their attributes
+SNAPSHOT_TAG = re.compile(r"""(<([a-zA-Z][^\s/>]*))((?:"[^"]*"|'[^']*'|[^'">])*)>""")
+SNAPSHOT_ATTRIBUTE = re.compile(r"""\s+([^\s"'>/=]+)(?:\s*=\s*("[^"]*"|'[^']*'|[^\s>]+))?""")
+
+def _safe_attribute(match: re.Match) -> str:
+    # Event handlers and javascript: URLs (browsers ignore entities, case and control
+    # characters in the scheme) would run when the snapshot loads or is laid out
+    name = match.group(1).lower()
+    value = re.sub(r"[\x00-\x20]", "", html_entities.unescape((match.group(2) or "").strip("\"'"))).lower()
+    if name.startswith("on") or value.startswith("javascript:"):
+        return ""
+    return match.group(0)
+
+def _safe_tag(match: re.Match) -> str:
+    attributes = match.group(3)
+    if match.group(2).lower() == "meta" and re.search(r"http-equiv\s*=\s*[\"']?\s*refresh", attributes, re.IGNORECASE):
+        return ""  # would navigate away from the snapshot
+    return match.group(1) + SNAPSHOT_ATTRIBUTE.sub(_safe_attribute, attributes) + ">"
+
+def _snapshot_document(html: str, url: str) -> str:
+    """Snapshot HTML ready for set_content: scripts, inline event handlers, javascript:
+    URLs and meta refreshes removed (they would undo the highlights or leave the page)
+    and a <base> so relative stylesheets and images still resolve."""
+    html = re.sub(r"<script\b[^>]*>.*?</script\s*>", "", html, flags=re.IGNORECASE | re.DOTALL)
+    html = SNAPSHOT_TAG.sub(_safe_tag, html)
+    base = f'<base href="{url}">'
+    head = re.search(r"<head\b[^>]*>", html, flags=re.IGNORECASE)
+    if head:
+        return html[:head.end()] + base + html[head.end():]
+    return base + html
+
+async def render_snapshot(snapshot: Dict, screenshots: ScreenshotStore, pool: Optional[BrowserPool] = None,
+                          profile: str = CRAWL_PROFILE) -> bytes:
+    """
+    Full-page capture of a deferred screenshot (SCREENSHOT_MODE findings/on_demand,
+    or a page of the HTTP tier): the DOM snapshot taken while crawling, highlighted
+    now if it was not yet, or the live page (highlighted again) when the snapshot
+    cannot be rendered.
+    """
+    async with _open_context(pool) as context:
+        page = await context.new_page()
+        try:
+            await install_resource_blocking(page, profile)
             try:
-                # Increased timeout to 45s and use networkidle to ensure all resources (API, images) are loaded
-                await page.goto(url, timeout=45000, wait_until="networkidle")
-                
-                # Auto-scroll to bottom to trigger lazy loading
-                await page.evaluate("""
-                    async () => {
-                        await new Promise((resolve) => {
-                            let totalHeight = 0;
-                            const distance = 100;
-                            const timer = setInterval(() => {
-                                const scrollHeight = document.body.scrollHeight;
-                                window.scrollBy(0, distance);
-                                totalHeight += distance;
-
-                                if(totalHeight >= scrollHeight){
-                                    clearInterval(timer);
-                                    resolve();
-                                }
-                            }, 100);
-                        });
-                    }
-                """)
-                
-                # Extra safety wait for animations/loading after scroll
-                await page.wait_for_timeout(3000)
-                
-                # --- VISUAL HIGHLIGHT INJECTION ---
-                from .rules import FORBIDDEN_TERMS
-                terms_to_highlight = list(FORBIDDEN_TERMS.keys())
-                
-                # Execute JS to find and highlight terms AND regex patterns
-                await page.evaluate(f"""
-                    (terms) => {{
-                        function highlightText(root, term, isRegex=false) {{
-                            const walker = document.createTreeWalker(root, NodeFilter.SHOW_TEXT, null, false);
-                            let node;
-                            const nodesToHighlight = [];
-                            
-                            while (node = walker.nextNode()) {{
-                                let match = false;
-                                if (isRegex) {{
-                                    if (term.test(node.nodeValue)) match = true;
-                                }} else {{
-                                    if (node.nodeValue.toLowerCase().includes(term)) match = true;
-                                }}
-                                
-                                if (match) nodesToHighlight.push(node);
-                            }}
-                            
-                            nodesToHighlight.forEach(node => {{
-                                const parent = node.parentNode;
-                                if (parent && parent.style) {{
-                                   if (isRegex) {{
-                                        // Specific style for Rates/Numbers (Blue/Cyan)
-                                        parent.style.border = '3px dashed blue';
-                                        parent.style.backgroundColor = '#e0f7fa'; 
-                                        parent.style.color = 'black'; 
-                                   }} else {{
-                                        // Danger terms (Red/Yellow)
-                                        parent.style.border = '5px solid red';
-                                        parent.style.backgroundColor = 'yellow';
-                                        parent.style.color = 'black';
-                                   }}
-                                }}
-                            }});
-                        }}
-                        
-                        // Highlight forbidden terms
-                        terms.forEach(term => {{
-                            highlightText(document.body, term);
-                        }});
-                        
-                        // Highlight Potential Rates (Regex for percentages)
-                        // Matches number + space? + %
-                        const rateRegex = /\\d+([.,]\\d+)?\\s?%/;
-                        highlightText(document.body, rateRegex, true);
-                    }}
-                """, terms_to_highlight)
-                
-                # Capture FULL PAGE to ensure we satisfy "screenshot where the problem is"
-                # Screenshot is taken AFTER highlighting
-                filename = f"{uuid.uuid4()}.png"
-                screenshot_path = os.path.join(SCREENSHOT_DIR, filename)
-                await page.screenshot(path=screenshot_path, full_page=True)
-                
-                # Get text and HTML content
-                text_content = await page.evaluate("document.body.innerText")
-                html_content = await page.content() # Capture raw HTML for location tagging
-                
-                results.append({
-                    "url": url,
-                    "text": text_content,
-                    "html": html_content,
-                    "screenshot": f"screenshots/{filename}" # Relative path for frontend
-                })
-                
-                # Find internal links
-                links = await page.evaluate("""
-                    () => {
-                        return Array.from(document.querySelectorAll('a[href]'))
-                            .map(a => a.href)
-                            .filter(href => href.startsWith(window.location.origin))
-                    }
-                """)
-                
-                for link in links:
-                    if link not in visited_urls and link not in queue:
-                        queue.append(link)
-                        
+                # Sanitizing a large DOM takes a while: off the event loop
+                document = await asyncio.to_thread(_snapshot_document, snapshot["html"], snapshot["url"])
+                await page.set_content(document, timeout=30000, wait_until="load")
+                if snapshot.get("highlight"):
+                    await page.evaluate(HIGHLIGHT_SCRIPT, list(FORBIDDEN_FOLDED))
             except Exception as e:
-                print(f"Error crawling {url}: {e}")
+                print(f"Snapshot of {snapshot['url']} could not be rendered ({e}), re-opening the page")
+                await page.goto(snapshot["url"], timeout=45000, wait_until="load")
+                await page.evaluate(HIGHLIGHT_SCRIPT, list(FORBIDDEN_FOLDED))
+            return await page.screenshot(full_page=True, **screenshots.capture_options())
+        finally:
+            await page.close()
+
+async def _not_modified(context, url: str, previous: Dict) -> bool:
+    """Conditional GET with the previous validators; True when the server answers 304."""
+    headers = {}
+    if previous.get("etag"):
+        headers["If-None-Match"] = previous["etag"]
+    if previous.get("last_modified"):
+        headers["If-Modified-Since"] = previous["last_modified"]
+    if not headers:
+        return False
+    try:
+        response = await context.request.get(url, headers=headers, timeout=15000)
+    except Exception as e:
+        print(f"Conditional request failed for {url}: {e}")
+        return False
+    status = response.status
+    await response.dispose()
+    return status == 304
+
+def _previous_scan(url: str, profile: str, fingerprints: Optional[FingerprintStore],
+                   screenshots: ScreenshotStore) -> Optional[Dict]:
+    """Fingerprint of the URL's last scan when an incremental crawl can build on it."""
+    previous = fingerprints.get(url) if fingerprints is not None else None
+    if previous is not None and not _screenshot_reusable(previous, profile, screenshots):
+        return None
+    return previous
+
+async def _crawl_page(context, url: str, extract: str = CRAWL_EXTRACT,
+                      readiness: str = CRAWL_READINESS, profile: str = CRAWL_PROFILE,
+                      fingerprints: Optional[FingerprintStore] = None,
+                      screenshots: Optional[ScreenshotStore] = None) -> Tuple[Optional[Dict], List[str]]:
+    """
+    Loads one URL in its own tab: wait for readiness, highlight, screenshot, extract.
+    With extract="browser" the page dict carries 'nodes' (located text nodes) instead of 'html'.
+    The page dict also carries 'timings' (milliseconds per phase), 'network'
+    (requests/bytes loaded, requests blocked by the crawl profile and an estimate
+    of the bytes blocking saved) and 'fingerprint' (validators, text hash and
+    links, see fingerprints.py).
+    With a fingerprint store (incremental scan), a page unchanged since the last
+    scan is marked 'reused' ("not_modified" or "same_text") and carries the
+    previous 'issues' and screenshot instead of being screenshotted again.
+    Screenshots go through the store (see screenshots.py); with crops enabled the
+    page dict also carries 'crops' ({DOM path: screenshot}).
+    Returns (page dict or None on failure, internal links found as {'url', 'text', 'footer'}).
+    """
+    timings: Dict[str, int] = {}
+    screenshots = screenshots or ScreenshotStore()
+    previous = _previous_scan(url, profile, fingerprints, screenshots)
+
+    if previous is not None:
+        mark = time.perf_counter()
+        if await _not_modified(context, url, previous):
+            timings["revalidate"] = round((time.perf_counter() - mark) * 1000)
+            print(f"Not modified since last scan: {url}")
+            fingerprint = {k: previous[k] for k in ("etag", "last_modified", "text_hash", "links")}
+            page_data = {
+                "url": url, "text": "", "screenshot": previous["screenshot"],
+                "reused": "not_modified", "issues": previous["issues"], "fingerprint": fingerprint,
+                "timings": timings,
+                "network": {"profile": profile, "requests": 1, "bytes": 0, "blocked": 0, "blocked_by_type": {},
+                            "bytes_saved_estimate": 0},
+            }
+            observe_timings(timings)
+            return page_data, previous["links"]
+        timings["revalidate"] = round((time.perf_counter() - mark) * 1000)
+
+    print(f"Crawling (Playwright): {url}")
+    page = await context.new_page()
+    try:
+        network = await install_resource_blocking(page, profile)
+        ready, response = await _wait_until_ready(page, url, readiness, timings)
+        mark = time.perf_counter()
+
+        if extract == "browser":
+            # --- VISUAL HIGHLIGHT + EXTRACTION (one round trip, timed as "extract") ---
+            extracted = await page.evaluate(EXTRACT_SCRIPT, list(FORBIDDEN_FOLDED))
+            page_data = {"url": url, "text": extracted["text"], "nodes": extracted["nodes"]}
+            links = extracted["links"]
+        else:
+            # --- VISUAL HIGHLIGHT INJECTION ---
+            await page.evaluate(HIGHLIGHT_SCRIPT, list(FORBIDDEN_FOLDED))
+            timings["highlight"] = round((time.perf_counter() - mark) * 1000)
+            mark = time.perf_counter()
+
+            # Get text and HTML content
+            text_content = await page.evaluate("document.body.innerText")
+            html_content = await page.content() # Capture raw HTML for location tagging
+            page_data = {"url": url, "text": text_content, "html": html_content}
+            links = await page.evaluate(LINKS_SCRIPT)
+        timings["extract"] = round((time.perf_counter() - mark) * 1000)
+        mark = time.perf_counter()
+
+        headers = response.headers if response is not None else {}
+        page_data["fingerprint"] = {
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "text_hash": text_hash(page_data["text"]),
+            "links": links,
+        }
+
+        page_data["screenshot"] = ""
+        if previous is not None and previous["text_hash"] == page_data["fingerprint"]["text_hash"]:
+            # Same visible text as last scan: keep its screenshot and issues
+            page_data.update(screenshot=previous["screenshot"], reused="same_text", issues=previous["issues"])
+        elif get_profile(profile)["screenshot"]:
+            if screenshots.mode == "eager":
+                # Screenshot is taken AFTER highlighting; encoding and writing happen off this path
+                await _capture(page, screenshots, page_data)
+            else:
+                # Deferred: keep the highlighted DOM, captured later by render_snapshot
+                page_data["screenshot"] = screenshots.defer(url, page_data.get("html") or await page.content())
+            timings["screenshot"] = round((time.perf_counter() - mark) * 1000)
+
+        page_data["timings"] = timings
+        page_data["network"] = network
+        observe_timings(timings)
+        print(f"Crawled {url} in {sum(timings.values())} ms {timings}"
+              + (f" (ready: {ready['reason']}, {ready['scrolls']} scrolls)" if ready else "")
+              + f" | {profile}: {network['requests']} requests, {network['bytes'] // 1024} KB, {network['blocked']} blocked"
+              + f" (~{network['bytes_saved_estimate'] // 1024} KB saved)"
+              + (" (unchanged)" if page_data.get("reused") else ""))
+        return page_data, links
+
+    except Exception as e:
+        print(f"Error crawling {url}: {e}")
+        return None, []
+    finally:
+        await page.close()
+
+async def iter_site(start_url: str, max_pages: int = 3, pool: Optional[BrowserPool] = None,
+                    concurrency: int = CRAWL_CONCURRENCY, per_host_limit: int = CRAWL_PER_HOST_LIMIT,
+                    extract: str = CRAWL_EXTRACT, readiness: str = CRAWL_READINESS,
+                    profile: str = CRAWL_PROFILE,
+                    fingerprints: Optional[FingerprintStore] = None,
+                    screenshots: Optional[ScreenshotStore] = None,
+                    timings: Optional[Dict] = None,
+                    fetch: str = CRAWL_FETCH, http_client=None) -> AsyncIterator[Dict]:
+    """
+    Crawls the site using Playwright, yielding each page as soon as it is crawled
+    (and its screenshot is on disk), so it can be analyzed while the crawl goes on.
+    When a BrowserPool is given the crawl runs in one of its contexts instead of launching Chromium.
+    Up to `concurrency` pages load at once in the same context (at most `per_host_limit` per host);
+    crawled pages wait for the consumer once `concurrency` of them are pending.
+    Which pages are crawled is decided by the frontier (see frontier.py): normalized-URL
+    dedup, likely compliance pages first, exclusions, robots.txt and sitemap seeding.
+    Pages arrive in completion order; page['order'] is the page's frontier key
+    (sort by it to get the order a sequential crawl would have visited them in).
+    extract="browser" returns located text nodes ('nodes') instead of the full 'html'.
+    readiness picks how each page is waited for ("observer" or the legacy "fixed" sleeps).
+    profile picks which resources load ("full", "light", or "text" = no images and no screenshot).
+    fingerprints, if given, makes the crawl incremental: pages unchanged since the
+    last scan are marked 'reused' and skip the screenshot (and rendering on a 304).
+    screenshots is the store captures are written to (a default one when omitted).
+    timings, if given, receives the site-level stage timings (ms): "context" (waiting
+    for a browser context, launch included) and "seed" (robots.txt and sitemap).
+    fetch="tiered" tries each page over plain HTTP first (see http_fetch.py, through
+    http_client or a client of its own) and renders only the pages that need a
+    browser; the browser context is then only opened for those.
+    Yields dicts: {'url': str, 'text': str, 'screenshot': str, 'nodes' or 'html', 'timings': dict,
+    'network': dict, 'fingerprint': dict, 'order': list, 'tier': "http" or "browser",
+    'escalated': why the HTTP tier passed the page on (tiered fetch only)}
+    """
+    if fetch not in FETCH_MODES:
+        raise ValueError(f"Unknown fetch mode '{fetch}' (expected one of: {', '.join(FETCH_MODES)})")
+    frontier = Frontier(start_url)
+    dispatched = 0
+    in_flight = 0
+    condition = asyncio.Condition()
+    host_limits: Dict[str, asyncio.Semaphore] = {}
+    # Crawled pages not yet taken by the consumer (None marks the end of the crawl)
+    finished: asyncio.Queue = asyncio.Queue(maxsize=max(1, concurrency))
+    errors: List[BaseException] = []
+
+    async def worker():
+        nonlocal dispatched, in_flight
+        while True:
+            async with condition:
+                # Idle while other pages may still add links to the frontier
+                while not frontier and in_flight > 0 and dispatched < max_pages:
+                    await condition.wait()
+                if not frontier or dispatched >= max_pages:
+                    condition.notify_all()
+                    return
+                key, url = frontier.pop()
+                dispatched += 1
+                in_flight += 1
+
+            page_data, links = None, []
+            try:
+                host = urlparse(url).netloc
+                limit = host_limits.setdefault(host, asyncio.Semaphore(max(1, per_host_limit)))
+                async with limit:
+                    page_data, links = await fetch_one(url)
             finally:
-                await page.close()
-                
-        await browser.close()
-        
-    return results
+                async with condition:
+                    in_flight -= 1
+                    frontier.add_links(key, links)
+                    condition.notify_all()
+            if page_data:
+                page_data["order"] = list(key)
+                await finished.put(page_data)
+
+    async def browser_context():
+        # Opened on first use: a tiered crawl of a server-rendered site never needs one
+        nonlocal context, context_error
+        async with context_lock:
+            # A browser that failed to start fails every page, without relaunching
+            if context_error is not None:
+                raise context_error
+            if context is None:
+                mark = time.perf_counter()
+                try:
+                    context = await stack.enter_async_context(_open_context(pool))
+                except Exception as e:
+                    context_error = e
+                    raise
+                timings["context"] = round((time.perf_counter() - mark) * 1000)
+                observe_timings({"context": timings["context"]})
+        return context
+
+    async def fetch_one(url: str) -> Tuple[Optional[Dict], List]:
+        reason = None
+        if fetch == "tiered":
+            previous = _previous_scan(url, profile, fingerprints, screenshots)
+            page_data, links, reason = await fetch_page(http_client, url, profile, fingerprints, screenshots, previous)
+            if page_data is not None:
+                observe_timings(page_data["timings"])
+                print(f"Fetched (HTTP) {url} in {sum(page_data['timings'].values())} ms {page_data['timings']}"
+                      + (" (unchanged)" if page_data.get("reused") else ""))
+                return page_data, links
+            print(f"Rendering {url} in the browser ({reason})")
+        page_data, links = await _crawl_page(await browser_context(), url, extract, readiness, profile,
+                                             fingerprints, screenshots)
+        if page_data is not None:
+            page_data["tier"] = "browser"
+            if reason:
+                page_data["escalated"] = reason
+        return page_data, links
+
+    async def run_workers():
+        tasks = [asyncio.create_task(worker()) for _ in range(max(1, min(concurrency, max_pages)))]
+        try:
+            await asyncio.gather(*tasks)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            # One worker failed (or the crawl was stopped): don't leave the others running
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        await finished.put(None)
+
+    screenshots = screenshots or ScreenshotStore()
+    timings = {} if timings is None else timings
+    context = None
+    context_error: Optional[BaseException] = None
+    context_lock = asyncio.Lock()
+    async with AsyncExitStack() as stack:
+        if fetch == "tiered" and http_client is None:
+            http_client = create_http_client()
+            if http_client is None:
+                print("CRAWL_FETCH=tiered but httpx is not installed, rendering every page")
+                fetch = "browser"
+            else:
+                stack.push_async_callback(http_client.aclose)
+        mark = time.perf_counter()
+        # robots.txt and the sitemap come over HTTP too when the browser may not be needed
+        await frontier.seed(http_client if fetch == "tiered" else await browser_context())
+        timings["seed"] = round((time.perf_counter() - mark) * 1000) - timings.get("context", 0)
+        observe_timings({"seed": timings["seed"]})
+        runner = asyncio.create_task(run_workers())
+        try:
+            while True:
+                page_data = await finished.get()
+                if page_data is None:
+                    break
+                await screenshots.wait([page_data["screenshot"], *page_data.get("crops", {}).values()])
+                yield page_data
+        finally:
+            # Consumer gave up early: stop crawling
+            runner.cancel()
+            await asyncio.gather(runner, return_exceptions=True)
+            print(f"Frontier for {start_url}: {frontier.stats}")
+    if errors:
+        raise errors[0]
+
+async def crawl_site(start_url: str, max_pages: int = 3, pool: Optional[BrowserPool] = None,
+                     concurrency: int = CRAWL_CONCURRENCY, per_host_limit: int = CRAWL_PER_HOST_LIMIT,
+                     on_page: Optional[Callable[[Dict], Awaitable[None]]] = None,
+                     extract: str = CRAWL_EXTRACT, readiness: str = CRAWL_READINESS,
+                     profile: str = CRAWL_PROFILE,
+                     fingerprints: Optional[FingerprintStore] = None,
+                     screenshots: Optional[ScreenshotStore] = None) -> List[Dict]:
+    """
+    iter_site collected into a list, in frontier order regardless of which
+    page finished first (see iter_site for the arguments).
+    on_page, if given, is awaited with each page as soon as it has been crawled.
+    Returns a list of dicts: {'url': str, 'text': str, 'screenshot': str, 'nodes' or 'html', 'timings': dict,
+    'network': dict, 'fingerprint': dict, 'order': list}
+    """
+    pages = []
+    async for page_data in iter_site(start_url, max_pages, pool, concurrency, per_host_limit,
+                                     extract, readiness, profile, fingerprints, screenshots):
+        pages.append(page_data)
+        if on_page:
+            await on_page(page_data)
+    pages.sort(key=lambda page_data: page_data["order"])
+    return pages
@@ -0,0 +1,194 @@
+from bisect import bisect_right
+from bs4 import BeautifulSoup
+from bs4.element import Comment, Declaration, Doctype, ProcessingInstruction, Tag
+import os
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .normalized_text import NormalizedText
+
+# Optional faster parser (pip install lxml); html.parser is used when missing
+try:
+    from lxml import etree
+    import lxml.html
+except ImportError:
+    lxml = None
+
+# "auto" picks lxml when installed, otherwise "html.parser"
+HTML_PARSER = os.getenv("HTML_PARSER", "auto")
+
+# Elements whose text is never shown to the reader (the same ones the crawler's
+# EXTRACT_SCRIPT skips: noscript is not rendered with JavaScript on, template never)
+SKIPPED_TAGS = {"script", "style", "noscript", "template"}
+
+# Text nodes that are never rendered
+_INVISIBLE = (Comment, Declaration, Doctype, ProcessingInstruction)
+
+
+class TextNode(NamedTuple):
+    """One visible text node and where it lives in the DOM."""
+    text: str
+    tag: str            # parent element
+    classes: Tuple[str, ...]
+    path: str           # e.g. "html > body > footer.site > p:nth-of-type(2)"
+
+
+def _label(tag: str, classes, position: int = 1) -> str:
+    # position: among the parent's children with the same tag, shown from the second
+    # on, so sibling blocks alike (two "div.card") keep apart
+    label = tag + "".join("." + c for c in classes)
+    return label if position <= 1 else f"{label}:nth-of-type({position})"
+
+
+def _nodes_from_soup(html: str) -> List[TextNode]:
+    soup = BeautifulSoup(html, 'html.parser')
+    # Remove script and style elements to avoid matching CSS/JS
+    for script in soup(list(SKIPPED_TAGS)):
+        script.extract()
+
+    paths: Dict[int, str] = {}
+    # id(parent) -> {id(child element): position among the children with its tag}
+    positions: Dict[int, Dict[int, int]] = {}
+
+    def position(el: Tag) -> int:
+        table = positions.get(id(el.parent))
+        if table is None:
+            table = positions[id(el.parent)] = {}
+            counts: Dict[str, int] = {}
+            for child in el.parent.children:
+                if isinstance(child, Tag):
+                    counts[child.name] = counts.get(child.name, 0) + 1
+                    table[id(child)] = counts[child.name]
+        return table[id(el)]
+
+    def path_of(el: Tag) -> str:
+        # Up to the closest ancestor with a known path, then down (no recursion: pages nest deep)
+        chain = []
+        while isinstance(el, Tag) and el.name != '[document]' and id(el) not in paths:
+            chain.append(el)
+            el = el.parent
+        path = paths.get(id(el), "")
+        for el in reversed(chain):
+            label = _label(el.name, el.get('class', []), position(el))
+            path = paths[id(el)] = path + " > " + label if path else label
+        return path
+
+    nodes = []
+    for string in soup.find_all(string=True):
+        if isinstance(string, _INVISIBLE) or not string.strip():
+            continue
+        parent = string.parent
+        nodes.append(TextNode(str(string), parent.name, tuple(parent.get('class', [])), path_of(parent)))
+    return nodes
+
+
+def _nodes_from_lxml(html: str) -> List[TextNode]:
+    # huge_tree: without it libxml2 silently drops content nested deeper than 256 elements
+    parser = lxml.html.HTMLParser(encoding='utf-8', huge_tree=True)
+    # document_fromstring always yields the <html> root (fromstring returns a
+    # fragment element whose ancestors iterwalk never visits)
+    try:
+        root = lxml.html.document_fromstring(html.encode('utf-8'), parser=parser)
+    except etree.ParserError:
+        # "Document is empty": nothing but whitespace, comments or a doctype
+        return []
+
+    # Element -> (tag, classes, path, {child tag: children seen}); filled on "start"
+    # so children find their parent
+    info: Dict = {}
+    nodes = []
+    skipping = 0
+
+    def add(text, element):
+        if text and text.strip() and not skipping:
+            tag, classes, path, _ = info[element]
+            nodes.append(TextNode(text, tag, classes, path))
+
+    for event, element in etree.iterwalk(root, events=("start", "end")):
+        is_element = isinstance(element.tag, str)
+        if event == "start":
+            if is_element:
+                parent = element.getparent()
+                classes = tuple(element.get('class', '').split())
+                if parent is not None:
+                    counts = info[parent][3]
+                    counts[element.tag] = counts.get(element.tag, 0) + 1
+                    path = info[parent][2] + " > " + _label(element.tag, classes, counts[element.tag])
+                else:
+                    path = _label(element.tag, classes)
+                info[element] = (element.tag, classes, path, {})
+                if element.tag in SKIPPED_TAGS:
+                    skipping += 1
+                else:
+                    add(element.text, element)
+        else:
+            if is_element and element.tag in SKIPPED_TAGS:
+                skipping -= 1
+            # Tail text follows the element but belongs to its parent
+            parent = element.getparent()
+            if parent is not None:
+                add(element.tail, parent)
+    return nodes
+
+
+def available_parser(preferred: str = HTML_PARSER) -> str:
+    if preferred == "auto":
+        return "lxml" if lxml is not None else "html.parser"
+    if preferred == "lxml" and lxml is None:
+        print("HTML_PARSER=lxml but lxml is not installed, using html.parser")
+        return "html.parser"
+    return preferred
+
+
+class DomTextIndex:
+    """
+    Every visible text node of a page, extracted in one parse into a compact array.
+    The node texts are also joined into a single string so any regex runs once
+    over the whole page and each match maps back to its node.
+    """
+
+    def __init__(self, nodes: List[TextNode]):
+        self.nodes = nodes
+        self.starts: List[int] = []
+        offset = 0
+        for node in nodes:
+            self.starts.append(offset)
+            offset += len(node.text) + 1
+        # NUL never matches \s or a term, so matches cannot straddle two nodes
+        self.text = "\0".join(node.text for node in nodes)
+
+    @classmethod
+    def from_html(cls, html: str, parser: Optional[str] = None) -> "DomTextIndex":
+        parser = available_parser(parser or HTML_PARSER)
+        if parser == "lxml":
+            return cls(_nodes_from_lxml(html))
+        return cls(_nodes_from_soup(html))
+
+    def position(self, offset: int) -> Tuple[int, int]:
+        """(node number, offset inside that node) for an offset into self.text."""
+        i = bisect_right(self.starts, offset) - 1
+        return i, offset - self.starts[i]
+
+    def node_at(self, offset: int) -> Tuple[TextNode, int]:
+        """(node, offset inside that node) for an offset into self.text."""
+        i, inner = self.position(offset)
+        return self.nodes[i], inner
+
+    def first_matches(self, pattern: re.Pattern, normalized: NormalizedText) -> Dict[str, Tuple[TextNode, int, int]]:
+        """
+        For a term pattern (see matcher.compile_terms) run over `normalized`, the
+        NormalizedText of self.text: first node holding each term (keyed by the
+        folded term), with the term's (start, end) inside the node.
+        """
+        first: Dict[str, Tuple[TextNode, int, int]] = {}
+        for match in pattern.finditer(normalized.text):
+            term = match.group(1)
+            if term not in first:
+                start, end = normalized.original_span(match.start(1), match.end(1))
+                node, inner = self.node_at(start)
+                first[term] = (node, inner, inner + end - start)
+        return first
+
+def describe_tag(node: TextNode) -> str:
+    """Location guide label for a text node, e.g. "Tag: <div.promo.banner>"."""
+    return f"Tag: <{_label(node.tag, node.classes)}>"
@@ -0,0 +1,51 @@
+# Per-URL fingerprints of the last scan, for incremental re-scans.
+#
+# After a page is analyzed we keep its HTTP validators (ETag/Last-Modified),
+# a hash of its innerText, its internal links, issues and screenshot. On the
+# next incremental scan:
+#   - a conditional request answered with 304 skips rendering altogether
+#   - a rendered page whose text hash is unchanged skips screenshot + analysis
+# Either way the previous issues and screenshot are reused.
+
+import hashlib
+import os
+import re
+from typing import Dict, List, Optional
+
+from .cache import CACHE_BACKEND, RULES_VERSION, CacheLevel
+from .urls import normalize_url
+
+FINGERPRINT_TTL = int(os.getenv("FINGERPRINT_TTL", str(30 * 24 * 3600)))  # seconds
+
+
+def text_hash(text: str) -> str:
+    """Hash of the visible text, insensitive to whitespace-only changes."""
+    return hashlib.sha256(re.sub(r"\s+", " ", text).strip().encode("utf-8")).hexdigest()
+
+
+class FingerprintStore:
+    """Last known state of each URL, stored in a cache level (memory or SQLite)."""
+
+    def __init__(self, backend: str = CACHE_BACKEND):
+        self.level = CacheLevel("fingerprint", FINGERPRINT_TTL, backend)
+
+    def get(self, url: str) -> Optional[Dict]:
+        """Fingerprint of the previous scan, or None (never scanned or rules changed since)."""
+        fingerprint = self.level.get(normalize_url(url))
+        if fingerprint is None or fingerprint["rules_version"] != RULES_VERSION:
+            return None
+        return fingerprint
+
+    def record(self, page: Dict, issues: List[Dict]):
+        """Stores the fingerprint the crawler attached to a page, with its analysis."""
+        if "fingerprint" not in page:
+            return
+        self.level.set(normalize_url(page["url"]), dict(
+            page["fingerprint"],
+            rules_version=RULES_VERSION,
+            screenshot=page["screenshot"],
+            issues=issues,
+        ))
+
+    def stats(self) -> Dict:
+        return self.level.stats()
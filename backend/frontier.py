@@ -0,0 +1,210 @@
+# Crawl frontier: which page of a site is crawled next.
+#
+# URLs are deduplicated on their normalized form (see urls.normalize_url), so
+# #anchors, tracking parameters and trailing slashes do not spend the page budget.
+# Pages likely to matter for compliance (credit offers, simulators, TAEG, legal
+# footer pages) are visited first; non-HTML assets, logins and paths disallowed
+# by robots.txt are skipped. The sitemap seeds pages the start page does not link to.
+
+import heapq
+import os
+import re
+import xml.etree.ElementTree as ElementTree
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import unquote, urljoin, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+
+from .cache import MemoryStore
+from .urls import normalize_url
+
+# "0" ignores robots.txt (Disallow rules and its Sitemap entries)
+CRAWL_ROBOTS = os.getenv("CRAWL_ROBOTS", "1") == "1"
+# "0" disables sitemap seeding
+CRAWL_SITEMAP = os.getenv("CRAWL_SITEMAP", "1") == "1"
+SITEMAP_MAX_URLS = int(os.getenv("SITEMAP_MAX_URLS", "500"))
+SITE_INFO_TTL = int(os.getenv("SITE_INFO_TTL", "3600"))  # seconds robots/sitemap are reused per origin
+SITE_INFO_MAX_ORIGINS = int(os.getenv("SITE_INFO_MAX_ORIGINS", "1000"))  # least recently used beyond this are dropped
+
+# Links never worth a page of the budget: files, feeds, logins, carts
+DEFAULT_EXCLUDE = [
+    r"\.(pdf|jpe?g|png|gif|svg|webp|ico|zip|rar|docx?|xlsx?|pptx?|mp4|mp3|avi|css|js|json|xml|ics|txt)$",
+    r"/(wp-admin|wp-login\.php|login|logout|signin|sign-in|entrar|sair|minha-conta|my-account|cart|carrinho|checkout)(/|$)",
+    r"/(feed|rss|wp-json)(/|$)",
+]
+EXCLUDE_PATTERNS = [re.compile(p, re.IGNORECASE) for p in DEFAULT_EXCLUDE + [
+    p.strip() for p in os.getenv("CRAWL_EXCLUDE", "").split(",") if p.strip()]]
+
+# Words in a link's path or text that point at pages the rules care about
+PRIORITY_TERMS: Dict[str, int] = {
+    "taeg": 3, "simulador": 3, "simulacao": 3, "simulação": 3, "credito": 3, "crédito": 3,
+    "intermediario": 3, "intermediário": 3, "precario": 3, "preçário": 3,
+    "emprestimo": 2, "empréstimo": 2, "financiamento": 2, "legal": 2, "termos": 2,
+    "condicoes": 2, "condições": 2, "reclamacoes": 2, "reclamações": 2,
+    "informacao": 1, "informação": 1, "privacidade": 1, "sobre": 1, "quem-somos": 1, "contactos": 1,
+}
+for _entry in os.getenv("CRAWL_PRIORITY_TERMS", "").split(","):
+    if ":" in _entry:
+        _term, _weight = _entry.rsplit(":", 1)
+        PRIORITY_TERMS[_term.strip().lower()] = int(_weight)
+
+# Footer links are where the legal/registration pages live
+FOOTER_BONUS = 1
+
+# A link as found by the in-page scripts: {'url', 'text', 'footer'} (or a bare URL)
+Link = Union[Dict, str]
+
+# origin -> (robots parser or None, sitemap URLs); every entry has size 1, so
+# the store holds at most SITE_INFO_MAX_ORIGINS origins
+_site_info = MemoryStore(SITE_INFO_MAX_ORIGINS)
+
+
+def link_score(url: str, text: str = "", footer: bool = False) -> int:
+    """Priority of a link: weights of the terms in its path and text, plus the footer bonus."""
+    haystack = unquote(urlsplit(url).path).lower() + " " + text.lower()
+    score = sum(weight for term, weight in PRIORITY_TERMS.items() if term in haystack)
+    return score + (FOOTER_BONUS if footer else 0)
+
+
+def is_excluded(url: str) -> bool:
+    path = urlsplit(url).path
+    return any(pattern.search(path) for pattern in EXCLUDE_PATTERNS)
+
+
+def _site_host(url: str) -> str:
+    """Host without "www.", so www/non-www links count as the same site."""
+    host = urlsplit(url).hostname or ""
+    return host[4:] if host.startswith("www.") else host
+
+
+def _dedup_key(url: str) -> str:
+    normalized = normalize_url(url)
+    return normalized.replace("://www.", "://", 1)
+
+
+def _without_fragment(url: str) -> str:
+    return urlunsplit(urlsplit(url)._replace(fragment=""))
+
+
+class Frontier:
+    """
+    Pages waiting to be crawled, popped highest priority first.
+    Keys are (tier, -score, depth, link positions...): the start page first (tier 0),
+    then by score, then in BFS discovery order. Sorting pages by key gives the
+    order a sequential crawl would have visited them in.
+    """
+
+    def __init__(self, start_url: str):
+        self.start_url = start_url
+        self.host = _site_host(start_url)
+        self._heap: List[Tuple[Tuple, str]] = [((0, 0, 0), _without_fragment(start_url))]
+        self._seen = {_dedup_key(start_url)}
+        self.robots: Optional[RobotFileParser] = None
+        self.stats = {"queued": 1, "duplicates": 0, "excluded": 0, "disallowed": 0, "sitemap": 0}
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def pop(self) -> Tuple[Tuple, str]:
+        return heapq.heappop(self._heap)
+
+    def add(self, url: str, key: Tuple) -> bool:
+        """Queues a URL unless already seen, off-site, excluded or disallowed by robots.txt."""
+        dedup_key = _dedup_key(url)
+        if dedup_key in self._seen:
+            self.stats["duplicates"] += 1
+            return False
+        self._seen.add(dedup_key)
+        if _site_host(url) != self.host or is_excluded(url):
+            self.stats["excluded"] += 1
+            return False
+        if self.robots is not None and not self.robots.can_fetch("*", url):
+            self.stats["disallowed"] += 1
+            return False
+        heapq.heappush(self._heap, (key, _without_fragment(url)))
+        self.stats["queued"] += 1
+        return True
+
+    def add_links(self, parent_key: Tuple, links: List[Link]):
+        """Queues the links found on the page crawled under parent_key."""
+        depth, path = parent_key[2] + 1, parent_key[3:]
+        for position, link in enumerate(links):
+            if isinstance(link, str):
+                link = {"url": link}
+            score = link_score(link["url"], link.get("text", ""), link.get("footer", False))
+            self.add(link["url"], (1, -score, depth) + path + (position,))
+
+    async def seed(self, context):
+        """
+        Loads robots.txt (Disallow rules) and the sitemap (extra pages, scored like
+        links one level below the start page) through the context's request API,
+        or through an httpx client (tiered fetch, see http_fetch.py).
+        """
+        if not (CRAWL_ROBOTS or CRAWL_SITEMAP):
+            return
+        parts = urlsplit(self.start_url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        cached = _site_info.get(origin)
+        if cached is not None:
+            robots, sitemap_urls = cached
+        else:
+            robots, sitemap_urls = await _load_site_info(context, origin)
+            _site_info.set(origin, (robots, sitemap_urls), SITE_INFO_TTL, 1)
+
+        if CRAWL_ROBOTS:
+            self.robots = robots
+        if CRAWL_SITEMAP:
+            for position, url in enumerate(sitemap_urls):
+                if self.add(url, (1, -link_score(url), 1, 1_000_000 + position)):
+                    self.stats["sitemap"] += 1
+
+
+async def _fetch_text(context, url: str) -> Optional[str]:
+    if not hasattr(context, "new_page"):
+        # httpx client of the HTTP tier, not a browser context
+        try:
+            response = await context.get(url, timeout=5)
+            return response.text if response.is_success else None
+        except Exception as e:
+            print(f"Could not fetch {url}: {e}")
+            return None
+    try:
+        response = await context.request.get(url, timeout=5000)
+        try:
+            return await response.text() if response.ok else None
+        finally:
+            await response.dispose()
+    except Exception as e:
+        print(f"Could not fetch {url}: {e}")
+        return None
+
+
+async def _load_site_info(context, origin: str) -> Tuple[Optional[RobotFileParser], List[str]]:
+    robots = None
+    sitemaps = []
+    robots_txt = await _fetch_text(context, origin + "/robots.txt")
+    if robots_txt is not None:
+        robots = RobotFileParser()
+        robots.parse(robots_txt.splitlines())
+        sitemaps = [urljoin(origin + "/", sitemap) for sitemap in robots.site_maps() or []]
+    if CRAWL_SITEMAP and not sitemaps:
+        sitemaps = [origin + "/sitemap.xml"]
+
+    urls: List[str] = []
+    # Sitemap indexes point at more sitemaps; follow them until the URL cap
+    pending = sitemaps[:5]
+    fetched = 0
+    while pending and len(urls) < SITEMAP_MAX_URLS and fetched < 10:
+        xml = await _fetch_text(context, pending.pop(0))
+        fetched += 1
+        if not xml:
+            continue
+        try:
+            root = ElementTree.fromstring(xml.encode("utf-8"))
+        except ElementTree.ParseError:
+            continue
+        locations = [urljoin(origin, loc.text.strip()) for loc in root.findall(".//{*}loc") if loc.text]
+        if root.tag.endswith("sitemapindex"):
+            pending.extend(locations)
+        else:
+            urls.extend(locations[:SITEMAP_MAX_URLS - len(urls)])
+    return robots, urls
@@ -0,0 +1,280 @@
+# HTTP fast path for the crawl (CRAWL_FETCH=tiered).
+#
+# Most credit sites are server-rendered: their text is in the HTML the server
+# sends. A plain GET over a pooled keep-alive client, parsed once into the DOM
+# text index, gives the rules what they need in a fraction of a browser visit.
+# A page escalates to the Playwright path when the HTML looks like it needs a
+# browser: too little text (what the "Erro de Leitura" rule would report), an
+# empty SPA mount point, a bot wall / challenge page, or a client-side redirect.
+# Screenshots of HTTP pages are deferred (see screenshots.py).
+
+import codecs
+import os
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+from .browser_pool import CONTEXT_OPTIONS
+from .dom_index import DomTextIndex, available_parser
+from .fingerprints import FingerprintStore, text_hash
+from .profiles import get_profile
+from .screenshots import ScreenshotStore
+
+# Optional HTTP client (pip install httpx); without it every page is rendered
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Optional faster parser for the links (the text index has its own fallback)
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+# "browser": every page rendered by Playwright
+# "tiered": HTTP first, Playwright only for pages that need it
+CRAWL_FETCH = os.getenv("CRAWL_FETCH", "browser")
+FETCH_MODES = ("browser", "tiered")
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))               # seconds
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_BYTES = int(os.getenv("HTTP_MAX_BYTES", str(5 * 1024 * 1024)))
+# Below this many characters of text the page is probably rendered client-side
+HTTP_MIN_TEXT = int(os.getenv("HTTP_MIN_TEXT", "200"))
+
+# Empty mount points of client-rendered apps, and "enable JavaScript" notices
+SPA_MARKERS = re.compile(
+    r"<(?:div|main|app-root)[^>]*\bid=[\"'](?:root|app|__nuxt|__next|___gatsby)[\"'][^>]*>\s*</(?:div|main|app-root)>"
+    r"|<app-root[^>]*>\s*</app-root>"
+    r"|<noscript>[^<]{0,200}(?:javascript|ativ[ae]r? o javascript)",
+    re.IGNORECASE)
+# Challenge pages of bot protection services
+BOT_WALL_MARKERS = re.compile(
+    r"cf-browser-verification|challenge-platform|cf_chl_|<title>\s*(?:just a moment|attention required)"
+    r"|_incapsula_resource|px-captcha|captcha-delivery|ddos-guard|<title>\s*access denied",
+    re.IGNORECASE)
+CLIENT_REDIRECT = re.compile(r"<meta[^>]+http-equiv=[\"']?refresh", re.IGNORECASE)
+BLOCKED_STATUSES = {401, 403, 429, 503}
+
+HTML_TYPES = ("text/html", "application/xhtml+xml")
+
+# <meta charset="..."> or <meta http-equiv="Content-Type" content="...; charset=...">,
+# looked for in the first bytes like browsers do
+META_CHARSET = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?\s*([\w.:-]+)", re.IGNORECASE)
+# Browsers read these labels as windows-1252 (a superset: curly quotes, euro sign...)
+WINDOWS_1252_ALIASES = {"iso8859-1", "ascii"}
+
+# Elements laid out inline: their text continues the line of the block they are in
+INLINE_TAGS = {
+    "a", "abbr", "b", "bdi", "bdo", "cite", "code", "data", "dfn", "em", "font", "i", "kbd", "label",
+    "mark", "q", "s", "samp", "small", "span", "strong", "sub", "sup", "time", "u", "var",
+}
+
+
+def create_http_client() -> Optional["httpx.AsyncClient"]:
+    """Shared keep-alive client for the HTTP tier, or None when httpx is not installed."""
+    if httpx is None:
+        return None
+    return httpx.AsyncClient(
+        follow_redirects=True,
+        verify=False,  # same as the browser contexts (ignore_https_errors)
+        timeout=HTTP_TIMEOUT,
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS),
+        headers={"User-Agent": CONTEXT_OPTIONS["user_agent"], "Accept-Language": "pt-PT,pt;q=0.9,en;q=0.5"},
+    )
+
+
+def needs_browser(status: int, content_type: str, html: str, text: str) -> Optional[str]:
+    """Why the page has to be rendered by the browser, or None when the HTML is enough."""
+    if status in BLOCKED_STATUSES or BOT_WALL_MARKERS.search(html[:20000]):
+        return "bot_wall"
+    if status >= 400:
+        return f"status_{status}"
+    if not content_type.startswith(HTML_TYPES):
+        return "not_html"
+    if CLIENT_REDIRECT.search(html[:5000]):
+        return "client_redirect"
+    if SPA_MARKERS.search(html):
+        return "spa"
+    if len(re.sub(r"\s+", " ", text).strip()) < HTTP_MIN_TEXT:
+        return "little_text"
+    return None
+
+
+def html_encoding(content: bytes, declared: Optional[str]) -> str:
+    """
+    Codec of an HTML body: the charset of the Content-Type header, else the one
+    the markup declares, else UTF-8 if the bytes are valid UTF-8, else windows-1252
+    (what older Portuguese sites send without saying so).
+    """
+    if content.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    meta = META_CHARSET.search(content[:4096])
+    for label in (declared, meta.group(1).decode("ascii") if meta else None):
+        if not label:
+            continue
+        try:
+            name = codecs.lookup(label).name
+        except LookupError:
+            continue
+        return "cp1252" if name in WINDOWS_1252_ALIASES else name
+    try:
+        content.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp1252"
+
+
+def _block_path(path: str) -> str:
+    # The path of the closest ancestor that is not an inline element
+    components = path.split(" > ")
+    while len(components) > 1 and re.match(r"[\w-]+", components[-1]).group() in INLINE_TAGS:
+        components.pop()
+    return " > ".join(components)
+
+
+def rendered_text(nodes: List) -> str:
+    """
+    innerText stand-in for text nodes in document order: the runs of one block are
+    joined as they are ("<b>TAEG</b>: 10%" stays one line), blocks go on new lines,
+    whitespace is collapsed. Two runs straight in the same element were split by an
+    element without text (<br>, <img>), so they go on lines of their own too.
+    """
+    lines: List[str] = []
+    line: List[str] = []
+    previous_block = previous_path = None
+    for node in nodes:
+        block = _block_path(node.path)
+        if line and (block != previous_block or node.path == previous_path):
+            lines.append(" ".join("".join(line).split()))
+            line = []
+        line.append(node.text)
+        previous_block, previous_path = block, node.path
+    if line:
+        lines.append(" ".join("".join(line).split()))
+    return "\n".join(line for line in lines if line)
+
+
+def extract_links(html: str, url: str) -> List[Dict]:
+    """Same-origin links as {'url', 'text', 'footer'}, like the crawler's LINKS_SCRIPT."""
+    parts = urlsplit(url)
+    origin = f"{parts.scheme}://{parts.netloc}"
+    links = []
+
+    def add(href: str, text: str, footer: bool):
+        absolute = urljoin(url, href.strip())
+        if absolute.startswith(origin):
+            links.append({"url": absolute, "text": " ".join(text.split())[:100], "footer": footer})
+
+    def is_footer(name: str, classes: str, element_id: str) -> bool:
+        return name == "footer" or "footer" in classes or "footer" in element_id
+
+    if lxml is not None and available_parser() == "lxml":
+        try:
+            root = lxml.html.document_fromstring(html.encode("utf-8"), parser=lxml.html.HTMLParser(encoding="utf-8"))
+        except lxml.etree.ParserError:
+            return links  # empty document
+        for anchor in root.iter("a"):
+            if anchor.get("href") is None:
+                continue
+            footer = any(is_footer(el.tag, el.get("class", ""), el.get("id", "")) for el in anchor.iterancestors()
+                         if isinstance(el.tag, str))
+            add(anchor.get("href"), anchor.text_content(), footer)
+        return links
+
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    for anchor in soup.find_all("a", href=True):
+        footer = any(is_footer(el.name, " ".join(el.get("class", [])), el.get("id", "") or "")
+                     for el in anchor.parents if el.name)
+        add(anchor["href"], anchor.get_text(), footer)
+    return links
+
+
+async def fetch_page(client: "httpx.AsyncClient", url: str, profile: str,
+                     fingerprints: Optional[FingerprintStore] = None,
+                     screenshots: Optional[ScreenshotStore] = None,
+                     previous: Optional[Dict] = None) -> Tuple[Optional[Dict], List[Dict], Optional[str]]:
+    """
+    The HTTP tier for one URL. Returns (page dict, links, None) when the HTML was
+    enough, or (None, [], reason) when the page must go to the browser.
+    The page dict has the same shape as the crawler's (with 'nodes', a deferred
+    screenshot and 'tier': "http"); `previous` (the URL's fingerprint, see
+    fingerprints.py) makes the request conditional and lets unchanged pages reuse
+    their last analysis.
+    """
+    timings: Dict[str, int] = {}
+    headers = {}
+    if previous is not None:
+        if previous.get("etag"):
+            headers["If-None-Match"] = previous["etag"]
+        if previous.get("last_modified"):
+            headers["If-Modified-Since"] = previous["last_modified"]
+
+    mark = time.perf_counter()
+    try:
+        # Streamed so an oversized body is dropped as soon as it passes HTTP_MAX_BYTES
+        async with client.stream("GET", url, headers=headers) as response:
+            declared = response.headers.get("content-length", "")
+            if declared.isdigit() and int(declared) > HTTP_MAX_BYTES:
+                return None, [], "too_large"
+            chunks, size = [], 0
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+                if size > HTTP_MAX_BYTES:
+                    return None, [], "too_large"
+                chunks.append(chunk)
+    except httpx.HTTPError as e:
+        return None, [], f"error ({type(e).__name__})"
+    content = b"".join(chunks)
+    timings["fetch"] = round((time.perf_counter() - mark) * 1000)
+    network = {"profile": "http", "requests": 1 + len(response.history), "bytes": len(content),
+               "blocked": 0, "blocked_by_type": {}, "bytes_saved_estimate": 0}
+
+    if response.status_code == 304 and previous is not None:
+        print(f"Not modified since last scan: {url}")
+        fingerprint = {k: previous[k] for k in ("etag", "last_modified", "text_hash", "links")}
+        page_data = {
+            "url": url, "text": "", "screenshot": previous["screenshot"], "tier": "http",
+            "reused": "not_modified", "issues": previous["issues"], "fingerprint": fingerprint,
+            "timings": timings, "network": network,
+        }
+        return page_data, previous["links"], None
+
+    mark = time.perf_counter()
+    html = content.decode(html_encoding(content, response.charset_encoding), errors="replace")
+    try:
+        index = DomTextIndex.from_html(html) if response.headers.get("content-type", "").startswith(HTML_TYPES) else None
+        # innerText stand-in: the visible text nodes of <body>, in document order
+        body = [node for node in index.nodes if not node.path.startswith("html > head")] if index else []
+        text = rendered_text(body)
+        reason = needs_browser(response.status_code, response.headers.get("content-type", ""), html, text)
+        if reason is not None:
+            return None, [], reason
+        links = extract_links(html, str(response.url))
+    except Exception as e:
+        # HTML the parsers cannot read: the browser gets its chance
+        return None, [], f"parse_error ({type(e).__name__})"
+    timings["parse"] = round((time.perf_counter() - mark) * 1000)
+
+    page_data = {
+        "url": url, "text": text, "tier": "http",
+        "nodes": [{"text": n.text, "tag": n.tag, "classes": list(n.classes), "path": n.path} for n in body],
+        "fingerprint": {
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "text_hash": text_hash(text),
+            "links": links,
+        },
+        "timings": timings, "network": network,
+    }
+    if previous is not None and previous["text_hash"] == page_data["fingerprint"]["text_hash"]:
+        page_data.update(screenshot=previous["screenshot"], reused="same_text", issues=previous["issues"])
+    elif get_profile(profile)["screenshot"] and screenshots is not None:
+        # No browser ran: the raw HTML is rendered and highlighted if the screenshot is wanted
+        page_data["screenshot"] = screenshots.defer(url, html, highlight=True)
+    else:
+        page_data["screenshot"] = ""
+    return page_data, links, None
@@ -0,0 +1,371 @@
+# Shared job queue for the multi-process deployment (JOB_BACKEND=sqlite).
+#
+# The API processes only enqueue jobs and read their progress; worker processes
+# (worker.py, started by run_backend.py --workers N) claim them, run the crawl
+# and analysis with their own browser pool, and write back events and results.
+# Everything goes through one SQLite file (WAL), so no outside service is needed
+# and an API or worker crash loses nothing that was committed:
+#   jobs     one row per job: status, owner worker, attempts, result
+#   events   the progress events of each job, in order (what /events streams)
+#   workers  one row per worker process, with its heartbeat
+# A running job whose worker stopped heartbeating goes back to the queue (up to
+# JOB_MAX_ATTEMPTS claims), so a crashed or hung worker only delays its jobs.
+
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, List, Optional
+
+from .jobs import FINISHED_STATES, JOB_QUEUE_SIZE, JOB_RESULT_TTL, Job, QueueFullError, retry_after
+
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "jobs.sqlite3")
+WORKER_HEARTBEAT = float(os.getenv("WORKER_HEARTBEAT", "2"))  # seconds between heartbeats
+WORKER_TIMEOUT = float(os.getenv("WORKER_TIMEOUT", "30"))     # seconds without one before a worker counts as dead
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))    # claims per job (worker deaths included)
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.25"))  # seconds, event streams and waiting workers
+JOB_WAIT_TIMEOUT = float(os.getenv("JOB_WAIT_TIMEOUT", "900"))     # seconds a synchronous analysis waits for its job
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY, url TEXT, options TEXT, status TEXT,
+    created_at REAL, started_at REAL, finished_at REAL,
+    worker TEXT, attempts INTEGER DEFAULT 0, cancel_requested INTEGER DEFAULT 0,
+    result TEXT, error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS events (
+    job_id TEXT, seq INTEGER, data TEXT, PRIMARY KEY (job_id, seq)
+);
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY, pid INTEGER, host TEXT, slots INTEGER,
+    started_at REAL, heartbeat REAL, running INTEGER DEFAULT 0,
+    done INTEGER DEFAULT 0, failed INTEGER DEFAULT 0
+);
+"""
+
+
+class NoWorkersError(Exception):
+    """No worker process is alive to run a job the caller would wait for."""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class JobGoneError(LookupError):
+    """The job's row disappeared (expired or deleted) while it was being followed."""
+
+
+class SQLiteJobQueue:
+    """
+    The queue tables and the operations on them; every method is one short transaction.
+    The methods block (up to the busy timeout while another process holds the write
+    lock): in an event loop, call them through asyncio.to_thread.
+    """
+
+    def __init__(self, path: str = JOB_QUEUE_PATH, max_queue: int = JOB_QUEUE_SIZE):
+        self.path = path
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        # Autocommit mode: transactions are opened explicitly (BEGIN IMMEDIATE) where they matter
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    @contextmanager
+    def _write(self):
+        # Takes the database write lock up front, so a check-then-write cannot race another process
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def _emit(self, job_id: str, event: Dict):
+        seq = self._db.execute("SELECT COALESCE(MAX(seq) + 1, 0) FROM events WHERE job_id = ?", (job_id,)).fetchone()[0]
+        event = dict(event, id=seq, time=time.time())
+        self._db.execute("INSERT INTO events (job_id, seq, data) VALUES (?, ?, ?)", (job_id, seq, json.dumps(event)))
+
+    # --- API side ---
+
+    def submit(self, url: str, options: Optional[Dict] = None) -> Job:
+        """Enqueues a job, or raises QueueFullError (with a Retry-After hint) when max_queue are waiting."""
+        job = Job(url, options)
+        with self._write():
+            queued = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= self.max_queue:
+                raise QueueFullError(f"Fila de análises cheia ({self.max_queue} pedidos em espera).",
+                                     retry_after(queued, self._capacity(), self._durations()))
+            self._db.execute(
+                "INSERT INTO jobs (id, url, options, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                (job.id, url, json.dumps(job.options), job.created_at))
+            self._emit(job.id, {"type": "queued", "position": queued + 1})
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, url, options, status, created_at, finished_at, result, error,"
+                " (SELECT COUNT(*) FROM events WHERE job_id = jobs.id) FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = Job(row[1], json.loads(row[2]), job_id=row[0])
+        job.status, job.created_at, job.finished_at = row[3], row[4], row[5]
+        job.result = json.loads(row[6]) if row[6] else None
+        job.error = row[7]
+        job.events = [None] * row[8]  # only counted by summary(); events() reads them
+        return job
+
+    def cancel(self, job_id: str):
+        """Cancels a queued job at once; a running one is flagged for its worker to stop."""
+        with self._write():
+            status = self._db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if status and status[0] == "queued":
+                self._finish(job_id, "cancelled")
+            elif status and status[0] == "running":
+                self._db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+
+    def events_since(self, job_id: str, since: int) -> List[Dict]:
+        with self._lock:
+            rows = self._db.execute("SELECT data FROM events WHERE job_id = ? AND seq >= ? ORDER BY seq",
+                                    (job_id, since)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def status(self, job_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    def workers(self) -> List[Dict]:
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, pid, host, slots, started_at, heartbeat, running, done, failed FROM workers"
+                " ORDER BY started_at").fetchall()
+        return [{"id": row[0], "pid": row[1], "host": row[2], "slots": row[3], "started_at": row[4],
+                 "heartbeat_age": round(now - row[5], 1), "running": row[6], "done": row[7], "failed": row[8],
+                 "alive": now - row[5] < WORKER_TIMEOUT} for row in rows]
+
+    def recover(self, ttl: int = JOB_RESULT_TTL) -> int:
+        """
+        Requeues the running jobs of dead workers (or fails them after JOB_MAX_ATTEMPTS
+        claims), forgets dead workers and deletes finished jobs older than ttl.
+        Returns how many jobs were requeued or failed.
+        """
+        now = time.time()
+        with self._write():
+            stale = self._db.execute(
+                "SELECT id, attempts FROM jobs WHERE status = 'running' AND worker NOT IN"
+                " (SELECT id FROM workers WHERE heartbeat > ?)", (now - WORKER_TIMEOUT,)).fetchall()
+            for job_id, attempts in stale:
+                if attempts >= JOB_MAX_ATTEMPTS:
+                    self._finish(job_id, "failed", f"Análise interrompida {attempts} vezes (worker perdido).")
+                else:
+                    self._db.execute("UPDATE jobs SET status = 'queued', worker = NULL WHERE id = ?", (job_id,))
+                    self._emit(job_id, {"type": "requeued", "attempts": attempts})
+            self._db.execute("DELETE FROM workers WHERE heartbeat < ?", (now - WORKER_TIMEOUT,))
+            old = [row[0] for row in self._db.execute(
+                "SELECT id FROM jobs WHERE finished_at < ?", (now - ttl,)).fetchall()]
+            self._db.executemany("DELETE FROM events WHERE job_id = ?", [(job_id,) for job_id in old])
+            self._db.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in old])
+        if stale:
+            print(f"Job queue: {len(stale)} job(s) of lost workers requeued or failed")
+        return len(stale)
+
+    # --- worker side ---
+
+    def register(self, worker_id: str, slots: int):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO workers (id, pid, host, slots, started_at, heartbeat) VALUES (?, ?, ?, ?, ?, ?)",
+                (worker_id, os.getpid(), socket.gethostname(), slots, now, now))
+
+    def unregister(self, worker_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM workers WHERE id = ?", (worker_id,))
+
+    def heartbeat(self, worker_id: str, slots: int, running: List[str]) -> List[str]:
+        """Records that the worker is alive; returns which of its jobs were asked to stop."""
+        with self._lock:
+            updated = self._db.execute("UPDATE workers SET heartbeat = ?, running = ? WHERE id = ?",
+                                       (time.time(), len(running), worker_id)).rowcount
+        if not updated:
+            # Stalled long enough to be forgotten (its jobs were requeued): count as a new worker
+            print(f"Worker {worker_id} was presumed dead, registering again")
+            self.register(worker_id, slots)
+        with self._lock:
+            if not running:
+                return []
+            marks = ",".join("?" * len(running))
+            rows = self._db.execute(f"SELECT id FROM jobs WHERE cancel_requested = 1 AND id IN ({marks})",
+                                    running).fetchall()
+        return [row[0] for row in rows]
+
+    def claim(self, worker_id: str) -> Optional[Job]:
+        """Takes the oldest queued job, or None when there is none."""
+        with self._write():
+            row = self._db.execute(
+                "SELECT id, url, options, created_at FROM jobs WHERE status = 'queued'"
+                " ORDER BY created_at LIMIT 1").fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, started_at = ?, attempts = attempts + 1"
+                " WHERE id = ?", (worker_id, time.time(), row[0]))
+            self._emit(row[0], {"type": "started"})
+        job = Job(row[1], json.loads(row[2]), job_id=row[0])
+        job.status, job.created_at = "running", row[3]
+        return job
+
+    def emit(self, job_id: str, event: Dict):
+        with self._write():
+            self._emit(job_id, event)
+
+    def finish(self, worker_id: str, job_id: str, status: str, result: Optional[Dict] = None,
+               error: Optional[str] = None):
+        """Records the outcome of a claimed job (ignored if the job was taken from this worker meanwhile)."""
+        column = {"done": "done", "failed": "failed"}.get(status)
+        with self._write():
+            owner = self._db.execute("SELECT worker, status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if owner and owner[0] == worker_id and owner[1] == "running":
+                self._finish(job_id, status, error, result)
+                if column:
+                    self._db.execute(f"UPDATE workers SET {column} = {column} + 1 WHERE id = ?", (worker_id,))
+
+    def release(self, worker_id: str, job_id: str):
+        """Puts a job back in the queue (the worker is shutting down), keeping its place."""
+        with self._write():
+            released = self._db.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL, attempts = attempts - 1"
+                " WHERE id = ? AND worker = ? AND status = 'running'", (job_id, worker_id)).rowcount
+            if released:
+                self._emit(job_id, {"type": "requeued"})
+
+    # --- internals (call inside a transaction) ---
+
+    def _finish(self, job_id: str, status: str, error: Optional[str] = None, result: Optional[Dict] = None):
+        self._db.execute("UPDATE jobs SET status = ?, error = ?, result = ?, finished_at = ? WHERE id = ?",
+                         (status, error, json.dumps(result) if result is not None else None, time.time(), job_id))
+        self._emit(job_id, {"type": status, "error": error} if error else {"type": status})
+
+    def _durations(self) -> List[float]:
+        rows = self._db.execute(
+            "SELECT finished_at - started_at FROM jobs WHERE status = 'done'"
+            " ORDER BY finished_at DESC LIMIT 50").fetchall()
+        return [row[0] for row in rows]
+
+    def _capacity(self) -> int:
+        row = self._db.execute("SELECT COALESCE(SUM(slots), 0) FROM workers WHERE heartbeat > ?",
+                               (time.time() - WORKER_TIMEOUT,)).fetchone()
+        return row[0]
+
+
+class SharedJobManager:
+    """
+    JobManager's interface for an API process in front of worker processes:
+    submissions go into the shared queue, and status/events/results are read back from it.
+    """
+
+    def __init__(self, queue: Optional[SQLiteJobQueue] = None):
+        self.queue = queue or SQLiteJobQueue()
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._reaper())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # The interface methods below block on the database; the API calls them through
+    # asyncio.to_thread (see main.jobs_call), the async ones do it themselves
+    def submit(self, url: str, options: Optional[Dict] = None) -> Job:
+        return self.queue.submit(url, options)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.queue.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        self.queue.cancel(job_id)
+        return self.queue.get(job_id)
+
+    def queue_depth(self) -> int:
+        return self.queue.counts().get("queued", 0)
+
+    def running(self) -> int:
+        return self.queue.counts().get("running", 0)
+
+    def workers_status(self) -> List[Dict]:
+        return self.queue.workers()
+
+    def live_workers(self) -> int:
+        return sum(1 for worker in self.queue.workers() if worker["alive"])
+
+    async def events(self, job_id: str, since: int = 0) -> AsyncIterator[Dict]:
+        """
+        Yields the job's events from index `since`, then new ones (polled) until it
+        finishes, or until its row is gone (expired or deleted meanwhile).
+        """
+        position = since
+        while True:
+            # Status first: events written before the job finished are then all visible
+            status = await asyncio.to_thread(self.queue.status, job_id)
+            finished = status is None or status in FINISHED_STATES
+            pending = await asyncio.to_thread(self.queue.events_since, job_id, position)
+            for event in pending:
+                yield event
+            position += len(pending)
+            if finished and not pending:
+                return
+            if not pending:
+                await asyncio.sleep(JOB_POLL_INTERVAL)
+
+    async def wait(self, job_id: str, timeout: float = JOB_WAIT_TIMEOUT) -> Job:
+        """
+        The job once it has finished. Raises asyncio.TimeoutError after `timeout`
+        seconds, JobGoneError if its row disappears meanwhile.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            status = await asyncio.to_thread(self.queue.status, job_id)
+            if status is None:
+                raise JobGoneError(f"Análise {job_id} não encontrada ou expirada.")
+            if status in FINISHED_STATES:
+                break
+            if time.monotonic() >= deadline:
+                raise asyncio.TimeoutError(f"Análise {job_id} não concluída em {timeout:g} s.")
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+        job = await asyncio.to_thread(self.queue.get, job_id)
+        if job is None:
+            raise JobGoneError(f"Análise {job_id} não encontrada ou expirada.")
+        return job
+
+    async def _reaper(self):
+        # Any API process may do this; the queue transactions keep it idempotent
+        while True:
+            await asyncio.sleep(WORKER_HEARTBEAT)
+            try:
+                await asyncio.to_thread(self.queue.recover)
+            except sqlite3.Error as e:
+                print(f"Job queue recovery failed: {e}")
+
+
+def new_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
@@ -0,0 +1,210 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+# Job subsystem sizing (overridable through environment variables)
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "20"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "3600"))  # seconds
+# "memory": jobs run in the API process; "sqlite": in worker processes fed by a
+# shared queue (see job_queue.py and worker.py)
+JOB_BACKEND = os.getenv("JOB_BACKEND", "memory")
+# Retry-After hints of a full queue: assumed job duration until some finished, and the cap
+JOB_DEFAULT_DURATION = float(os.getenv("JOB_DEFAULT_DURATION", "30"))  # seconds
+JOB_RETRY_AFTER_MAX = int(os.getenv("JOB_RETRY_AFTER_MAX", "300"))     # seconds
+
+FINISHED_STATES = ("done", "failed", "cancelled")
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue cannot accept more submissions."""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after  # seconds until a slot is likely free
+
+
+def retry_after(queued: int, slots: int, durations: List[float]) -> int:
+    """Seconds until the queue has likely drained by one job: depth x mean job duration / slots."""
+    duration = sum(durations) / len(durations) if durations else JOB_DEFAULT_DURATION
+    return int(min(JOB_RETRY_AFTER_MAX, max(1, queued * duration / max(1, slots))))
+
+
+class Job:
+    """One analysis request and the progress events it has produced so far."""
+
+    def __init__(self, url: str, options: Optional[Dict] = None, job_id: Optional[str] = None):
+        self.id = job_id or uuid.uuid4().hex
+        self.url = url
+        self.options = options or {}
+        self.status = "queued"
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.events: List[Dict] = []
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        self.changed = asyncio.Condition()
+
+    def summary(self) -> Dict:
+        return {
+            "id": self.id,
+            "url": self.url,
+            "status": self.status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "events": len(self.events),
+            "error": self.error,
+        }
+
+
+# Runner signature: (job, emit) -> result dict
+JobRunner = Callable[[Job, Callable[[Dict], None]], Awaitable[Dict]]
+
+
+class JobManager:
+    """
+    Bounded in-process job queue with a fixed number of workers.
+    Finished jobs (and their results) are kept for JOB_RESULT_TTL seconds.
+    The bound counts jobs still waiting: one cancelled while queued stays in the
+    asyncio.Queue until a worker skips it, but no longer takes a slot.
+    """
+
+    def __init__(self, runner: JobRunner, max_queue: int = JOB_QUEUE_SIZE,
+                 workers: int = JOB_WORKERS, ttl: int = JOB_RESULT_TTL):
+        self.runner = runner
+        self.ttl = ttl
+        self.workers = workers
+        self.max_queue = max_queue
+        self.jobs: Dict[str, Job] = {}
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._waiting = 0  # queued jobs not cancelled yet
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+        # Durations of the last finished jobs, for Retry-After hints
+        self._durations: deque = deque(maxlen=50)
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._reaper()))
+
+    async def stop(self):
+        self._stopping = True
+        for job in self.jobs.values():
+            if job.task and not job.task.done():
+                job.task.cancel()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, url: str, options: Optional[Dict] = None) -> Job:
+        if self._waiting >= self.max_queue:
+            raise QueueFullError(f"Fila de análises cheia ({self.max_queue} pedidos em espera).",
+                                 retry_after(self._waiting, self.workers, list(self._durations)))
+        job = Job(url, options)
+        self._queue.put_nowait(job)
+        self._waiting += 1
+        self.jobs[job.id] = job
+        self._emit(job, {"type": "queued", "position": self._waiting})
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self.jobs.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return job
+        if job.task and not job.task.done():
+            # Running: the worker records the cancellation when the task unwinds
+            job.task.cancel()
+        else:
+            # Still queued: its slot is free now, the worker skips it when dequeued
+            self._waiting -= 1
+            self._finish(job, "cancelled")
+        return job
+
+    def queue_depth(self) -> int:
+        return self._waiting
+
+    def running(self) -> int:
+        return sum(1 for job in self.jobs.values() if job.status == "running")
+
+    def workers_status(self) -> List[Dict]:
+        """The processes running jobs: here, only this one."""
+        return [{"id": "api", "pid": os.getpid(), "slots": self.workers, "running": self.running(), "alive": True}]
+
+    async def events(self, job_id: str, since: int = 0) -> AsyncIterator[Dict]:
+        """
+        Yields the job's events from index `since`, then live ones until it finishes.
+        Ends at once for an unknown job (never submitted, or expired meanwhile).
+        """
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        position = since
+        while True:
+            async with job.changed:
+                while position >= len(job.events) and job.status not in FINISHED_STATES:
+                    await job.changed.wait()
+                pending = job.events[position:]
+                finished = job.status in FINISHED_STATES
+            for event in pending:
+                yield event
+            position += len(pending)
+            if finished and position >= len(job.events):
+                return
+
+    # --- internals ---
+
+    def _emit(self, job: Job, event: Dict):
+        event = dict(event, id=len(job.events), time=time.time())
+        job.events.append(event)
+        asyncio.get_running_loop().create_task(self._notify(job))
+
+    async def _notify(self, job: Job):
+        async with job.changed:
+            job.changed.notify_all()
+
+    def _finish(self, job: Job, status: str, error: Optional[str] = None):
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        self._emit(job, {"type": status, "error": error} if error else {"type": status})
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.status != "queued":
+                    continue
+                self._waiting -= 1
+                job.status = "running"
+                started = time.time()
+                self._emit(job, {"type": "started"})
+                job.task = asyncio.create_task(self.runner(job, lambda event: self._emit(job, event)))
+                try:
+                    job.result = await job.task
+                    self._durations.append(time.time() - started)
+                    self._finish(job, "done")
+                except asyncio.CancelledError:
+                    if self._stopping or not job.task.cancelled():
+                        raise  # the worker itself is being stopped
+                    self._finish(job, "cancelled")
+                except Exception as e:
+                    print(f"Job {job.id} failed: {type(e).__name__}: {e}")
+                    self._finish(job, "failed", f"{type(e).__name__}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def _reaper(self):
+        while True:
+            await asyncio.sleep(min(60, max(1, self.ttl)))
+            cutoff = time.time() - self.ttl
+            for job_id, job in list(self.jobs.items()):
+                if job.finished_at is not None and job.finished_at < cutoff:
+                    del self.jobs[job_id]
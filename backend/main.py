@@ -1,21 +1,91 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, RedirectResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from typing import List, Optional
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Literal, Optional, Union
 import uvicorn
 import os
 import sys
+import json
+import time
 import asyncio
 
 # CRITICAL: Force ProactorEventLoop on Windows for Playwright
 if sys.platform == 'win32':
     asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
 
-from .crawler import crawl_site
-from .compliance import analyze_compliance
+from .crawler import CRAWL_EXTRACT, iter_site, render_snapshot
+from .compliance import analyze_stream, create_analysis_executor
+from .browser_pool import BrowserPool
+from .jobs import JOB_BACKEND, Job, JobManager, QueueFullError
+from .job_queue import WORKER_HEARTBEAT, NoWorkersError, SharedJobManager
+from .cache import ANALYSIS_CACHE_TTL, CRAWL_CACHE_TTL, CACHE_BACKEND, RULES_VERSION, CacheLevel, content_key, crawl_key, without_dom
+from .profiles import CRAWL_PROFILE
+from .fingerprints import FingerprintStore
+from .screenshots import SCREENSHOT_DIR, ScreenshotStore, is_deferred
+from .batch import BATCH_CONCURRENCY, BATCH_PER_HOST_LIMIT, read_urls, run_batch
+from .metrics import SITE_SECONDS, render_metrics
+from .http_fetch import CRAWL_FETCH, create_http_client
+from .archive import CRAWL_ARCHIVE_DIR, CrawlArchive
+from .response import compact_result, full_result, json_response
 
-app = FastAPI(title="BdP Compliance Checker")
+@asynccontextmanager
+async def services(app: FastAPI, warm_browser: bool = True):
+    """
+    What the analyses run on, on app.state: browser pool, HTTP client, analysis
+    processes, caches, fingerprints and screenshots (also used by worker.py).
+    """
+    if JOB_BACKEND == "sqlite" and CACHE_BACKEND != "sqlite":
+        print("JOB_BACKEND=sqlite without CACHE_BACKEND=sqlite: caches, fingerprints and deferred screenshots"
+              " are not shared between the API and the workers")
+    # One Chromium for the whole process; requests borrow isolated contexts from it
+    pool = BrowserPool()
+    if warm_browser:
+        await pool.start()
+    app.state.browser_pool = pool
+    # Keep-alive connections for the HTTP tier (CRAWL_FETCH=tiered); None without httpx
+    app.state.http_client = create_http_client()
+    # CPU-bound page analysis runs in worker processes, off the event loop
+    executor = create_analysis_executor()
+    app.state.analysis_executor = executor
+    # Level 1: crawled pages by URL; level 2: page issues by content + rules version
+    app.state.crawl_cache = CacheLevel("crawl", CRAWL_CACHE_TTL)
+    app.state.analysis_cache = CacheLevel("analysis", ANALYSIS_CACHE_TTL)
+    # Last known state of every scanned URL, for incremental re-scans
+    app.state.fingerprints = FingerprintStore()
+    # Compressed, content-addressed screenshots; old/oversized ones are evicted
+    app.state.screenshots = ScreenshotStore()
+    await asyncio.to_thread(app.state.screenshots.enforce_retention)
+    # Every crawled page with its DOM, for replaying rule changes offline (replay.py)
+    app.state.archive = CrawlArchive(CRAWL_ARCHIVE_DIR) if CRAWL_ARCHIVE_DIR else None
+    try:
+        yield
+    finally:
+        # Analysis workers go first: Playwright's shutdown waits on its driver process
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        if app.state.http_client is not None:
+            await app.state.http_client.aclose()
+        if app.state.archive is not None:
+            app.state.archive.close()
+        await pool.stop()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # With worker processes (JOB_BACKEND=sqlite) this process only queues jobs and
+    # renders deferred screenshots, so Chromium is launched on first use
+    async with services(app, warm_browser=JOB_BACKEND != "sqlite"):
+        jobs = SharedJobManager() if JOB_BACKEND == "sqlite" else JobManager(run_analysis_job)
+        await jobs.start()
+        app.state.jobs = jobs
+        try:
+            yield
+        finally:
+            await jobs.stop()
+
+app = FastAPI(title="BdP Compliance Checker", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -24,14 +94,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
 # Mount screenshots directory
-os.makedirs("frontend/screenshots", exist_ok=True)
-app.mount("/screenshots", StaticFiles(directory="frontend/screenshots"), name="screenshots")
+os.makedirs(SCREENSHOT_DIR, exist_ok=True)
+app.mount("/screenshots", StaticFiles(directory=SCREENSHOT_DIR), name="screenshots")
 
 class AnalyzeRequest(BaseModel):
     url: str
+    refresh: bool = False  # ignore cached crawls (analysis cache still applies)
+    incremental: bool = False  # re-check the live site, reusing pages unchanged since the last scan
+    timings: bool = False  # include per-stage timings (site and per page) in the result
+    format: Literal["full", "compact"] = "full"  # compact: page table, findings only, success counters (response.py)
+
+class BatchRequest(BaseModel):
+    urls: List[str]
+    refresh: bool = False
+    incremental: bool = False
+    format: Literal["full", "compact"] = "full"
+    concurrency: int = BATCH_CONCURRENCY
+    per_host_limit: int = BATCH_PER_HOST_LIMIT
+
+# Upper bound on the sites of one batch request
+BATCH_MAX_URLS = int(os.getenv("BATCH_MAX_URLS", "1000"))
 
 class ComplianceIssue(BaseModel):
     rule: str
@@ -48,18 +134,105 @@ class AnalysisResult(BaseModel):
     status: str
     issues: List[ComplianceIssue]
     scanned_pages: int
+    reused_pages: List[str] = []  # unchanged since the last scan (incremental)
+    page_tiers: Dict[str, str] = {}  # url -> "http" or "browser": what fetched each page (CRAWL_FETCH)
+    timings: Optional[dict] = None  # when requested: {'total', 'site', 'pages'}, in ms
+    total_issues: Optional[int] = None  # when paged (offset/limit): issues of the whole result
+    offset: Optional[int] = None
+
+class CompactPage(BaseModel):
+    url: str
+    screenshot: str
+    tier: Optional[str] = None
+    reused: Optional[bool] = None
+
+class CompactIssue(BaseModel):
+    rule: str
+    description: str
+    severity: str
+    suggestion: str
+    context: Optional[str] = None
+    location_guide: Optional[str] = None
+    page: int  # index in 'pages'
+    screenshot: Optional[str] = None  # only when it is not the page's (a crop)
+
+class CompactResult(BaseModel):
+    score: int
+    status: str
+    scanned_pages: int
+    pages: List[CompactPage]
+    issues: List[CompactIssue]  # findings only, paged with offset/limit
+    total_issues: int
+    offset: int
+    successes: Dict[str, int]  # rule -> success issues
+    timings: Optional[dict] = None
+
+def result_response(request: Request, result: dict, format: str = "full", offset: int = 0,
+                    limit: Optional[int] = None):
+    """An analysis result in the requested format, compressed for the client (see response.py)."""
+    if format == "compact":
+        payload = compact_result(result, offset, limit)
+    else:
+        payload = AnalysisResult(**full_result(result, offset, limit)).model_dump()
+        if payload["total_issues"] is None:
+            del payload["total_issues"], payload["offset"]
+    return json_response(payload, request.headers.get("accept-encoding", ""))
+
+def queue_full(e: QueueFullError) -> HTTPException:
+    """429 telling the client when to try again."""
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+def no_workers(e: NoWorkersError) -> HTTPException:
+    """503 while no worker process is alive (the supervisor restarts them)."""
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
 
-@app.post("/api/analyze", response_model=AnalysisResult)
-async def analyze_url(request: AnalyzeRequest):
+async def jobs_call(method, *args):
+    """
+    A job manager method: the shared queue's run in a thread, as they may wait on
+    the database while a worker holds its write lock; the in-process manager's
+    touch its asyncio state, so they run on the loop.
+    """
+    if JOB_BACKEND == "sqlite":
+        return await asyncio.to_thread(method, *args)
+    return method(*args)
+
+async def queued_analysis(url: str, options: dict) -> dict:
+    """
+    analyze_site run by a worker process (JOB_BACKEND=sqlite). Raises QueueFullError
+    when the queue is full, NoWorkersError at once when no worker is alive to run
+    it, asyncio.TimeoutError (the job is then cancelled) after JOB_WAIT_TIMEOUT.
+    """
+    jobs = app.state.jobs
+    if not await jobs_call(jobs.live_workers):
+        raise NoWorkersError("Nenhum processo de análise disponível de momento.", max(1, round(WORKER_HEARTBEAT * 2)))
+    job = await jobs_call(jobs.submit, url, options)
+    try:
+        job = await jobs.wait(job.id)
+    except asyncio.TimeoutError:
+        await jobs_call(jobs.cancel, job.id)
+        raise
+    if job.status != "done":
+        raise RuntimeError(job.error or f"Análise {job.status}.")
+    return job.result
+
+@app.post("/api/analyze", response_model=Union[AnalysisResult, CompactResult])
+async def analyze_url(request: AnalyzeRequest, http_request: Request):
     try:
         print(f"Starting Premium Analysis for {request.url}")
-        # Crawl with Playwright (returns list of page objects)
-        pages = await crawl_site(request.url, max_pages=3)
-        
-        # Analyze
-        result = await analyze_compliance(pages)
-        
-        return result
+        if JOB_BACKEND == "sqlite":
+            result = await queued_analysis(request.url, {"refresh": request.refresh,
+                                                         "incremental": request.incremental,
+                                                         "timings": request.timings})
+        else:
+            result = await analyze_site(request.url, refresh=request.refresh, incremental=request.incremental,
+                                        timings=request.timings)
+        return result_response(http_request, result, request.format)
+    except QueueFullError as e:
+        raise queue_full(e)
+    except NoWorkersError as e:
+        raise no_workers(e)
+    except asyncio.TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         import traceback
         error_msg = f"{type(e).__name__}: {str(e)}"
@@ -67,6 +240,273 @@ async def analyze_url(request: AnalyzeRequest):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=error_msg)
 
+async def analyze_site(url: str, refresh: bool = False, incremental: bool = False, on_page=None,
+                       timings: bool = False) -> dict:
+    """
+    Crawl (with Playwright, behind the crawl cache) + analysis of one site.
+    Pages are analyzed as they are crawled; on_page(page, issues) is awaited after each.
+    With timings, the result carries 'timings': {'total', 'site' (context, seed,
+    score), 'pages' (url + that page's stage timings, in crawl order)}, all in ms.
+    """
+    start = time.perf_counter()
+    site_timings = {}
+    pages = []
+
+    async def collect(page, issues):
+        pages.append({"url": page['url'], "order": page.get('order', []), "reused": page.get('reused'),
+                      "tier": page.get('tier'), "escalated": page.get('escalated'),
+                      "timings": page.get('timings', {})})
+        if on_page:
+            await on_page(page, issues)
+
+    result = await analyze_stream(stream_site(url, refresh=refresh, incremental=incremental, timings=site_timings),
+                                  executor=app.state.analysis_executor, cache=app.state.analysis_cache,
+                                  fingerprints=app.state.fingerprints, on_page=collect, timings=site_timings,
+                                  archive=app.state.archive)
+    result['issues'] = capture_findings(result['issues'])
+    total = time.perf_counter() - start
+    SITE_SECONDS.observe("incremental" if incremental else "full", total)
+    if timings:
+        pages.sort(key=lambda page: page.pop('order'))
+        result['timings'] = {"total": round(total * 1000), "site": site_timings, "pages": pages}
+    return result
+
+async def _render_snapshot(snapshot: dict) -> bytes:
+    return await render_snapshot(snapshot, app.state.screenshots, app.state.browser_pool)
+
+def capture_findings(issues: List[dict]) -> List[dict]:
+    """
+    SCREENSHOT_MODE=findings: starts capturing the deferred screenshots of pages
+    with non-success findings; issues of pages with only successes lose theirs.
+    """
+    if app.state.screenshots.mode != "findings":
+        return issues
+    wanted = {issue['screenshot'] for issue in issues if issue['severity'] != 'success'}
+    for path in wanted:
+        app.state.screenshots.prefetch(path, _render_snapshot)
+    return [dict(issue, screenshot="") if is_deferred(issue['screenshot']) and issue['screenshot'] not in wanted else issue
+            for issue in issues]
+
+async def stream_site(url: str, refresh: bool = False, incremental: bool = False,
+                      timings: Optional[dict] = None) -> AsyncIterator[dict]:
+    """
+    iter_site behind the crawl cache. The cache keeps pages without their raw DOM,
+    so a hit is only served while the analysis of every page is still cached (and
+    its screenshots were not evicted; serving it marks them as recently used).
+    Incremental scans always go to the live site (that is their point) and are not cached.
+    timings, if given, receives iter_site's site-level timings.
+    """
+    if incremental:
+        async for page in iter_site(url, max_pages=3, pool=app.state.browser_pool,
+                                    fingerprints=app.state.fingerprints, screenshots=app.state.screenshots,
+                                    timings=timings, http_client=app.state.http_client):
+            yield page
+        return
+
+    key = crawl_key(url, max_pages=3, extract=CRAWL_EXTRACT, profile=CRAWL_PROFILE, fetch=CRAWL_FETCH)
+    cached = None if refresh else app.state.crawl_cache.get(key)
+    if (cached is not None
+            and all(app.state.analysis_cache.store.get(content_key(page)) is not None for page in cached)
+            and app.state.screenshots.touch(path for page in cached
+                                            for path in [page['screenshot'], *page.get('crops', {}).values()])):
+        print(f"Crawl cache hit: {url}")
+        for page in cached:
+            # The consumer mutates pages; the cached ones stay intact.
+            # Nothing was crawled for this request, so the stored crawl timings do not apply.
+            yield dict(page, timings={})
+        return
+
+    pages = []
+    async for page in iter_site(url, max_pages=3, pool=app.state.browser_pool, screenshots=app.state.screenshots,
+                                timings=timings, http_client=app.state.http_client):
+        pages.append(page)
+        yield page
+    if pages:
+        app.state.crawl_cache.set(key, [without_dom(page) for page in pages])
+
+async def run_analysis_job(job: Job, emit) -> dict:
+    """
+    Crawl + analysis for a background job.
+    Each page is analyzed as soon as it is crawled so partial issues can be streamed.
+    """
+    async def on_page(page, page_issues):
+        emit({"type": "page", "url": page['url'], "screenshot": page['screenshot'], "timings": page.get('timings'),
+              "network": page.get('network'), "reused": page.get('reused'),
+              "tier": page.get('tier'), "escalated": page.get('escalated')})
+        page_issues = capture_findings(page_issues)
+        for issue in page_issues:
+            emit({"type": "rule", "url": page['url'], "rule": issue['rule'], "severity": issue['severity']})
+        emit({"type": "page_issues", "url": page['url'], "issues": page_issues})
+
+    print(f"Starting Premium Analysis (job {job.id}) for {job.url}")
+    result = await analyze_site(job.url, refresh=job.options.get('refresh', False),
+                                incremental=job.options.get('incremental', False), on_page=on_page,
+                                timings=job.options.get('timings', False))
+    emit({"type": "score", "score": result['score'], "status": result['status']})
+    return result
+
+@app.post("/api/batch")
+async def analyze_batch(request: BatchRequest):
+    """
+    Analyzes many sites over the shared browser pool and streams one JSON line per
+    site as it finishes (see batch.py). Clients resume an interrupted batch by
+    resubmitting the URLs without a successful line.
+    """
+    urls = read_urls(request.urls)
+    if not urls:
+        raise HTTPException(status_code=400, detail="Nenhum URL indicado.")
+    if len(urls) > BATCH_MAX_URLS:
+        raise HTTPException(status_code=400, detail=f"Máximo de {BATCH_MAX_URLS} sites por pedido.")
+
+    async def analyze(url: str) -> dict:
+        if JOB_BACKEND != "sqlite":
+            result = await analyze_site(url, refresh=request.refresh, incremental=request.incremental)
+        else:
+            # The sites wait for room in the shared queue instead of failing
+            while True:
+                try:
+                    result = await queued_analysis(url, {"refresh": request.refresh,
+                                                         "incremental": request.incremental})
+                    break
+                except QueueFullError as e:
+                    await asyncio.sleep(e.retry_after)
+        return compact_result(result) if request.format == "compact" else result
+
+    async def stream():
+        async for record in run_batch(urls, analyze, request.concurrency, request.per_host_limit):
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+async def _get_job(job_id: str) -> Job:
+    job = await jobs_call(app.state.jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Análise não encontrada ou expirada.")
+    return job
+
+@app.post("/api/jobs", status_code=202)
+async def submit_job(request: AnalyzeRequest):
+    """Queues an analysis and returns immediately with its id."""
+    try:
+        job = await jobs_call(app.state.jobs.submit, request.url, {"refresh": request.refresh,
+                                                                   "incremental": request.incremental,
+                                                                   "timings": request.timings})
+    except QueueFullError as e:
+        raise queue_full(e)
+    return {
+        "id": job.id,
+        "status": job.status,
+        "events": f"/api/jobs/{job.id}/events",
+        "result": f"/api/jobs/{job.id}/result",
+    }
+
+@app.get("/api/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = await _get_job(job_id)
+    return dict(job.summary(), queue_depth=await jobs_call(app.state.jobs.queue_depth))
+
+@app.get("/api/jobs/{job_id}/result", response_model=Union[AnalysisResult, CompactResult])
+async def job_result(job_id: str, request: Request, format: Literal["full", "compact"] = "full",
+                     offset: int = Query(0, ge=0), limit: Optional[int] = Query(None, ge=1)):
+    """The job's result; its issues can be paged with offset/limit."""
+    job = await _get_job(job_id)
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Análise ainda não concluída (estado: {job.status}).")
+    return result_response(request, job.result, format, offset, limit)
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """Server-Sent Events stream of the job's progress (replays past events first)."""
+    await _get_job(job_id)
+    last_id = request.headers.get("last-event-id")
+    since = int(last_id) + 1 if last_id and last_id.isdigit() else 0
+
+    async def stream():
+        async for event in app.state.jobs.events(job_id, since):
+            yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    await _get_job(job_id)
+    return (await jobs_call(app.state.jobs.cancel, job_id)).summary()
+
+@app.get("/api/cache")
+async def cache_status():
+    """Entries, size and hit/miss counters of both cache levels."""
+    return {
+        "backend": CACHE_BACKEND,
+        "rules_version": RULES_VERSION,
+        "crawl": app.state.crawl_cache.stats(),
+        "analysis": app.state.analysis_cache.stats(),
+        "fingerprints": app.state.fingerprints.stats(),
+        "archive": app.state.archive.stats() if app.state.archive is not None else None,
+    }
+
+@app.delete("/api/cache")
+async def clear_cache():
+    app.state.crawl_cache.store.clear()
+    app.state.analysis_cache.store.clear()
+    return {"cleared": True}
+
+@app.get("/api/screenshots")
+async def screenshot_status():
+    """Screenshot storage usage and dedup/eviction counters."""
+    return await asyncio.to_thread(app.state.screenshots.stats)
+
+@app.get("/api/screenshots/{token}")
+async def deferred_screenshot(token: str):
+    """Captures a deferred screenshot on first request and redirects to the stored image."""
+    try:
+        path = await app.state.screenshots.resolve(token, _render_snapshot)
+    except Exception as e:
+        print(f"Deferred screenshot failed: {e}")
+        raise HTTPException(status_code=502, detail="Não foi possível capturar a página.")
+    if path is None:
+        raise HTTPException(status_code=404, detail="Captura expirada ou inexistente.")
+    return RedirectResponse(f"/{path}")
+
+@app.get("/api/workers")
+async def workers_status():
+    """The processes running analyses, with their heartbeats (JOB_BACKEND=sqlite) and queue depth."""
+    jobs = app.state.jobs
+    return {"backend": JOB_BACKEND, "queue_depth": await jobs_call(jobs.queue_depth),
+            "running": await jobs_call(jobs.running), "workers": await jobs_call(jobs.workers_status)}
+
+@app.get("/api/pool")
+async def pool_status():
+    """Browser pool occupancy (active/waiting contexts, recycling counters)."""
+    return app.state.browser_pool.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint: stage/rule/site latency histograms plus queue, pool and cache gauges."""
+    pool = app.state.browser_pool.stats()
+    jobs = app.state.jobs
+    workers = await jobs_call(jobs.workers_status)
+    gauges = [
+        ("bdp_job_queue_depth", "gauge", "Analyses waiting for a worker.", await jobs_call(jobs.queue_depth)),
+        ("bdp_jobs_running", "gauge", "Analyses being processed.", await jobs_call(jobs.running)),
+        ("bdp_workers_alive", "gauge", "Processes running analyses with a recent heartbeat.",
+         sum(1 for worker in workers if worker["alive"])),
+        ("bdp_worker_slots", "gauge", "Analyses the live workers run at once.",
+         sum(worker["slots"] for worker in workers if worker["alive"])),
+        ("bdp_pool_active_contexts", "gauge", "Browser contexts in use.", pool["active_contexts"]),
+        ("bdp_pool_waiting", "gauge", "Crawls waiting for a browser context.", pool["waiting"]),
+        ("bdp_pool_max_contexts", "gauge", "Browser contexts the pool hands out at once.", pool["max_contexts"]),
+        ("bdp_pool_retiring_browsers", "gauge", "Recycled browsers still finishing their contexts.", pool["retiring_browsers"]),
+        ("bdp_pool_launches_total", "counter", "Chromium launches.", pool["launches"]),
+        ("bdp_pool_crashes_total", "counter", "Chromium crashes/disconnections.", pool["crashes"]),
+        ("bdp_pool_pages_total", "counter", "Pages opened in pooled browsers.", pool["pages_total"]),
+    ]
+    for name in ("crawl_cache", "analysis_cache"):
+        level = getattr(app.state, name)
+        gauges.append((f"bdp_{name}_entries", "gauge", f"Entries in the {level.name} cache.", len(level.store)))
+        gauges.append((f"bdp_{name}_hits_total", "counter", f"Hits of the {level.name} cache.", level.hits))
+        gauges.append((f"bdp_{name}_misses_total", "counter", f"Misses of the {level.name} cache.", level.misses))
+    return PlainTextResponse(render_metrics(gauges), media_type="text/plain; version=0.0.4")
+
 # Mount Frontend Static Files (Must be last to avoid intercepting API routes)
 app.mount("/", StaticFiles(directory="frontend", html=True), name="frontend")
 
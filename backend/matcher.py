@@ -0,0 +1,57 @@
+# Precompiled matchers for the compliance rules.
+# Built once at import time so every page is scanned in a single pass,
+# however many terms the regulator lists grow to.
+# The forbidden terms run over normalized text (see normalized_text.py), so they
+# are folded here the same way and matched as whole words.
+
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .normalized_text import char_kind, fold
+from .rules import FORBIDDEN_TERMS
+
+# Before (after) a term starting (ending) with a letter there must be no letter; same for digits
+_BOUNDARY_BEFORE = {"letter": r"(?<![^\W\d_])", "digit": r"(?<!\d)"}
+_BOUNDARY_AFTER = {"letter": r"(?![^\W\d_])", "digit": r"(?!\d)"}
+
+
+def compile_terms(terms: Iterable[str], flags: int = 0, words: bool = False) -> re.Pattern:
+    """
+    One alternation regex for all terms.
+    Wrapped in a lookahead so overlapping occurrences are all reported;
+    longer terms come first so the longest term wins at a given position.
+    With words, a term only matches as whole words (like NormalizedText.find).
+    """
+    terms = sorted(terms, key=len, reverse=True)
+    # Only the positions starting like some term go through the alternation
+    first = "".join(sorted({re.escape(term[0]) for term in terms}))
+    if not words:
+        alternation = "|".join(re.escape(term) for term in terms)
+    else:
+        # One boundary check per kind of first character, not one per term (a
+        # lookbehind in every alternative makes the scan ten times slower)
+        groups: Dict[Optional[str], List[str]] = {}
+        for term in terms:
+            groups.setdefault(char_kind(term[0]), []).append(
+                re.escape(term) + _BOUNDARY_AFTER.get(char_kind(term[-1]), ""))
+        alternation = "|".join(f"{_BOUNDARY_BEFORE.get(kind, '')}(?:{'|'.join(group)})" for kind, group in groups.items())
+    return re.compile(f"(?=[{first}])(?=({alternation}))", flags)
+
+# Folded term -> its FORBIDDEN_TERMS key
+FORBIDDEN_FOLDED = {fold(term): term for term in FORBIDDEN_TERMS}
+# Folded terms against normalized text (NormalizedText.text)
+FORBIDDEN_PATTERN = compile_terms(FORBIDDEN_FOLDED, words=True)
+
+# Number followed by "%" (rates)
+PERCENT_PATTERN = re.compile(r'\d+([.,]\d+)?\s*%')
+
+def find_terms(text: str, pattern: re.Pattern = FORBIDDEN_PATTERN) -> List[Tuple[int, int, str]]:
+    """All occurrences as (start, end, term), in text order."""
+    return [(m.start(1), m.end(1), m.group(1)) for m in pattern.finditer(text)]
+
+def first_occurrences(text: str, pattern: re.Pattern = FORBIDDEN_PATTERN) -> Dict[str, Tuple[int, int]]:
+    """(start, end) of the first occurrence of each term found in the text."""
+    first: Dict[str, Tuple[int, int]] = {}
+    for start, end, term in find_terms(text, pattern):
+        first.setdefault(term, (start, end))
+    return first
@@ -0,0 +1,98 @@
+# Latency histograms for /metrics, in the Prometheus text format.
+#
+# Every crawled page carries 'timings' (milliseconds per stage: goto, scroll,
+# settle, highlight, extract, screenshot, ... plus "artifact:<name>" for what the
+# rules parse and "rule:<name>" per rule). They are observed here once per page,
+# in the API process (rules run in worker processes and send their timings back),
+# so the histograms show which stage is slow across all the sites scanned.
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+# Upper bounds in seconds: page stages take ms to tens of seconds, rules µs to ms
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+RULE_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+SITE_BUCKETS = (1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Histogram:
+    """Cumulative histogram with one label (series created on first observation)."""
+
+    def __init__(self, name: str, help: str, label: str, buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series: Dict[str, List] = {}  # label value -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, seconds: float):
+        with self._lock:
+            series = self._series.setdefault(label_value, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {value: list(counts) for value, counts in self._series.items()}
+        for value in sorted(series):
+            counts = series[value]
+            label = f'{self.label}="{_escape(value)}"'
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{label},le="{_number(bound)}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {counts[-1]}')
+            lines.append(f"{self.name}_sum{{{label}}} {round(counts[-2], 6)}")
+            lines.append(f"{self.name}_count{{{label}}} {counts[-1]}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("bdp_stage_duration_seconds", "Time spent per crawl/analysis stage.", "stage", STAGE_BUCKETS)
+RULE_SECONDS = Histogram("bdp_rule_duration_seconds", "Time spent per compliance rule and page.", "rule", RULE_BUCKETS)
+SITE_SECONDS = Histogram("bdp_site_duration_seconds", "Time to crawl and analyze one site.", "mode", SITE_BUCKETS)
+
+
+def observe_timings(timings: Dict[str, float]):
+    """Feeds a page's 'timings' (ms) into the histograms: "rule:<name>" per rule, the rest per stage."""
+    for stage, ms in timings.items():
+        if stage.startswith("rule:"):
+            RULE_SECONDS.observe(stage[len("rule:"):], ms / 1000)
+        else:
+            STAGE_SECONDS.observe(stage, ms / 1000)
+
+
+@contextmanager
+def timed(timings: Dict[str, float], stage: str, digits: int = 0) -> Iterator[None]:
+    """Adds the duration of the block to timings[stage], in milliseconds."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - start) * 1000
+        timings[stage] = round(timings.get(stage, 0) + elapsed, digits or None)
+
+
+def render_metrics(gauges: List[Tuple[str, str, str, float]]) -> str:
+    """
+    The histograms plus point-in-time values, as a /metrics response body.
+    gauges: (name, type ("gauge" or "counter"), help, value)
+    """
+    lines: List[str] = []
+    for histogram in (STAGE_SECONDS, RULE_SECONDS, SITE_SECONDS):
+        lines.extend(histogram.render())
+    for name, kind, help, value in gauges:
+        lines.extend([f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {_number(value or 0)}"])
+    return "\n".join(lines) + "\n"
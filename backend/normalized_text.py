@@ -0,0 +1,185 @@
+# Normalized page text for the keyword rules.
+#
+# Built once per page: the text is case- and accent-folded (Unicode NFKD without
+# combining marks, so "Crédito" and "credito" read the same), invisible
+# characters (soft hyphens, zero-width spaces/joiners, BOM) are dropped and every
+# run of whitespace, non-breaking spaces included, becomes one space. So
+# "crédito  fácil" split over two elements, or "cré\u00addito" with a soft hyphen,
+# still reads "credito facil".
+# Ordinal indicators (º, ª) are kept: NFKD would turn "nº" into the word "no".
+#
+# The folded text is split into word tokens (letters or digits, so "nº123" is
+# "nº" + "123") and their vocabulary is kept. A term whose words are not all on
+# the page is ruled out by set lookups, without touching the text (most lookups
+# of most pages end there); the others are found by one search that stops at the
+# first occurrence. Terms only match whole words: "tan" is not found in
+# "importante". A trailing "*" lets the term's last word go on ("crédito*"
+# matches "créditos").
+# Folded offsets map back to the original text, for context snippets and for
+# locating a match in the DOM text index.
+
+import re
+import unicodedata
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from typing import Iterator, List, Optional, Set, Tuple
+
+# Dropped from the text: soft hyphen, Mongolian vowel separator, zero-width space/
+# non-joiner/joiner, word joiner, BOM
+INVISIBLE = frozenset("\u00ad\u180e\u200b\u200c\u200d\u2060\ufeff")
+# Left as they are by the folding
+KEEP = frozenset("ºª")
+
+# Combining diacritical marks (the accents NFKD splits off)
+COMBINING = re.compile("[\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f]")
+TOKEN = re.compile(r"[^\W\d_]+|\d+")
+
+
+@lru_cache(maxsize=4096)
+def _fold_char(char: str) -> str:
+    if char in INVISIBLE:
+        return ""
+    if char in KEEP:
+        return char
+    return COMBINING.sub("", unicodedata.normalize("NFKD", char)).casefold()
+
+
+def _fold_run(text: str) -> str:
+    # Text whose characters each fold to exactly one: folded in one go
+    if text.isascii():
+        return text.lower()
+    folded = COMBINING.sub("", unicodedata.normalize("NFKD", text)).casefold()
+    if len(folded) != len(text) or "º" in text or "ª" in text:
+        folded = "".join(_fold_char(char) for char in text)
+    return folded
+
+
+def char_kind(char: str) -> Optional[str]:
+    """What kind of word token the character belongs to ("letter", "digit"; see TOKEN), or None."""
+    return "digit" if char.isdigit() else "letter" if char.isalpha() else None
+
+
+def clean(text: str) -> str:
+    """Text as shown in issue contexts: invisible characters dropped, whitespace collapsed."""
+    return " ".join("".join(c for c in text if c not in INVISIBLE).split())
+
+
+@lru_cache(maxsize=1024)
+def fold(text: str) -> str:
+    """The folded form of a term or text (same folding as NormalizedText, without offsets)."""
+    return NormalizedText(text).text
+
+
+class NormalizedText:
+    """Folded text of a page, its word vocabulary and the way back to the original text."""
+
+    def __init__(self, text: str):
+        self.original = text
+        # Other whitespace is a space (one for one); then the characters that do
+        # not fold to exactly one break the text into runs that do: runs of spaces
+        # (-> " "), characters folding to nothing (invisible ones, lone combining
+        # marks) and expansions ("ﬁ" -> "fi")
+        vanishing, expanding = [], []
+        for char in set(text):
+            if char.isspace():
+                if char != " ":
+                    text = text.replace(char, " ")
+            elif not char.isascii():
+                folded = _fold_char(char)
+                if not folded or COMBINING.match(char):
+                    vanishing.append(re.escape(char))
+                elif len(folded) > 1:
+                    expanding.append(re.escape(char))
+        irregular = ["  +"]
+        if vanishing:
+            zero = "".join(vanishing)
+            irregular = [f"[ {zero}]* [ {zero}]* [ {zero}]*|[{zero}]* [{zero}]+|[{zero}]+ ?"]
+        if expanding:
+            irregular.append(f"[{''.join(expanding)}]")
+
+        out: List[str] = []
+        length = 0
+        # Folded offset -> original offset, piecewise: from starts[i] on, the
+        # original offset is origins[i] + (offset - starts[i])
+        self._starts: List[int] = [0]
+        self._origins: List[int] = [0]
+        done = 0
+        for match in re.finditer("|".join(irregular), text):
+            out.append(_fold_run(text[done:match.start()]))
+            length += match.start() - done
+            run = match.group()
+            folded = " " if " " in run else "".join(_fold_char(char) for char in run)
+            out.append(folded)
+            if len(folded) != len(run):
+                # Every character of an expansion maps to the one it came from, a space to the first one
+                origin = match.start() + (run.index(" ") if folded == " " else 0)
+                for k in range(len(folded)):
+                    self._starts.append(length + k)
+                    self._origins.append(origin)
+                self._starts.append(length + len(folded))
+                self._origins.append(match.end())
+            length += len(folded)
+            done = match.end()
+        out.append(_fold_run(text[done:]))
+
+        self.text = "".join(out)
+        # Pages repeat their words: each distinct space-separated chunk is tokenized once
+        self.vocabulary: Set[str] = set()
+        for chunk in set(self.text.split(" ")):
+            self.vocabulary.update(TOKEN.findall(chunk))
+        self._sorted: Optional[List[str]] = None
+
+    def original_offset(self, offset: int) -> int:
+        """Offset in the original text of the character at `offset` of the folded text."""
+        i = bisect_right(self._starts, offset) - 1
+        return self._origins[i] + (offset - self._starts[i])
+
+    def original_span(self, start: int, end: int) -> Tuple[int, int]:
+        """Original (start, end) of the folded text[start:end]."""
+        return self.original_offset(start), self.original_offset(end - 1) + 1
+
+    def snippet(self, start: int, end: int, width: int = 50) -> str:
+        """Original text around the folded span, whitespace collapsed and invisible characters dropped."""
+        o_start, o_end = self.original_span(start, end)
+        return clean(self.original[max(0, o_start - width):o_end + width])
+
+    def has_word(self, word: str, prefix: bool = False) -> bool:
+        """Whether a folded word (with prefix, a word starting with it) is on the page."""
+        if not prefix:
+            return word in self.vocabulary
+        if self._sorted is None:
+            self._sorted = sorted(self.vocabulary)
+        i = bisect_left(self._sorted, word)
+        return i < len(self._sorted) and self._sorted[i].startswith(word)
+
+    def has_words(self, term: str) -> bool:
+        """Whether every word of the term is on the page (a set lookup each; the text is not searched)."""
+        prefix = term.endswith("*")
+        words = TOKEN.findall(fold(term[:-1] if prefix else term))
+        return all(self.has_word(word, prefix and i == len(words) - 1) for i, word in enumerate(words))
+
+    def iter_spans(self, term: str) -> Iterator[Tuple[int, int]]:
+        """Folded (start, end) of every whole-word occurrence of the term, in text order."""
+        prefix = term.endswith("*")
+        folded = fold(term[:-1] if prefix else term)
+        if not folded or not self.has_words(term):
+            return
+        # A term starting (ending) with a letter must not have one right before (after) it; same for digits
+        first, last = char_kind(folded[0]), None if prefix else char_kind(folded[-1])
+        start = self.text.find(folded)
+        while start != -1:
+            end = start + len(folded)
+            if (first is None or start == 0 or char_kind(self.text[start - 1]) != first) and \
+                    (last is None or end == len(self.text) or char_kind(self.text[end]) != last):
+                yield start, end
+            start = self.text.find(folded, start + 1)
+
+    def find_all(self, term: str) -> List[Tuple[int, int]]:
+        return list(self.iter_spans(term))
+
+    def find(self, term: str) -> Optional[Tuple[int, int]]:
+        """First occurrence of the term (see iter_spans), or None."""
+        return next(self.iter_spans(term), None)
+
+    def contains(self, term: str) -> bool:
+        return self.find(term) is not None
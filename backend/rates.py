@@ -0,0 +1,150 @@
+# Rate table for the TAEG rule.
+#
+# Every percentage on a page is extracted in one regex pass over the DOM text
+# index and classified at once: the rate is the TAEG itself, sits next to a TAEG
+# (same text node, or a TAEG mention under a close common ancestor, e.g. the
+# header of the simulator table it is in), is not a rate at all ("100% Online",
+# "Top 5%"), or is unaccompanied. Labels are also found in one pass, and the
+# nearest TAEG mention before/after each node comes from two sweeps, so the
+# cost stays linear in the page size however many numeric cells it has.
+#
+# Paths carry the sibling position (see dom_index._label), so each of several
+# offer cards alike is its own block: a TAEG in one card does not cover the
+# rate of the next, and each unaccompanied rate is reported on its own element
+# (the cells of one table count as one, see offer_path).
+
+import os
+import re
+from functools import lru_cache
+from typing import FrozenSet, List, NamedTuple, Optional
+
+from .dom_index import DomTextIndex, TextNode
+from .matcher import PERCENT_PATTERN
+
+# Percentages in these contexts are not interest rates ("Top 5%", "100% Online")
+IGNORED_RATE_CONTEXTS = ["top", "scoring", "online", "digital", "satisfação", "cliente", "processo", "100%"]
+
+# A TAEG mention accompanies a rate when their closest common ancestor is at most
+# this many levels above the rate's element (3: td > tr > tbody > table)
+RATE_PROXIMITY_LEVELS = int(os.getenv("RATE_PROXIMITY_LEVELS", "3"))
+
+# Labels that name a rate; "taxa anual" alone is how some sites spell out the TAEG
+LABEL_PATTERN = re.compile(
+    r"\b(?:(taeg|taxa anual efetiva global|taxa anual(?! nominal))|(tan|taxa anual nominal)|(mtic|montante total imputado))\b",
+    re.IGNORECASE)
+LABELS = ("TAEG", "TAN", "MTIC")
+
+# Classification of a rate
+TAEG = "taeg"                    # the rate is the TAEG
+ACCOMPANIED = "accompanied"      # a TAEG is shown next to it
+IGNORED = "ignored"              # not an interest rate
+UNACCOMPANIED = "unaccompanied"  # a rate with no TAEG near it
+
+
+class Rate(NamedTuple):
+    value: float
+    raw: str                      # as written, e.g. "7,5%"
+    node: TextNode
+    label: Optional[str]          # closest label before the rate in its node ("TAEG", "TAN", "MTIC")
+    labels: FrozenSet[str]        # every label in its node
+    taeg_distance: Optional[int]  # levels up to the ancestor shared with the nearest TAEG mention (0 = same node)
+    status: str
+
+
+def _components(path: str) -> List[str]:
+    return path.split(" > ")
+
+
+def _distance(rate_path: List[str], other_path: List[str]) -> int:
+    """Levels from the rate's element up to the closest ancestor it shares with the other node."""
+    common = 0
+    for a, b in zip(rate_path, other_path):
+        if a != b:
+            break
+        common += 1
+    return len(rate_path) - common
+
+
+def extract_rates(index: DomTextIndex, proximity: int = RATE_PROXIMITY_LEVELS) -> List[Rate]:
+    """Every percentage of the page, in document order, with its labels and classification."""
+    count = len(index.nodes)
+    # Labels per node: [(offset inside the node, label)]
+    node_labels: List[Optional[List]] = [None] * count
+    for match in LABEL_PATTERN.finditer(index.text):
+        i, inner = index.position(match.start())
+        label = LABELS[match.lastindex - 1]
+        if node_labels[i] is None:
+            node_labels[i] = []
+        node_labels[i].append((inner, label))
+
+    def has_taeg(i: int) -> bool:
+        return node_labels[i] is not None and any(label == "TAEG" for _, label in node_labels[i])
+
+    # Nearest node with a TAEG mention at or before / at or after each node
+    previous_taeg: List[Optional[int]] = [None] * count
+    last = None
+    for i in range(count):
+        if has_taeg(i):
+            last = i
+        previous_taeg[i] = last
+    next_taeg: List[Optional[int]] = [None] * count
+    last = None
+    for i in range(count - 1, -1, -1):
+        if has_taeg(i):
+            last = i
+        next_taeg[i] = last
+
+    rates = []
+    # Per node, shared by its rates: (labels, distance to a TAEG mention, ignored context)
+    node_info = {}
+    for match in PERCENT_PATTERN.finditer(index.text):
+        i, inner = index.position(match.start())
+        node = index.nodes[i]
+        info = node_info.get(i)
+        if info is None:
+            if has_taeg(i):
+                distance = 0
+            else:
+                path = _components(node.path)
+                distance = min((_distance(path, _components(index.nodes[j].path))
+                                for j in (previous_taeg[i], next_taeg[i]) if j is not None), default=None)
+            lower = node.text.lower()
+            info = node_info[i] = (frozenset(label for _, label in node_labels[i] or ()), distance,
+                                   any(context in lower for context in IGNORED_RATE_CONTEXTS))
+        labels, distance, ignored = info
+
+        label = None
+        for offset, name in node_labels[i] or ():
+            if offset < inner:
+                label = name
+        raw = match.group(0)
+        if label == "TAEG":
+            status = TAEG
+        elif distance is not None and distance <= proximity:
+            status = ACCOMPANIED
+        elif ignored:
+            status = IGNORED
+        else:
+            status = UNACCOMPANIED
+        rates.append(Rate(float(raw[:-1].strip().replace(",", ".")), raw, node, label, labels, distance, status))
+    return rates
+
+
+@lru_cache(maxsize=4096)
+def offer_path(path: str) -> str:
+    """The block a rate is reported under: the table it is a cell of, otherwise its own element."""
+    if "table" not in path:
+        return path
+    components = _components(path)
+    for i in range(len(components) - 1, -1, -1):
+        if re.match(r"table(?![\w-])", components[i]):
+            return " > ".join(components[:i + 1])
+    return path
+
+
+def text_index(text: str) -> DomTextIndex:
+    """
+    Index over plain text (no DOM): one node per line, all under the same parent,
+    so a TAEG anywhere on the page accompanies every rate.
+    """
+    return DomTextIndex([TextNode(line, "", (), "text") for line in text.split("\n") if line.strip()])
@@ -0,0 +1,162 @@
+"""
+Offline rule replay: re-runs the current rules over archived crawls (see
+archive.py) in a process pool, without a browser, and reports per site what
+changed against the issues found when the pages were crawled.
+
+Usage (from the repository root):
+    python -m backend.replay crawl_archive/ -o replay.jsonl [--latest] [--workers 8]
+
+Writes one JSON line per replayed crawl:
+{'site', 'crawl', 'archived_at', 'rules_version', 'pages', 'before': {score, status},
+ 'after': {score, status}, 'added': [issue], 'removed': [issue]}
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Set
+
+from .archive import archive_files, read_records
+from .cache import RULES_VERSION, CacheLevel
+from .compliance import ANALYSIS_WORKERS, analyze_compliance, summarize_issues
+from .urls import normalize_url
+
+# Crawls analyzed at once per analysis process
+REPLAY_CRAWLS_PER_WORKER = 4
+
+
+def _silence():
+    # One "Analyzing page" line per page is noise over thousands of pages
+    sys.stdout = open(os.devnull, "w")
+
+
+def latest_crawls(files: List[str]) -> Set[str]:
+    """Ids of the most recent complete crawl of each site (first pass over the archive)."""
+    latest: Dict[str, tuple] = {}
+    for record in read_records(files):
+        if record["type"] == "crawl":
+            site = normalize_url(record["site"])
+            if site not in latest or record["archived_at"] > latest[site][0]:
+                latest[site] = (record["archived_at"], record["crawl"])
+    return {crawl for _, crawl in latest.values()}
+
+
+def _issue_key(issue: Dict) -> tuple:
+    return issue["url"], issue["rule"], issue["severity"], issue["description"]
+
+
+def diff_issues(before: List[Dict], after: List[Dict]):
+    """Issues only in `after` (added) and only in `before` (removed)."""
+    old = {_issue_key(issue) for issue in before}
+    new = {_issue_key(issue) for issue in after}
+    return ([issue for issue in after if _issue_key(issue) not in old],
+            [issue for issue in before if _issue_key(issue) not in new])
+
+
+async def replay_crawl(pages: List[Dict], crawl: Optional[Dict], executor, cache: CacheLevel) -> Dict:
+    """The crawl's pages through analyze_compliance, compared with their archived issues."""
+    pages.sort(key=lambda page: page.get("order", []))
+    before = summarize_issues([issue for page in pages for issue in page["issues"]], len(pages))
+    after = await analyze_compliance(pages, executor=executor, cache=cache)
+    added, removed = diff_issues(before["issues"], after["issues"])
+    return {
+        "site": crawl["site"] if crawl else pages[0]["url"],
+        "crawl": pages[0]["crawl"],
+        "archived_at": pages[0]["archived_at"],
+        "rules_version": pages[0]["rules_version"],
+        "pages": len(pages),
+        "complete": crawl is not None,
+        "before": {"score": before["score"], "status": before["status"]},
+        "after": {"score": after["score"], "status": after["status"]},
+        "added": added,
+        "removed": removed,
+    }
+
+
+async def replay(files: List[str], output: str, workers: int = ANALYSIS_WORKERS, latest: bool = False) -> Dict:
+    """Replays every crawl of the archive files (or the latest one per site); returns the totals."""
+    wanted = latest_crawls(files) if latest else None
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_silence) if workers > 0 else None
+    # Identical pages (the same page archived on several days) are analyzed once
+    cache = CacheLevel("replay", ttl=24 * 3600, backend="memory")
+    limit = asyncio.Semaphore(max(1, workers) * REPLAY_CRAWLS_PER_WORKER)
+    totals = Counter()
+    rules_added, rules_removed = Counter(), Counter()
+    start = time.perf_counter()
+
+    with open(output, "w", encoding="utf-8") as out:
+        async def run(pages: List[Dict], crawl: Optional[Dict]):
+            try:
+                report = await replay_crawl(pages, crawl, executor, cache)
+            except Exception as e:
+                print(f"[erro] {crawl['site'] if crawl else pages[0]['url']}: {type(e).__name__}: {e}")
+                totals["failed"] += 1
+                return
+            finally:
+                limit.release()
+            out.write(json.dumps(report, ensure_ascii=False) + "\n")
+            totals["crawls"] += 1
+            totals["pages"] += report["pages"]
+            totals["changed"] += bool(report["added"] or report["removed"])
+            totals["status_changed"] += report["before"]["status"] != report["after"]["status"]
+            rules_added.update(issue["rule"] for issue in report["added"])
+            rules_removed.update(issue["rule"] for issue in report["removed"])
+            if report["before"] != report["after"]:
+                print(f"{report['site']}: {report['before']['score']} ({report['before']['status']})"
+                      f" -> {report['after']['score']} ({report['after']['status']})")
+
+        # Pages are held until their crawl record arrives (or the end, for crawls cut short)
+        pending: Dict[str, List[Dict]] = defaultdict(list)
+        tasks = []
+        try:
+            for record in read_records(files):
+                if wanted is not None and record["crawl"] not in wanted:
+                    continue
+                if record["type"] == "page":
+                    pending[record["crawl"]].append(record)
+                elif record["type"] == "crawl" and record["crawl"] in pending:
+                    await limit.acquire()
+                    tasks.append(asyncio.create_task(run(pending.pop(record["crawl"]), record)))
+            for pages in pending.values():
+                await limit.acquire()
+                tasks.append(asyncio.create_task(run(pages, None)))
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - start
+    return dict(totals, elapsed_s=round(elapsed, 1),
+                pages_per_s=round(totals["pages"] / elapsed, 1) if elapsed else None,
+                rules_added=dict(rules_added), rules_removed=dict(rules_removed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-run the current rules over archived crawls.")
+    parser.add_argument("archives", nargs="+", help="archive files or directories (crawl-*.jsonl.gz)")
+    parser.add_argument("-o", "--output", default="replay.jsonl", help="JSONL report, one line per crawl")
+    parser.add_argument("--workers", type=int, default=ANALYSIS_WORKERS or os.cpu_count() or 1,
+                        help="analysis processes (0 = one thread)")
+    parser.add_argument("--latest", action="store_true", help="only the most recent crawl of each site")
+    args = parser.parse_args()
+
+    files = archive_files(args.archives)
+    if not files:
+        sys.exit("Nenhum arquivo de crawl encontrado.")
+    print(f"Replaying {len(files)} archive file(s) with rules {RULES_VERSION}")
+    totals = asyncio.run(replay(files, args.output, args.workers, args.latest))
+    print(f"{totals.get('crawls', 0)} sites, {totals.get('pages', 0)} pages in {totals['elapsed_s']} s "
+          f"({totals['pages_per_s']} pages/s): {totals.get('changed', 0)} with different issues, "
+          f"{totals.get('status_changed', 0)} with a different status, {totals.get('failed', 0)} failed")
+    for rule in sorted(set(totals["rules_added"]) | set(totals["rules_removed"])):
+        print(f"  {rule:<45} +{totals['rules_added'].get(rule, 0)} -{totals['rules_removed'].get(rule, 0)}")
+    print(f"Report: {args.output}")
+
+if __name__ == "__main__":
+    main()
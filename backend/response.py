@@ -0,0 +1,116 @@
+# Compact result format and compressed JSON responses.
+#
+# The full format (AnalysisResult) repeats the page URL and screenshot path on
+# every issue, and carries one "success" issue per rule and page, so it grows
+# with pages x rules while saying little more than "rule X passed N times".
+# format=compact sends instead:
+#   pages:     [{'url', 'screenshot', 'tier', 'reused'}], in crawl order
+#   issues:    the findings (non-success), pointing at their page by index; an
+#              issue keeps its own 'screenshot' only when it is a crop
+#   successes: {rule: count} of the success issues
+# The findings of either format can be paged with offset/limit ('total_issues'
+# says how many there are). Result responses are compressed with brotli when the
+# client accepts it and the module is installed, gzip otherwise.
+
+import gzip
+import json
+import os
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+from fastapi.responses import Response
+
+# Optional brotli encoder (pip install brotli); gzip is used without it
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+RESPONSE_FORMATS = ("full", "compact")
+# Smaller bodies are sent as they are (compression would not pay for its headers)
+RESPONSE_COMPRESS_MIN = int(os.getenv("RESPONSE_COMPRESS_MIN", "1024"))  # bytes
+# Upper bound on the issues of one result page (limit)
+RESULT_MAX_LIMIT = int(os.getenv("RESULT_MAX_LIMIT", "1000"))
+
+
+def page_issues(issues: List[Dict], offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+    """issues[offset:offset + limit], limit capped at RESULT_MAX_LIMIT (None: all of them)."""
+    offset = max(0, offset)
+    if limit is None:
+        return issues[offset:]
+    return issues[offset:offset + max(0, min(limit, RESULT_MAX_LIMIT))]
+
+
+def full_result(result: Dict, offset: int = 0, limit: Optional[int] = None) -> Dict:
+    """The full format, its issues paged when offset/limit are given."""
+    if not offset and limit is None:
+        return result
+    return dict(result, issues=page_issues(result["issues"], offset, limit),
+                total_issues=len(result["issues"]), offset=offset)
+
+
+def compact_result(result: Dict, offset: int = 0, limit: Optional[int] = None) -> Dict:
+    """The compact format of an analysis result (see the top of this module)."""
+    # Every issue of a page shares its screenshot but crops, so the commonest one is the page's
+    screenshots: Dict[str, Counter] = defaultdict(Counter)
+    for issue in result["issues"]:
+        screenshots[issue["url"]][issue["screenshot"]] += 1
+    tiers = result.get("page_tiers", {})
+    reused = set(result.get("reused_pages", []))
+
+    urls = list(dict.fromkeys([*tiers, *result.get("reused_pages", []), *screenshots]))
+    index = {url: i for i, url in enumerate(urls)}
+    pages = []
+    for url in urls:
+        page = {"url": url, "screenshot": screenshots[url].most_common(1)[0][0] if screenshots[url] else ""}
+        if url in tiers:
+            page["tier"] = tiers[url]
+        if url in reused:
+            page["reused"] = True
+        pages.append(page)
+
+    successes = Counter()
+    findings = []
+    for issue in result["issues"]:
+        if issue["severity"] == "success":
+            successes[issue["rule"]] += 1
+            continue
+        finding = {key: issue[key] for key in ("rule", "description", "severity", "suggestion")}
+        if issue.get("context"):
+            finding["context"] = issue["context"]
+        if issue.get("location_guide"):
+            finding["location_guide"] = issue["location_guide"]
+        page = index[issue["url"]]
+        finding["page"] = page
+        if issue["screenshot"] != pages[page]["screenshot"]:
+            finding["screenshot"] = issue["screenshot"]
+        findings.append(finding)
+
+    compact = {
+        "score": result["score"],
+        "status": result["status"],
+        "scanned_pages": result["scanned_pages"],
+        "pages": pages,
+        "issues": page_issues(findings, offset, limit),
+        "total_issues": len(findings),
+        "offset": offset,
+        "successes": dict(successes),
+    }
+    if result.get("timings") is not None:
+        compact["timings"] = result["timings"]
+    return compact
+
+
+def json_response(payload, accept_encoding: str = "", status_code: int = 200) -> Response:
+    """Compact JSON, brotli- or gzip-encoded when it is worth it and the client accepts it."""
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    headers = {"Vary": "Accept-Encoding"}
+    accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+    if len(body) >= RESPONSE_COMPRESS_MIN:
+        if brotli is not None and "br" in accepted:
+            body = brotli.compress(body, quality=5)
+            headers["Content-Encoding"] = "br"
+        elif "gzip" in accepted:
+            body = gzip.compress(body, compresslevel=6)
+            headers["Content-Encoding"] = "gzip"
+    return Response(body, status_code=status_code, media_type="application/json", headers=headers)
@@ -0,0 +1,101 @@
+# Small rule engine for the compliance checks.
+#
+# Rules are plain functions registered with @rule. Each declares the page
+# artifacts it reads (normalized text, DOM text index, rates, ...). Artifacts are
+# built lazily, at most once per page, and shared by every rule, so a page whose
+# rules never touch the DOM is never parsed as HTML.
+
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .metrics import timed
+
+ArtifactBuilder = Callable[["PageContext"], Any]
+RuleFunc = Callable[["PageContext"], Optional[List[Dict]]]
+
+ARTIFACTS: Dict[str, ArtifactBuilder] = {}
+RULES: List["Rule"] = []
+
+
+class Rule:
+    def __init__(self, name: str, func: RuleFunc, requires: Iterable[str], stop: bool):
+        self.name = name
+        self.func = func
+        self.requires = frozenset(requires)
+        # When a stopping rule reports issues, the remaining rules are skipped
+        self.stop = stop
+
+
+def artifact(name: str):
+    """Registers the builder of a page artifact."""
+    def decorator(builder: ArtifactBuilder) -> ArtifactBuilder:
+        ARTIFACTS[name] = builder
+        return builder
+    return decorator
+
+
+def rule(name: str, requires: Iterable[str] = ("text",), stop: bool = False):
+    """Registers a rule; rules run in registration order."""
+    def decorator(func: RuleFunc) -> RuleFunc:
+        unknown = set(requires) - set(ARTIFACTS)
+        if unknown:
+            raise ValueError(f"Rule '{name}' requires unknown artifacts: {sorted(unknown)}")
+        RULES.append(Rule(name, func, requires, stop))
+        return func
+    return decorator
+
+
+class PageContext:
+    """One crawled page plus the artifacts built for it so far."""
+
+    def __init__(self, page: Dict, timings: Optional[Dict[str, float]] = None):
+        self.page = page
+        self.url = page['url']
+        self.screenshot = page['screenshot']
+        self.crops: Dict[str, str] = page.get('crops', {})
+        self._artifacts: Dict[str, Any] = {}
+        self._allowed: Optional[frozenset] = None
+        # ms per built artifact ("artifact:<name>") and per rule ("rule:<name>")
+        self.timings: Dict[str, float] = {} if timings is None else timings
+
+    def screenshot_for(self, node) -> str:
+        """Crop around the node's element when one was captured, else the page screenshot."""
+        return self.crops.get(node.path, self.screenshot)
+
+    def get(self, name: str) -> Any:
+        """Returns an artifact the current rule declared, building it on first use."""
+        if self._allowed is not None and name not in self._allowed:
+            raise KeyError(f"Artifact '{name}' not declared by the running rule")
+        return self.build(name)
+
+    def build(self, name: str) -> Any:
+        """Artifact access for builders (they may depend on other artifacts)."""
+        if name not in self._artifacts:
+            # Includes the artifacts this one builds first (they get their own entry too)
+            with timed(self.timings, f"artifact:{name}", digits=3):
+                self._artifacts[name] = ARTIFACTS[name](self)
+        return self._artifacts[name]
+
+    def built(self) -> List[str]:
+        return list(self._artifacts)
+
+
+def run_rules(page: Dict, rules: Optional[List[Rule]] = None,
+              timings: Optional[Dict[str, float]] = None) -> List[Dict]:
+    """
+    Runs the registered rules against one page and returns all their issues.
+    timings, if given, receives the ms spent per artifact and per rule (a rule's
+    time includes the artifacts it was the first to need).
+    """
+    ctx = PageContext(page, timings)
+    issues: List[Dict] = []
+    for current in (RULES if rules is None else rules):
+        ctx._allowed = current.requires
+        try:
+            with timed(ctx.timings, f"rule:{current.name}", digits=3):
+                found = current.func(ctx) or []
+        finally:
+            ctx._allowed = None
+        issues.extend(found)
+        if current.stop and found:
+            break
+    return issues
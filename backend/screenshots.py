@@ -0,0 +1,268 @@
+# Screenshot storage: compressed captures, content-addressed names, retention.
+#
+# The crawler only captures the bytes while the tab is open; naming, encoding
+# (WebP) and the disk write happen in a worker thread so the crawl moves on to
+# the next page. Files are named after the hash of the capture, so identical
+# captures (same page, same highlights) are stored once.
+#
+# With SCREENSHOT_MODE "findings" or "on_demand" the crawler does not capture
+# at all: it keeps the highlighted DOM as a snapshot and hands out a deferred
+# path (api/screenshots/<token>). The capture happens when that path is first
+# requested ("on_demand"), or in the background once the page turns out to
+# have findings ("findings"; pages with only successes are never captured).
+# Pages fetched without a browser (CRAWL_FETCH=tiered) are always deferred: their
+# snapshot is the raw HTML, highlighted when it is rendered.
+#
+# Retention goes by last use (mtime), not by which results still point at a
+# file: the crawl cache and incremental fingerprints can outlive a capture. So
+# whoever reuses a stored result touch()es its screenshots first (refreshing
+# them for the next sweep) and re-crawls when one of them is already gone.
+
+import asyncio
+import hashlib
+import io
+import os
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+from .cache import CACHE_BACKEND, CacheLevel
+
+# Optional WebP encoder (pip install pillow); JPEG is used when missing
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+SCREENSHOT_DIR = os.getenv("SCREENSHOT_DIR", "frontend/screenshots")
+SCREENSHOT_FORMAT = os.getenv("SCREENSHOT_FORMAT", "jpeg")   # "jpeg", "webp" or "png"
+SCREENSHOT_QUALITY = int(os.getenv("SCREENSHOT_QUALITY", "70"))  # jpeg/webp, 0-100
+# "1": also capture a crop around each flagged element (issues then point at their crop)
+SCREENSHOT_CROPS = os.getenv("SCREENSHOT_CROPS", "0") == "1"
+SCREENSHOT_MAX_CROPS = int(os.getenv("SCREENSHOT_MAX_CROPS", "8"))    # per page
+SCREENSHOT_MAX_BYTES = int(os.getenv("SCREENSHOT_MAX_BYTES", str(500 * 1024 * 1024)))
+SCREENSHOT_MAX_AGE = int(os.getenv("SCREENSHOT_MAX_AGE", str(30 * 24 * 3600)))  # seconds
+# "eager": capture every page while crawling; "findings" / "on_demand": see above
+SCREENSHOT_MODE = os.getenv("SCREENSHOT_MODE", "eager")
+SNAPSHOT_TTL = int(os.getenv("SNAPSHOT_TTL", str(24 * 3600)))  # seconds a deferred capture stays possible
+
+# Served by the /screenshots mount; page dicts carry "screenshots/<name>"
+URL_PREFIX = "screenshots/"
+# Served by /api/screenshots/{token}, which captures and redirects to URL_PREFIX
+DEFERRED_PREFIX = "api/screenshots/"
+
+MODES = ("eager", "findings", "on_demand")
+
+# Renders a snapshot {'url', 'html'} and returns the capture (see crawler.render_snapshot)
+SnapshotRenderer = Callable[[Dict], Awaitable[bytes]]
+
+EXTENSIONS = {"jpeg": "jpg", "webp": "webp", "png": "png"}
+
+
+class ScreenshotStore:
+    """
+    Writes captures into SCREENSHOT_DIR and keeps the directory within
+    SCREENSHOT_MAX_BYTES / SCREENSHOT_MAX_AGE (least recently used files go first).
+    """
+
+    def __init__(self, directory: str = SCREENSHOT_DIR, fmt: str = SCREENSHOT_FORMAT,
+                 quality: int = SCREENSHOT_QUALITY, max_bytes: int = SCREENSHOT_MAX_BYTES,
+                 max_age: int = SCREENSHOT_MAX_AGE, mode: str = SCREENSHOT_MODE):
+        if mode not in MODES:
+            raise ValueError(f"Unknown screenshot mode '{mode}' (expected one of: {', '.join(MODES)})")
+        if fmt not in EXTENSIONS:
+            raise ValueError(f"Unknown screenshot format '{fmt}' (expected one of: {', '.join(EXTENSIONS)})")
+        if fmt == "webp" and Image is None:
+            print("SCREENSHOT_FORMAT=webp but Pillow is not installed, using jpeg")
+            fmt = "jpeg"
+        self.directory = directory
+        self.format = fmt
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.written = 0
+        self.deduplicated = 0
+        self.evicted = 0
+        self._writes: Dict[str, asyncio.Task] = {}
+        self._written_since_sweep = 0
+        self._sweep_lock = threading.Lock()
+        self.mode = mode
+        # A shared (sqlite) level also serves the snapshots other processes deferred (worker.py)
+        self.snapshots = CacheLevel("snapshot", SNAPSHOT_TTL) if mode != "eager" or CACHE_BACKEND == "sqlite" else None
+        self._captures: Dict[str, asyncio.Task] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def capture_options(self) -> Dict:
+        """Keyword arguments for Playwright's page.screenshot()."""
+        if self.format == "jpeg":
+            return {"type": "jpeg", "quality": self.quality}
+        # WebP is encoded from a lossless PNG capture
+        return {"type": "png"}
+
+    def save(self, data: bytes) -> str:
+        """
+        Schedules the capture for writing and returns its frontend path right away.
+        Call wait() before the file must exist.
+        """
+        name = hashlib.sha256(data).hexdigest()[:32] + "." + EXTENSIONS[self.format]
+        path = os.path.join(self.directory, name)
+        if name in self._writes or os.path.exists(path):
+            self.deduplicated += 1
+            if name not in self._writes:
+                os.utime(path)  # recently used: last in line for eviction
+        else:
+            task = asyncio.create_task(asyncio.to_thread(self._write, data, path))
+            self._writes[name] = task
+            task.add_done_callback(lambda _: self._writes.pop(name, None))
+        return URL_PREFIX + name
+
+    def exists(self, path: str) -> bool:
+        """The screenshot can still be served (file on disk, or deferred capture still possible)."""
+        if is_deferred(path):
+            return self.snapshots is not None and self.snapshots.store.get(path[len(DEFERRED_PREFIX):]) is not None
+        return os.path.exists(screenshot_file(path, self.directory))
+
+    def touch(self, paths: Iterable[str]) -> bool:
+        """
+        Marks the screenshots a reused result points at as recently used (last in line
+        for eviction); False when one of them can no longer be served.
+        """
+        available = True
+        for path in filter(None, paths):
+            if is_deferred(path):
+                available = available and self.exists(path)
+            elif path[len(URL_PREFIX):] not in self._writes:
+                try:
+                    os.utime(screenshot_file(path, self.directory))
+                except OSError:
+                    available = False
+        return available
+
+    def defer(self, url: str, html: str, highlight: bool = False) -> str:
+        """
+        Keeps a page's highlighted DOM (or, with highlight=True, HTML still to be
+        highlighted) and returns the deferred path of its screenshot.
+        """
+        if self.snapshots is None:
+            # Eager store deferring an HTTP-fetched page
+            self.snapshots = CacheLevel("snapshot", SNAPSHOT_TTL)
+        token = hashlib.sha256(f"{url}\0{html}".encode("utf-8")).hexdigest()[:32]
+        self.snapshots.set(token, {"url": url, "html": html, "highlight": highlight, "screenshot": None})
+        return DEFERRED_PREFIX + token
+
+    async def resolve(self, token: str, render: SnapshotRenderer) -> Optional[str]:
+        """
+        Captures a deferred screenshot (once, however many requests ask for it) and
+        returns its "screenshots/<name>" path; None when the snapshot expired.
+        """
+        task = self._captures.get(token)
+        if task is None:
+            task = asyncio.create_task(self._resolve(token, render))
+            self._captures[token] = task
+            task.add_done_callback(lambda _: self._captures.pop(token, None))
+        return await asyncio.shield(task)
+
+    async def _resolve(self, token: str, render: SnapshotRenderer) -> Optional[str]:
+        snapshot = self.snapshots.get(token) if self.snapshots is not None else None
+        if snapshot is None:
+            return None
+        if snapshot["screenshot"] and os.path.exists(screenshot_file(snapshot["screenshot"], self.directory)):
+            return snapshot["screenshot"]
+        path = self.save(await render(snapshot))
+        await self.wait([path])
+        self.snapshots.set(token, dict(snapshot, screenshot=path))
+        return path
+
+    def prefetch(self, path: str, render: SnapshotRenderer):
+        """Starts capturing a deferred screenshot in the background."""
+        if not is_deferred(path):
+            return
+
+        async def capture():
+            try:
+                await self.resolve(path[len(DEFERRED_PREFIX):], render)
+            except Exception as e:
+                print(f"Deferred screenshot failed: {e}")
+
+        asyncio.create_task(capture())
+
+    async def wait(self, paths: Iterable[str]):
+        """Waits until the given screenshots are on disk."""
+        names = [p[len(URL_PREFIX):] for p in paths if p.startswith(URL_PREFIX)]
+        tasks = [self._writes[name] for name in names if name in self._writes]
+        for result in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(result, Exception):
+                print(f"Screenshot write failed: {result}")
+
+    def _write(self, data: bytes, path: str):
+        if self.format == "webp":
+            with Image.open(io.BytesIO(data)) as image:
+                buffer = io.BytesIO()
+                image.save(buffer, "WEBP", quality=self.quality, method=4)
+                data = buffer.getvalue()
+        # Written under a temporary name so a half-written file is never served
+        temp = path + ".tmp"
+        with open(temp, "wb") as f:
+            f.write(data)
+        os.replace(temp, path)
+        self.written += 1
+        self._written_since_sweep += len(data)
+        if self._written_since_sweep > self.max_bytes // 20:
+            self.enforce_retention()
+
+    def enforce_retention(self):
+        """Deletes screenshots older than max_age, then the oldest ones until under max_bytes."""
+        if not self._sweep_lock.acquire(blocking=False):
+            return  # another thread is already sweeping
+        try:
+            self._written_since_sweep = 0
+            now = time.time()
+            files = []
+            for entry in os.scandir(self.directory):
+                if not entry.is_file() or entry.name.endswith(".tmp"):
+                    continue
+                stat = entry.stat()
+                if now - stat.st_mtime > self.max_age:
+                    self._evict(entry.path)
+                else:
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                self._evict(path)
+                total -= size
+        finally:
+            self._sweep_lock.release()
+
+    def _evict(self, path: str):
+        try:
+            os.remove(path)
+            self.evicted += 1
+        except OSError:
+            pass
+
+    def stats(self) -> Dict:
+        files = [entry.stat().st_size for entry in os.scandir(self.directory) if entry.is_file()]
+        return {
+            "format": self.format,
+            "mode": self.mode,
+            "files": len(files),
+            "bytes": sum(files),
+            "max_bytes": self.max_bytes,
+            "written": self.written,
+            "deduplicated": self.deduplicated,
+            "evicted": self.evicted,
+            "pending_writes": len(self._writes),
+            "pending_captures": len(self._captures),
+            "snapshots": self.snapshots.stats() if self.snapshots is not None else None,
+        }
+
+
+def is_deferred(path: str) -> bool:
+    return path.startswith(DEFERRED_PREFIX)
+
+
+def screenshot_file(path: str, directory: str = SCREENSHOT_DIR) -> str:
+    """Disk location of a "screenshots/<name>" frontend path."""
+    return os.path.join(directory, path[len(URL_PREFIX):])
@@ -0,0 +1,23 @@
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that only track the visit; the page is the same without them
+TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "dclid", "yclid", "mc_cid", "mc_eid", "_ga", "_gl"}
+
+def normalize_url(url: str) -> str:
+    """
+    Canonical form used to compare/cache URLs: lowercase scheme and host,
+    default port dropped, no #fragment, sorted query without tracking parameters
+    (utm_*, gclid, ...), no trailing slash on paths.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and not ((scheme == "http" and parts.port == 80) or (scheme == "https" and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    path = parts.path or "/"
+    if len(path) > 1 and path.endswith("/"):
+        path = path.rstrip("/")
+    params = [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+              if name.lower() not in TRACKING_PARAMS and not name.lower().startswith("utm_")]
+    query = urlencode(sorted(params))
+    return urlunsplit((scheme, host, path, query, ""))
@@ -0,0 +1,225 @@
+"""
+Worker process of the multi-process deployment (JOB_BACKEND=sqlite): claims jobs
+from the shared queue (see job_queue.py) and runs them, JOB_WORKERS at a time,
+with its own browser pool, analysis processes and caches, so a Chromium crash
+or a stuck crawl only takes this process down, never the API.
+
+Usage (from the repository root; `python run_backend.py --workers N` starts N of
+these and restarts them when they exit or hang):
+    JOB_BACKEND=sqlite CACHE_BACKEND=sqlite python -m backend.worker
+"""
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+from .job_queue import JOB_POLL_INTERVAL, WORKER_HEARTBEAT, WORKER_TIMEOUT, SQLiteJobQueue, new_worker_id
+from .jobs import JOB_WORKERS, Job, JobRunner
+
+# Jobs a worker takes before exiting to be replaced by a fresh process (0 = never)
+WORKER_MAX_JOBS = int(os.getenv("WORKER_MAX_JOBS", "0"))
+# Seconds a new worker has to start up (launch Chromium...) before its first heartbeat is due
+WORKER_START_GRACE = float(os.getenv("WORKER_START_GRACE", "60"))
+# Restart delay of a worker that keeps exiting right after starting (doubles up to this, seconds)
+WORKER_MAX_BACKOFF = float(os.getenv("WORKER_MAX_BACKOFF", "60"))
+
+
+class Worker:
+    """
+    Runs queued jobs in `slots` concurrent loops; heartbeats and honours cancellations.
+    The queue is only touched through asyncio.to_thread: its writes may wait on
+    another process's lock, and this loop also drives the crawls and the heartbeat.
+    """
+
+    def __init__(self, queue: SQLiteJobQueue, runner: JobRunner, slots: int = JOB_WORKERS,
+                 max_jobs: int = WORKER_MAX_JOBS):
+        self.id = new_worker_id()
+        self.queue = queue
+        self.runner = runner
+        self.slots = slots
+        self.max_jobs = max_jobs
+        self.claimed = 0
+        self.running: Dict[str, asyncio.Task] = {}
+        # Job id -> its last event write; each write waits for the one before it
+        self._writes: Dict[str, asyncio.Task] = {}
+        self._stopping = False
+        self._loops: List[asyncio.Task] = []
+
+    async def run(self):
+        """Works until stop() is called (or max_jobs were taken)."""
+        await asyncio.to_thread(self.queue.register, self.id, self.slots)
+        print(f"Worker {self.id} started ({self.slots} slots)")
+        monitor = asyncio.create_task(self._monitor())
+        self._loops = [asyncio.create_task(self._loop()) for _ in range(self.slots)]
+        try:
+            await asyncio.gather(*self._loops, return_exceptions=True)
+        finally:
+            monitor.cancel()
+            await asyncio.gather(monitor, return_exceptions=True)
+            await asyncio.to_thread(self.queue.unregister, self.id)
+            print(f"Worker {self.id} stopped after {self.claimed} job(s)")
+
+    def stop(self):
+        """Stops taking jobs; running ones go back to the queue for another worker."""
+        self._stopping = True
+        for loop in self._loops:
+            loop.cancel()
+
+    async def _loop(self):
+        while not self._stopping:
+            if self.max_jobs and self.claimed >= self.max_jobs:
+                return
+            job = await asyncio.to_thread(self.queue.claim, self.id)
+            if job is None:
+                await asyncio.sleep(JOB_POLL_INTERVAL)
+                continue
+            self.claimed += 1
+            await self._run(job)
+
+    async def _run(self, job: Job):
+        task = asyncio.create_task(self.runner(job, lambda event: self._emit(job.id, event)))
+        self.running[job.id] = task
+        try:
+            result = await task
+            await self._finish(job.id, "done", result=result)
+        except asyncio.CancelledError:
+            if self._stopping or not task.cancelled():
+                await self._flush(job.id)
+                await asyncio.to_thread(self.queue.release, self.id, job.id)
+                raise  # the worker itself is being stopped
+            await self._finish(job.id, "cancelled")
+        except Exception as e:
+            print(f"Job {job.id} failed: {type(e).__name__}: {e}")
+            await self._finish(job.id, "failed", error=f"{type(e).__name__}: {str(e)}")
+        finally:
+            self.running.pop(job.id, None)
+            self._writes.pop(job.id, None)
+
+    def _emit(self, job_id: str, event: Dict):
+        # Called synchronously by the runner: the write is queued behind the job's previous one
+        self._writes[job_id] = asyncio.create_task(self._write_event(self._writes.get(job_id), job_id, event))
+
+    async def _write_event(self, previous: Optional[asyncio.Task], job_id: str, event: Dict):
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        await asyncio.to_thread(self.queue.emit, job_id, event)
+
+    async def _flush(self, job_id: str):
+        # Progress events are written before the outcome that ends the stream
+        pending = self._writes.get(job_id)
+        if pending is not None:
+            await asyncio.gather(pending, return_exceptions=True)
+
+    async def _finish(self, job_id: str, status: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        await self._flush(job_id)
+        await asyncio.to_thread(self.queue.finish, self.id, job_id, status, result, error)
+
+    async def _monitor(self):
+        while True:
+            cancelled = await asyncio.to_thread(self.queue.heartbeat, self.id, self.slots, list(self.running))
+            for job_id in cancelled:
+                task = self.running.get(job_id)
+                if task is not None and not task.done():
+                    task.cancel()
+            await asyncio.sleep(WORKER_HEARTBEAT)
+
+
+async def serve():
+    # The API module owns the analysis pipeline and the resources it runs on
+    from .main import app, run_analysis_job, services
+
+    async with services(app):
+        worker = Worker(SQLiteJobQueue(), run_analysis_job)
+        if sys.platform != 'win32':
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                loop.add_signal_handler(sig, worker.stop)
+        await worker.run()
+
+
+class Supervisor:
+    """
+    Keeps `count` worker processes running next to the API: a worker that exits is
+    started again (after a growing delay if it keeps dying at start-up), and one
+    whose heartbeat stopped for WORKER_TIMEOUT is killed and replaced.
+    """
+
+    def __init__(self, count: int, queue: Optional[SQLiteJobQueue] = None):
+        self.count = count
+        self.queue = queue or SQLiteJobQueue()
+        self.restarts = 0
+        self._slots: List[Dict] = [{"process": None, "backoff": 0.0, "due": 0.0} for _ in range(count)]
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        for slot in self._slots:
+            self._spawn(slot)
+        self._thread = threading.Thread(target=self._watch, name="worker-supervisor", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30):
+        """Asks every worker to stop (their running jobs go back to the queue) and waits for them."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        processes = [slot["process"] for slot in self._slots if slot["process"] is not None]
+        for process in processes:
+            process.terminate()
+        deadline = time.time() + timeout
+        for process in processes:
+            try:
+                process.wait(max(0.1, deadline - time.time()))
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+    def _spawn(self, slot: Dict):
+        slot["process"] = subprocess.Popen([sys.executable, "-m", "backend.worker"])
+        slot["started"] = time.time()
+        # Chromium launch etc. come before the first heartbeat
+        slot["seen"] = slot["started"] + WORKER_START_GRACE
+        slot["healthy"] = False
+        print(f"Supervisor: started worker process {slot['process'].pid}")
+
+    def _watch(self):
+        while not self._stop.wait(WORKER_HEARTBEAT):
+            now = time.time()
+            alive = {worker["pid"] for worker in self.queue.workers() if worker["alive"]}
+            for slot in self._slots:
+                process = slot["process"]
+                if process is None:
+                    if now >= slot["due"]:
+                        self.restarts += 1
+                        self._spawn(slot)
+                    continue
+                if process.pid in alive:
+                    slot["seen"] = now
+                    slot["healthy"] = True
+                if process.poll() is None and now - slot["seen"] > WORKER_TIMEOUT:
+                    print(f"Supervisor: worker process {process.pid} stopped heartbeating, killing it")
+                    process.kill()
+                    process.wait()
+                if process.poll() is not None:
+                    # Exited before its first heartbeat: probably fails at start-up, so back off
+                    if slot["healthy"]:
+                        slot["backoff"] = 0.0
+                    else:
+                        slot["backoff"] = min(WORKER_MAX_BACKOFF, max(1.0, slot["backoff"] * 2))
+                    print(f"Supervisor: worker process {process.pid} exited ({process.returncode}),"
+                          f" restarting in {slot['backoff']:.0f} s")
+                    slot["process"] = None
+                    slot["due"] = now + slot["backoff"]
+
+
+def main():
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+    asyncio.run(serve())
+
+if __name__ == "__main__":
+    main()
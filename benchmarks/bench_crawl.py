@@ -0,0 +1,124 @@
+"""
+End-to-end benchmark: crawl + analysis of every corpus site through the real
+browser pool, against the local corpus server (no live sites involved).
+Reports sites/pages per second, site latency percentiles, per-stage page
+timings (goto, settle, extract, screenshot, rules...) and peak memory.
+
+Usage (from the repository root; needs `playwright install chromium`):
+    python -m benchmarks.bench_crawl [--rounds 3] [--latency 50] [--incremental] [--fetch tiered] [-o results.json]
+"""
+import argparse
+import asyncio
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from backend.browser_pool import BrowserPool
+from backend.compliance import ANALYSIS_WORKERS, analyze_stream, create_analysis_executor
+from backend.crawler import iter_site
+from backend.fingerprints import FingerprintStore
+from backend.http_fetch import FETCH_MODES
+from backend.screenshots import MODES, ScreenshotStore
+from benchmarks.corpus_server import serve_corpus
+from benchmarks.harness import latency_stats, peak_rss_mb, write_results
+
+
+async def run(args) -> str:
+    site_samples: List[float] = []
+    stage_samples: Dict[str, List[float]] = defaultdict(list)
+    outcomes: Dict[str, Dict] = {}
+    pages_total = 0
+
+    screenshot_dir = tempfile.mkdtemp(prefix="bdp-bench-")
+    pool = BrowserPool()
+    await pool.start()
+    executor = create_analysis_executor(args.workers)
+    screenshots = ScreenshotStore(directory=screenshot_dir, mode=args.screenshots)
+    fingerprints = FingerprintStore(backend="memory") if args.incremental else None
+    try:
+        with serve_corpus(latency_ms=args.latency) as sites:
+            # Warm-up rounds (browser caches, analysis workers) are not measured
+            for round_number in range(args.warmup + args.rounds):
+                measured = round_number >= args.warmup
+                start = time.perf_counter()
+                for site, url in sites.items():
+                    site_start = time.perf_counter()
+                    pages = []
+
+                    async def collect(page, issues):
+                        pages.append(page)
+
+                    site_timings: Dict = {}
+                    result = await analyze_stream(
+                        iter_site(url, max_pages=args.max_pages, pool=pool, screenshots=screenshots,
+                                  fingerprints=fingerprints, timings=site_timings, fetch=args.fetch),
+                        executor=executor, fingerprints=fingerprints, on_page=collect, timings=site_timings)
+                    if not measured:
+                        continue
+                    site_samples.append(time.perf_counter() - site_start)
+                    pages_total += len(pages)
+                    for stage, ms in site_timings.items():
+                        stage_samples[stage].append(ms / 1000)
+                    for page in pages:
+                        for stage, ms in page.get("timings", {}).items():
+                            stage_samples[stage].append(ms / 1000)
+                    # Kept so a speed-up that changes the findings shows up in the diff
+                    outcomes[site] = {"score": result["score"], "status": result["status"],
+                                      "pages": result["scanned_pages"], "reused": len(result["reused_pages"]),
+                                      "issues": len(result["issues"])}
+                if measured:
+                    print(f"Round {round_number - args.warmup + 1}: {time.perf_counter() - start:.2f} s")
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        await pool.stop()
+        shutil.rmtree(screenshot_dir, ignore_errors=True)
+
+    elapsed = sum(site_samples)
+    metrics = {
+        "sites_per_s": round(len(site_samples) / elapsed, 3) if elapsed else None,
+        "pages_per_s": round(pages_total / elapsed, 3) if elapsed else None,
+        **latency_stats(site_samples, "site"),
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_children_mb": peak_rss_mb(children=True),
+    }
+    details = {}
+    for stage, samples in sorted(stage_samples.items()):
+        stats = latency_stats(samples, f"stage.{stage}")
+        details.update(stats)
+        if not stage.startswith(("rule:", "artifact:")):
+            metrics[f"stage.{stage}_p50_ms"] = stats[f"stage.{stage}_p50_ms"]
+            metrics[f"stage.{stage}_p95_ms"] = stats[f"stage.{stage}_p95_ms"]
+    details["sites"] = outcomes
+
+    for site, outcome in outcomes.items():
+        print(f"  {site:<20} {outcome['score']:>3} {outcome['status']} ({outcome['pages']} pages)")
+    print(f"{metrics['sites_per_s']} sites/s, {metrics['pages_per_s']} pages/s, "
+          f"site p50 {metrics['site_p50_ms']} ms, p95 {metrics['site_p95_ms']} ms")
+    config = {key: value for key, value in vars(args).items() if key != "output"}
+    return write_results("crawl", config, metrics, details, args.output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl + analysis benchmark over the offline corpus.")
+    parser.add_argument("--rounds", type=int, default=3, help="measured passes over every corpus site")
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured passes first")
+    parser.add_argument("--max-pages", type=int, default=3, help="pages crawled per site")
+    parser.add_argument("--latency", type=int, default=0, help="delay the corpus server adds per response (ms)")
+    parser.add_argument("--workers", type=int, default=ANALYSIS_WORKERS, help="analysis processes (0 = thread)")
+    parser.add_argument("--screenshots", choices=MODES, default="eager", help="screenshot mode")
+    parser.add_argument("--fetch", choices=FETCH_MODES, default="browser",
+                        help="tiered: plain HTTP first, browser only for pages that need it")
+    parser.add_argument("--incremental", action="store_true", help="re-scans reuse unchanged pages (fingerprints)")
+    parser.add_argument("-o", "--output", help="result file (default: benchmarks/results/crawl-<commit>.json)")
+    args = parser.parse_args()
+
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+    print(f"Results: {asyncio.run(run(args))}")
+
+if __name__ == "__main__":
+    main()
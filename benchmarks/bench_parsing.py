@@ -0,0 +1,81 @@
+"""
+HTML parsing benchmark: legacy BeautifulSoup lookups vs. the DomTextIndex.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_parsing
+"""
+import random
+import re
+import time
+
+from bs4 import BeautifulSoup
+
+from backend.dom_index import DomTextIndex, available_parser
+from backend.matcher import FORBIDDEN_PATTERN, PERCENT_PATTERN
+from backend.normalized_text import NormalizedText
+from backend.rules import FORBIDDEN_TERMS
+
+WORDS = ["crédito", "financiamento", "taxa", "simulação", "cliente", "prazo", "montante",
+         "banco", "portugal", "contrato", "pessoal", "habitação", "consolidado", "proposta"]
+
+def make_page(sections: int, seed: int = 42) -> str:
+    """Synthetic credit site: nested blocks, simulator tables full of rates, a few forbidden terms."""
+    rng = random.Random(seed)
+    terms = list(FORBIDDEN_TERMS)
+    parts = ["<html><head><style>.x{color:red}</style><script>var a = '5%';</script></head><body>"]
+    for i in range(sections):
+        parts.append(f"<section class='block b{i % 7}'><div class='inner'><h2>Secção {i}</h2>")
+        for _ in range(5):
+            sentence = " ".join(rng.choice(WORDS) for _ in range(12))
+            if rng.random() < 0.02:
+                sentence += " " + rng.choice(terms)
+            parts.append(f"<p class='txt'>{sentence}. <span>{rng.randint(1, 99)},{rng.randint(0, 9)}%</span></p>")
+        parts.append("<table class='sim'>")
+        for _ in range(10):
+            parts.append(f"<tr><td>{rng.randint(1000, 50000)} €</td><td>{rng.randint(1, 20)},{rng.randint(0, 99)} %</td></tr>")
+        parts.append("</table></div></section>")
+    parts.append("<footer class='site'>Intermediário de crédito registado no Banco de Portugal</footer></body></html>")
+    return "".join(parts)
+
+def legacy_lookups(html: str):
+    """What compliance.py did before the index: one find_all per term plus one for rates."""
+    soup = BeautifulSoup(html, 'html.parser')
+    for script in soup(["script", "style"]):
+        script.extract()
+    found = 0
+    for term in FORBIDDEN_TERMS:
+        found += bool(soup.find_all(string=re.compile(re.escape(term), re.IGNORECASE)))
+    rates = soup.find_all(string=re.compile(r'\d+([.,]\d+)?\s*%'))
+    return found, len(rates)
+
+def index_lookups(html: str, parser: str):
+    index = DomTextIndex.from_html(html, parser)
+    found = len(index.first_matches(FORBIDDEN_PATTERN, NormalizedText(index.text)))
+    # Nodes holding a rate
+    rates = {index.position(match.start())[0] for match in PERCENT_PATTERN.finditer(index.text)}
+    return found, len(rates)
+
+def best_of(func, *args, repeat: int = 3):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    candidates = [("legacy (html.parser + find_all)", legacy_lookups, ())]
+    candidates.append(("index (html.parser)", index_lookups, ("html.parser",)))
+    if available_parser("lxml") == "lxml":
+        candidates.append(("index (lxml)", index_lookups, ("lxml",)))
+
+    for sections in (50, 400, 1500):
+        html = make_page(sections)
+        print(f"\nPage with {sections} sections ({len(html) / 1024 / 1024:.2f} MB)")
+        for name, func, extra in candidates:
+            elapsed, (terms, rates) = best_of(func, html, *extra)
+            print(f"  {name:<34} {elapsed * 1000:9.1f} ms   terms={terms} rate nodes={rates}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Rule micro-benchmarks: time per rule and per artifact (HTML parse, DOM index...)
+over small (corpus), large and pathological pages, plus analyze_compliance
+throughput in-process and with the worker process pool.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_rules [--repeat 20] [-o results.json]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+from backend.compliance import ANALYSIS_WORKERS, analyze_compliance
+from backend.dom_index import DomTextIndex
+from backend.rule_engine import run_rules
+from benchmarks.bench_parsing import make_page
+from benchmarks.corpus_server import CORPUS_DIR, corpus_sites
+from benchmarks.harness import latency_stats, peak_rss_mb, write_results
+
+
+def page_from_html(url: str, html: str, extract: str = "html") -> Dict:
+    """Page dict as the crawler builds it; extract="browser" carries located nodes instead of HTML."""
+    nodes = DomTextIndex.from_html(html).nodes
+    page = {"url": url, "text": "\n".join(node.text for node in nodes), "screenshot": ""}
+    if extract == "browser":
+        page["nodes"] = [{"text": n.text, "tag": n.tag, "classes": list(n.classes), "path": n.path} for n in nodes]
+    else:
+        page["html"] = html
+    return page
+
+
+def corpus_pages(directory: str = CORPUS_DIR) -> List[Dict]:
+    pages = []
+    for site in corpus_sites(directory):
+        for name in sorted(os.listdir(os.path.join(directory, site))):
+            if name.endswith(".html"):
+                with open(os.path.join(directory, site, name), encoding="utf-8") as f:
+                    pages.append(page_from_html(f"http://{site}.local/{name[:-5]}", f.read()))
+    return pages
+
+
+def pathological_pages() -> Dict[str, Dict]:
+    """Pages that stress one thing each: nesting depth, rate count, one huge text node."""
+    # Enough text to get past the "Erro de Leitura" rule, which stops the others
+    filler = "crédito financiamento intermediário de crédito " * 10
+    deep = ("<html><body>" + "<div class='n'>" * 1000 + f"<p>{filler} crédito fácil 5%</p>"
+            + "</div>" * 1000 + "</body></html>")
+    # Every "%" sits in an ignored context, so the TAEG rule has to look at all of them
+    rates = "<html><body><p>crédito financiamento</p>" + "".join(
+        f"<span class='r'>{i % 100}% Online</span>" for i in range(20000)) + "</body></html>"
+    one_node = "<html><body><p>" + "crédito financiamento " * 100000 + "sem burocracia 5%</p></body></html>"
+    return {
+        "deep_nesting": page_from_html("http://deep.local/", deep),
+        "many_rates": page_from_html("http://rates.local/", rates),
+        "huge_text_node": page_from_html("http://huge.local/", one_node),
+    }
+
+
+def bench_rules(pages: Dict[str, Dict], repeat: int):
+    """Per-rule/artifact latency stats per page kind, from run_rules' own timings."""
+    metrics, details = {}, {}
+    for kind, page_list in pages.items():
+        samples = defaultdict(list)
+        for _ in range(repeat):
+            for page in page_list:
+                timings: Dict[str, float] = {}
+                start = time.perf_counter()
+                run_rules(page, timings=timings)
+                samples["total"].append(time.perf_counter() - start)
+                for stage, ms in timings.items():
+                    samples[stage].append(ms / 1000)
+        for stage, values in samples.items():
+            stats = latency_stats(values, f"{kind}.{stage}")
+            details.update(stats)
+            if stage == "total" or stage.startswith("rule:"):
+                metrics[f"{kind}.{stage}_p50_ms"] = stats[f"{kind}.{stage}_p50_ms"]
+                metrics[f"{kind}.{stage}_p95_ms"] = stats[f"{kind}.{stage}_p95_ms"]
+        print(f"{kind:<16} {len(page_list)} page(s): total p50 {metrics[f'{kind}.total_p50_ms']:.2f} ms")
+    return metrics, details
+
+
+def _silence():
+    sys.stdout = open(os.devnull, "w")
+
+
+def bench_throughput(pages: List[Dict], repeat: int, workers: int) -> Dict[str, float]:
+    """analyze_compliance pages/s in a thread (no executor) and over a process pool."""
+    metrics = {}
+    batch = [dict(page) for page in pages] * repeat
+    runs = [("thread", None)]
+    if workers > 0:
+        runs.append(("process_pool", ProcessPoolExecutor(max_workers=workers, initializer=_silence)))
+    for name, executor in runs:
+        try:
+            if executor is not None:
+                # Start the workers before timing
+                list(executor.map(abs, range(workers)))
+            start = time.perf_counter()
+            # analyze_page prints one line per page
+            with contextlib.redirect_stdout(io.StringIO()):
+                asyncio.run(analyze_compliance(batch, executor=executor))
+            elapsed = time.perf_counter() - start
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        metrics[f"analyze_compliance.{name}_pages_per_s"] = round(len(batch) / elapsed, 1)
+        print(f"analyze_compliance ({name}): {len(batch) / elapsed:.1f} pages/s")
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-rule micro-benchmarks over the offline corpus.")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per page")
+    parser.add_argument("--workers", type=int, default=ANALYSIS_WORKERS, help="process pool size (0 = skip)")
+    parser.add_argument("-o", "--output", help="result file (default: benchmarks/results/rules-<commit>.json)")
+    args = parser.parse_args()
+
+    small = corpus_pages()
+    large_html = make_page(400)
+    pages = {
+        "small": small,
+        "large": [page_from_html("http://large.local/", large_html)],
+        "large_nodes": [page_from_html("http://large.local/", large_html, extract="browser")],
+    }
+    pages.update({kind: [page] for kind, page in pathological_pages().items()})
+
+    metrics, details = bench_rules(pages, args.repeat)
+    metrics.update(bench_throughput(small, args.repeat, args.workers))
+    metrics["peak_rss_mb"] = peak_rss_mb()
+
+    path = write_results("rules", {"repeat": args.repeat, "workers": args.workers,
+                                   "pages": {kind: len(p) for kind, p in pages.items()}},
+                         metrics, details, args.output)
+    print(f"Results: {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Compares two benchmark result files (see harness.py) metric by metric and flags
+regressions beyond a tolerance. Exits with 1 when something regressed.
+
+Usage (from the repository root):
+    python -m benchmarks.compare benchmarks/results/rules-abc123.json benchmarks/results/rules-def456.json
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List, Optional, Tuple
+
+
+def higher_is_better(metric: str) -> bool:
+    return metric.endswith("_per_s")
+
+
+def compare(before: Dict, after: Dict, tolerance: float,
+            min_delta_ms: float = 0.0) -> List[Tuple[str, Optional[float], Optional[float], Optional[float], bool]]:
+    """
+    (metric, before, after, relative change, regressed) for every metric in either file.
+    Latencies ("_ms") that moved by less than min_delta_ms never count as regressions
+    (sub-millisecond rules are mostly timer noise).
+    """
+    rows = []
+    for metric in sorted(set(before) | set(after)):
+        old, new = before.get(metric), after.get(metric)
+        if not old or new is None:
+            rows.append((metric, old, new, None, False))
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better(metric) else change
+        noise = metric.endswith("_ms") and abs(new - old) < min_delta_ms
+        rows.append((metric, old, new, change, worse > tolerance and not noise))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff two benchmark result files.")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="relative change allowed (default 10%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5,
+                        help="latency changes below this are noise (default 0.5 ms)")
+    parser.add_argument("--all", action="store_true", help="also list unchanged metrics")
+    args = parser.parse_args()
+
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+    if before["benchmark"] != after["benchmark"]:
+        sys.exit(f"Different benchmarks: {before['benchmark']} vs {after['benchmark']}")
+    if before["config"] != after["config"]:
+        print(f"Warning: configurations differ\n  {before['config']}\n  {after['config']}")
+    print(f"{before['benchmark']}: {before['commit']}{' (dirty)' if before['dirty'] else ''}"
+          f" -> {after['commit']}{' (dirty)' if after['dirty'] else ''}")
+
+    regressions = 0
+    for metric, old, new, change, regressed in compare(before["metrics"], after["metrics"], args.tolerance,
+                                                                    args.min_delta_ms):
+        if change is None:
+            if old != new:
+                print(f"  {metric:<60} {old!s:>12} -> {new!s:>12}")
+            continue
+        if not args.all and not regressed and abs(change) <= args.tolerance:
+            continue
+        regressions += regressed
+        marker = "REGRESSION" if regressed else ("better" if change and (change < 0) != higher_is_better(metric)
+                                                 and abs(change) > args.tolerance else "")
+        print(f"  {metric:<60} {old:>12} -> {new:>12} {change:+7.1%} {marker}")
+    print(f"{regressions} regression(s) beyond {args.tolerance:.0%}")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
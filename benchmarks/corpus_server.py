@@ -0,0 +1,80 @@
+"""
+Local HTTP stand-in for the sites in benchmarks/corpus: each site directory is
+served as the root of its own 127.0.0.1 port, so the crawler (frontier, robots.txt,
+sitemap, conditional requests) behaves as it does against a real site.
+
+Usage (from the repository root):
+    python -m benchmarks.corpus_server [--latency 50]
+"""
+import argparse
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+
+def corpus_sites(directory: str = CORPUS_DIR) -> List[str]:
+    return sorted(entry.name for entry in os.scandir(directory) if entry.is_dir())
+
+
+class CorpusHandler(SimpleHTTPRequestHandler):
+    """Static files with extensionless page URLs ("/menu" -> menu.html) and optional latency."""
+
+    latency_ms = 0
+
+    def translate_path(self, path: str) -> str:
+        translated = super().translate_path(path)
+        if not os.path.splitext(translated)[1] and not os.path.isdir(translated):
+            translated = translated.rstrip("/\\") + ".html"
+        return translated
+
+    def send_head(self):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return super().send_head()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def serve_corpus(directory: str = CORPUS_DIR, latency_ms: int = 0) -> Iterator[Dict[str, str]]:
+    """Serves every site of the corpus for the duration of the block; yields {site: base URL}."""
+    servers = {}
+    try:
+        for site in corpus_sites(directory):
+            handler = functools.partial(type("Handler", (CorpusHandler,), {"latency_ms": latency_ms}),
+                                        directory=os.path.join(directory, site))
+            server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            servers[site] = server
+        yield {site: f"http://127.0.0.1:{server.server_address[1]}/" for site, server in servers.items()}
+    finally:
+        for server in servers.values():
+            server.shutdown()
+            server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the benchmark corpus on local ports.")
+    parser.add_argument("--corpus", default=CORPUS_DIR, help="directory with one subdirectory per site")
+    parser.add_argument("--latency", type=int, default=0, help="delay added to every response (ms)")
+    args = parser.parse_args()
+
+    with serve_corpus(args.corpus, args.latency) as sites:
+        for site, url in sites.items():
+            print(f"{site:<20} {url}")
+        print("Ctrl+C to stop")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main()
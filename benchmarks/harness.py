@@ -0,0 +1,102 @@
+"""
+Shared helpers for the benchmarks: timing statistics, peak memory and the JSON
+result files that benchmarks/compare.py diffs between commits.
+
+Result file layout:
+    {"benchmark": name, "commit": ..., "dirty": bool, "created_at": ..., "python": ...,
+     "platform": ..., "config": {...}, "metrics": {metric name: number}, "details": {...}}
+Only "metrics" is compared; names ending in "_per_s" are better when higher,
+everything else (latencies, memory) when lower.
+"""
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+# Not available on Windows: peak RSS is then reported as null
+try:
+    import resource
+except ImportError:
+    resource = None
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+
+def percentile(samples: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile (p in 0-100) of the samples, or None when empty."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, min(len(ordered), math.ceil(p / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def latency_stats(samples_s: List[float], prefix: str) -> Dict[str, float]:
+    """p50/p95/p99/max of durations in seconds, as "<prefix>_p50_ms"... metrics."""
+    stats = {}
+    for name, p in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100)):
+        value = percentile(samples_s, p)
+        stats[f"{prefix}_{name}_ms"] = round(value * 1000, 3) if value is not None else None
+    return stats
+
+
+def measure(func: Callable, repeat: int, warmup: int = 1) -> List[float]:
+    """Durations (s) of `repeat` calls of func(), after `warmup` untimed ones."""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def peak_rss_mb(children: bool = False) -> Optional[float]:
+    """
+    Peak resident memory of this process (or of its largest finished child, e.g. a
+    Chromium that was closed) in MB; None where the platform does not report it.
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in bytes on macOS and in KB elsewhere
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(usage.ru_maxrss / divisor, 1)
+
+
+def _git(*args: str) -> str:
+    try:
+        return subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True, text=True,
+                              timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def write_results(name: str, config: Dict, metrics: Dict, details: Optional[Dict] = None,
+                  output: Optional[str] = None) -> str:
+    """Writes a result file (default: benchmarks/results/<name>-<commit>.json) and returns its path."""
+    commit = _git("rev-parse", "--short", "HEAD") or "unknown"
+    record = {
+        "benchmark": name,
+        "commit": commit,
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "metrics": metrics,
+        "details": details or {},
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{name}-{commit}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False, indent=2)
+    return output
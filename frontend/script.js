@@ -1,4 +1,8 @@
-const API_URL = "http://localhost:8081/api/analyze";
+const API_BASE = "http://localhost:8081";
+const API_URL = `${API_BASE}/api/analyze`;
+const JOBS_URL = `${API_BASE}/api/jobs`;
+// Findings fetched per request of the (compact, paged) result
+const RESULT_PAGE_SIZE = 100;
 
 async function analyzeSite() {
     const urlInput = document.getElementById('urlInput');
@@ -28,21 +32,18 @@ async function analyzeSite() {
     loader.classList.remove('hidden');
 
     try {
-        const response = await fetch(API_URL, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({ url: url })
-        });
+        // Submit the job; the analysis runs in the background
+        const incremental = document.getElementById('incrementalInput').checked;
+        const response = await submitJob(url, incremental, btnText);
 
         if (!response.ok) {
             const errorText = await response.text();
             throw new Error(`Falha na análise (Status: ${response.status}). Detalhes: ${errorText}`);
         }
 
-        const data = await response.json();
-        displayResults(data);
+        const job = await response.json();
+        const data = await followJob(job.id, btnText);
+        displayResults(data, job.id);
 
     } catch (error) {
         alert("Erro ao analisar o site: " + error.message);
@@ -53,7 +54,111 @@ async function analyzeSite() {
     }
 }
 
-function displayResults(data) {
+// Submits the analysis; while the server's queue is full (429) waits as long as
+// its Retry-After says and tries again.
+async function submitJob(url, incremental, btnText) {
+    while (true) {
+        const response = await fetch(JOBS_URL, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            // Incremental (opt-in): the live site is re-checked and pages unchanged since
+            // the last check reuse its results. Off, a site scanned moments ago is
+            // served from the crawl cache without crawling it again.
+            body: JSON.stringify({ url: url, incremental: incremental })
+        });
+        if (response.status !== 429) {
+            return response;
+        }
+        const wait = parseInt(response.headers.get('Retry-After'), 10) || 5;
+        btnText.textContent = `Servidor ocupado, nova tentativa em ${wait} s...`;
+        await new Promise(done => setTimeout(done, wait * 1000));
+    }
+}
+
+// One page of the job's result in the compact format: a page table, the findings
+// pointing at it by index and success counters per rule.
+async function fetchResult(jobId, offset) {
+    const response = await fetch(`${JOBS_URL}/${jobId}/result?format=compact&offset=${offset}&limit=${RESULT_PAGE_SIZE}`);
+    if (!response.ok) {
+        throw new Error(`Resultado indisponível (Status: ${response.status}).`);
+    }
+    return response.json();
+}
+
+// Streams the job's progress (SSE) and shows partial issues as each page finishes.
+// Resolves with the first page of the final (deduplicated) result.
+function followJob(jobId, btnText) {
+    return new Promise((resolve, reject) => {
+        const source = new EventSource(`${JOBS_URL}/${jobId}/events`);
+        let pagesDone = 0;
+
+        source.addEventListener('page', () => {
+            pagesDone += 1;
+            btnText.textContent = `A analisar... (${pagesDone} ${pagesDone === 1 ? 'página' : 'páginas'})`;
+        });
+
+        // The worker running it was lost: another one starts over
+        source.addEventListener('requeued', () => {
+            pagesDone = 0;
+            document.getElementById('issuesList').innerHTML = '';
+            btnText.textContent = "A analisar... (reiniciada)";
+        });
+
+        source.addEventListener('page_issues', (event) => {
+            const payload = JSON.parse(event.data);
+            showPartialIssues(payload.issues, pagesDone);
+        });
+
+        source.addEventListener('done', async () => {
+            source.close();
+            try {
+                resolve(await fetchResult(jobId, 0));
+            } catch (error) {
+                reject(error);
+            }
+        });
+
+        source.addEventListener('failed', (event) => {
+            source.close();
+            reject(new Error(JSON.parse(event.data).error || 'Falha na análise.'));
+        });
+
+        source.addEventListener('cancelled', () => {
+            source.close();
+            reject(new Error('Análise cancelada.'));
+        });
+
+        source.onerror = () => {
+            // EventSource reconnects on its own (resuming from Last-Event-ID);
+            // only give up if the server closed the stream for good.
+            if (source.readyState === EventSource.CLOSED) {
+                reject(new Error('Ligação ao servidor perdida.'));
+            }
+        };
+    });
+}
+
+function showPartialIssues(issues, pagesDone) {
+    const resultsSection = document.getElementById('resultsSection');
+    const statusText = document.getElementById('statusText');
+    const pagesScanned = document.getElementById('pagesScanned');
+    const issuesList = document.getElementById('issuesList');
+
+    resultsSection.classList.remove('hidden');
+    statusText.textContent = "A analisar...";
+    pagesScanned.textContent = `Páginas analisadas: ${pagesDone}`;
+    issues.forEach(issue => issuesList.appendChild(createIssueElement(issue)));
+}
+
+// A compact finding with its page's url and screenshot back in place
+function expandIssue(issue, pages) {
+    const page = pages[issue.page];
+    return { ...issue, url: page.url, screenshot: issue.screenshot ?? page.screenshot };
+}
+
+function displayResults(data, jobId) {
     const resultsSection = document.getElementById('resultsSection');
     const scoreValue = document.getElementById('scoreValue');
     const statusText = document.getElementById('statusText');
@@ -73,68 +178,116 @@ function displayResults(data) {
 
     statusText.textContent = data.status;
     pagesScanned.textContent = `Páginas analisadas: ${data.scanned_pages}`;
+    const reused = data.pages.filter(page => page.reused).length;
+    if (reused > 0) {
+        pagesScanned.textContent += ` (${reused} sem alterações desde a última verificação)`;
+    }
 
     // Update Issues
-    if (data.issues.length === 0) {
+    issuesList.innerHTML = '';
+    if (data.total_issues === 0) {
         issuesList.innerHTML = `<div class="issue-item low"><div class="issue-header"><span class="issue-title">Sem inconformidades detetadas</span></div><p>Parabéns! O site parece cumprir as normas verificadas.</p></div>`;
-    } else {
-        data.issues.forEach(issue => {
-            const div = document.createElement('div');
-            // Assuming localhost:8081 for images - dynamic in prod
-            const imageUrl = `http://localhost:8081/${issue.screenshot}`;
-
-            div.className = `issue-item ${issue.severity}`;
-
-            const isSuccess = issue.severity === 'success';
-            const icon = isSuccess ? '<i class="fa-solid fa-check-circle"></i>' : '<i class="fa-solid fa-triangle-exclamation"></i>';
-            const badgeClass = isSuccess ? 'issue-badge success' : 'issue-badge';
-            const suggestionTitle = isSuccess ? 'Estado:' : 'Como Corrigir:';
-            const suggestionIcon = isSuccess ? '<i class="fa-solid fa-thumbs-up"></i>' : '<i class="fa-solid fa-lightbulb"></i>';
-
-            div.innerHTML = `
-                <div class="issue-header">
-                    <span class="issue-title">${icon} ${issue.rule}</span>
-                    <span class="${badgeClass}">${issue.severity.toUpperCase()}</span>
-                </div>
-                
-                <div class="issue-content">
-                    <div class="issue-details">
-                        <p class="description"><strong>${isSuccess ? 'Info' : 'Erro'}:</strong> ${issue.description}</p>
-                        
-                        ${issue.context ? `
-                        <div class="context-box">
-                            <strong>${isSuccess ? 'Contexto Verificado' : 'Contexto Encontrado'}:</strong>
-                            <blockquote>"${issue.context}"</blockquote>
-                        </div>` : ''}
-
-                        ${issue.location_guide ? `
-                        <div class="location-box" style="margin-top: 10px; padding: 10px; background: #eef2f5; border-left: 4px solid #2c3e50; border-radius: 4px;">
-                            <i class="fa-solid fa-code-branch"></i>
-                            <strong>Guia de Localização (Técnico):</strong>
-                            <code style="display: block; margin-top: 5px; color: ${isSuccess ? 'green' : '#d63384'};">${issue.location_guide}</code>
-                        </div>` : ''}
-                        
-                        <div class="suggestion-box" style="${isSuccess ? 'background-color: #d1e7dd; border-color: #badbcc;' : ''}">
-                            ${suggestionIcon}
-                            <strong>${suggestionTitle}</strong>
-                            <p>${issue.suggestion}</p>
-                        </div>
-
-                        <a href="${issue.url}" target="_blank" class="link-btn">
-                            <i class="fa-solid fa-external-link-alt"></i> Ver na Página
-                        </a>
-                    </div>
-                    
-                    <div class="issue-image">
-                        <img src="${imageUrl}" alt="Screenshot da falha" onclick="window.open('${imageUrl}', '_blank')">
-                        <small>Clique para ampliar</small>
-                    </div>
-                </div>
-            `;
-            issuesList.appendChild(div);
-        });
     }
+    data.issues.forEach(issue => issuesList.appendChild(createIssueElement(expandIssue(issue, data.pages))));
+
+    // The rest of a long list of findings is fetched on demand
+    let loaded = data.issues.length;
+    if (loaded < data.total_issues) {
+        const more = document.createElement('button');
+        more.className = 'btn-outline';
+        more.textContent = `Mostrar mais (${data.total_issues - loaded})`;
+        more.onclick = async () => {
+            more.disabled = true;
+            try {
+                const next = await fetchResult(jobId, loaded);
+                next.issues.forEach(issue => issuesList.insertBefore(createIssueElement(expandIssue(issue, next.pages)), more));
+                loaded += next.issues.length;
+                if (loaded >= next.total_issues || next.issues.length === 0) {
+                    more.remove();
+                } else {
+                    more.textContent = `Mostrar mais (${next.total_issues - loaded})`;
+                }
+            } catch (error) {
+                alert("Erro ao carregar resultados: " + error.message);
+            } finally {
+                more.disabled = false;
+            }
+        };
+        issuesList.appendChild(more);
+    }
+
+    Object.entries(data.successes).forEach(([rule, count]) => issuesList.appendChild(createSuccessElement(rule, count)));
 
     // Scroll to results
     resultsSection.scrollIntoView({ behavior: 'smooth' });
 }
+
+// The success results of a rule, collapsed into one counter
+function createSuccessElement(rule, count) {
+    const div = document.createElement('div');
+    div.className = 'issue-item success';
+    div.innerHTML = `
+        <div class="issue-header">
+            <span class="issue-title"><i class="fa-solid fa-check-circle"></i> ${rule}</span>
+            <span class="issue-badge success">SUCCESS</span>
+        </div>
+        <p>Verificado com sucesso ${count === 1 ? '1 vez' : `${count} vezes`}.</p>
+    `;
+    return div;
+}
+
+function createIssueElement(issue) {
+    const div = document.createElement('div');
+    const imageUrl = `${API_BASE}/${issue.screenshot}`;
+
+    div.className = `issue-item ${issue.severity}`;
+
+    const isSuccess = issue.severity === 'success';
+    const icon = isSuccess ? '<i class="fa-solid fa-check-circle"></i>' : '<i class="fa-solid fa-triangle-exclamation"></i>';
+    const badgeClass = isSuccess ? 'issue-badge success' : 'issue-badge';
+    const suggestionTitle = isSuccess ? 'Estado:' : 'Como Corrigir:';
+    const suggestionIcon = isSuccess ? '<i class="fa-solid fa-thumbs-up"></i>' : '<i class="fa-solid fa-lightbulb"></i>';
+
+    div.innerHTML = `
+        <div class="issue-header">
+            <span class="issue-title">${icon} ${issue.rule}</span>
+            <span class="${badgeClass}">${issue.severity.toUpperCase()}</span>
+        </div>
+        
+        <div class="issue-content">
+            <div class="issue-details">
+                <p class="description"><strong>${isSuccess ? 'Info' : 'Erro'}:</strong> ${issue.description}</p>
+                
+                ${issue.context ? `
+                <div class="context-box">
+                    <strong>${isSuccess ? 'Contexto Verificado' : 'Contexto Encontrado'}:</strong>
+                    <blockquote>"${issue.context}"</blockquote>
+                </div>` : ''}
+
+                ${issue.location_guide ? `
+                <div class="location-box" style="margin-top: 10px; padding: 10px; background: #eef2f5; border-left: 4px solid #2c3e50; border-radius: 4px;">
+                    <i class="fa-solid fa-code-branch"></i>
+                    <strong>Guia de Localização (Técnico):</strong>
+                    <code style="display: block; margin-top: 5px; color: ${isSuccess ? 'green' : '#d63384'};">${issue.location_guide}</code>
+                </div>` : ''}
+                
+                <div class="suggestion-box" style="${isSuccess ? 'background-color: #d1e7dd; border-color: #badbcc;' : ''}">
+                    ${suggestionIcon}
+                    <strong>${suggestionTitle}</strong>
+                    <p>${issue.suggestion}</p>
+                </div>
+
+                <a href="${issue.url}" target="_blank" class="link-btn">
+                    <i class="fa-solid fa-external-link-alt"></i> Ver na Página
+                </a>
+            </div>
+            
+            ${issue.screenshot ? `
+            <div class="issue-image">
+                <img src="${imageUrl}" loading="lazy" alt="Screenshot da falha" onclick="window.open('${imageUrl}', '_blank')">
+                <small>Clique para ampliar</small>
+            </div>` : ''}
+        </div>
+    `;
+    return div;
+}
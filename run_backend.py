@@ -1,17 +1,39 @@
+import argparse
 import asyncio
 import sys
 import uvicorn
 import os
 
 def main():
+    parser = argparse.ArgumentParser(description="Starts the API (and, with --workers, the analysis worker processes).")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WORKER_PROCESSES", "0")),
+                        help="analysis worker processes fed by a shared SQLite queue (0 = analyses run in the API process)")
+    parser.add_argument("--api-workers", type=int, default=1,
+                        help="API processes (only with --workers: they share the queue)")
+    args = parser.parse_args()
+
     # Force ProactorEventLoopPolicy on Windows BEFORE anything else happens
     if sys.platform == 'win32':
         print("Setting WindowsProactorEventLoopPolicy...")
         asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
 
+    supervisor = None
+    if args.workers > 0:
+        # Read by the backend modules at import time, and inherited by the worker processes
+        os.environ["JOB_BACKEND"] = "sqlite"
+        os.environ.setdefault("CACHE_BACKEND", "sqlite")
+        from backend.worker import Supervisor
+        supervisor = Supervisor(args.workers)
+        supervisor.start()
+
     print("Starting Uvicorn Server on port 8081...")
-    # Run uvicorn programmatically (reload=False to ensure loop policy is respected in same process)
-    uvicorn.run("backend.main:app", host="0.0.0.0", port=8081, reload=False)
+    try:
+        # Run uvicorn programmatically (reload=False to ensure loop policy is respected in same process)
+        uvicorn.run("backend.main:app", host="0.0.0.0", port=8081, reload=False,
+                    workers=args.api_workers if supervisor else 1)
+    finally:
+        if supervisor is not None:
+            supervisor.stop()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,66 @@
+# The job endpoints with worker processes (JOB_BACKEND=sqlite): the API only
+# queues jobs, a worker is played by the test through the shared queue.
+import pytest
+
+from fastapi.testclient import TestClient
+
+from backend import job_queue, main
+from backend.job_queue import SharedJobManager, SQLiteJobQueue
+from backend.screenshots import ScreenshotStore
+
+RESULT = {
+    "score": 90, "status": "Conforme", "scanned_pages": 1, "page_tiers": {"https://a.pt/": "http"},
+    "issues": [dict(rule="Falta de TAEG", description="d", severity="high", suggestion="s", context=f"...{i}%...",
+                    url="https://a.pt/", screenshot="a.jpg", location_guide="Tag: <p>") for i in range(5)]
+              + [dict(rule="Menção à Atividade", description="d", severity="success", suggestion="s", context="c",
+                      url="https://a.pt/", screenshot="a.jpg", location_guide="Geral")],
+}
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(job_queue, "JOB_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(main, "JOB_BACKEND", "sqlite")
+    monkeypatch.setattr(main, "SharedJobManager", lambda: SharedJobManager(queue))
+    monkeypatch.setattr(main, "ScreenshotStore", lambda: ScreenshotStore(str(tmp_path / "screenshots")))
+    monkeypatch.setattr(main, "create_analysis_executor", lambda: None)
+    return queue
+
+
+@pytest.fixture
+def client(queue):
+    with TestClient(main.app) as client:
+        yield client
+
+
+def test_analyze_without_workers_fails_fast(client):
+    response = client.post("/api/analyze", json={"url": "https://a.pt/"})
+    assert response.status_code == 503
+    assert int(response.headers["retry-after"]) >= 1
+    assert client.get("/api/workers").json()["workers"] == []
+
+
+def test_job_result_and_events(client, queue):
+    queue.register("w1", slots=1)
+    job_id = client.post("/api/jobs", json={"url": "https://a.pt/"}).json()["id"]
+    assert client.get(f"/api/jobs/{job_id}/result").status_code == 409
+    queue.claim("w1")
+    queue.finish("w1", job_id, "done", RESULT)
+
+    assert client.get(f"/api/jobs/{job_id}").json()["status"] == "done"
+    with client.stream("GET", f"/api/jobs/{job_id}/events") as stream:
+        events = [line for line in stream.iter_lines() if line.startswith("event:")]
+    assert events == ["event: queued", "event: started", "event: done"]
+
+    compact = client.get(f"/api/jobs/{job_id}/result?format=compact&offset=1&limit=2").json()
+    assert (len(compact["issues"]), compact["total_issues"], compact["offset"]) == (2, 5, 1)
+    assert compact["successes"] == {"Menção à Atividade": 1}
+    full = client.get(f"/api/jobs/{job_id}/result", headers={"Accept-Encoding": "gzip"})
+    assert full.headers["content-encoding"] == "gzip"
+    assert len(full.json()["issues"]) == 6
+
+
+def test_missing_job(client):
+    assert client.get("/api/jobs/nenhum").status_code == 404
+    assert client.get("/api/jobs/nenhum/events").status_code == 404
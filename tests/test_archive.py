@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+from backend.archive import CrawlArchive, archive_files, read_records
+from backend.compliance import analyze_page, summarize_issues
+from backend.replay import diff_issues, latest_crawls, replay
+
+FOOTER = ("Intermediário de Crédito registado no Banco de Portugal, Registo n.º 1234."
+          " Crédito pessoal e financiamento para todos os projetos da sua família.")
+
+
+def crawled_page(url, body, order):
+    html = f"<html><body><p>{body}</p><footer>{FOOTER}</footer></body></html>"
+    return {"url": url, "text": f"{body}\n{FOOTER}", "html": html, "screenshot": "s.jpg", "order": order}
+
+
+def archive_crawl(archive, crawl, pages):
+    issues = []
+    for page in pages:
+        page_issues = analyze_page(page)
+        archive.add_page(crawl, page, page_issues)
+        issues.extend(page_issues)
+    archive.add_crawl(crawl, pages, summarize_issues(issues, len(pages)))
+
+
+def test_records_round_trip(tmp_path):
+    archive = CrawlArchive(str(tmp_path))
+    pages = [crawled_page("https://a.pt/", "Crédito fácil já", [0]),
+             crawled_page("https://a.pt/2", "TAEG 7%", [1, 0])]
+    archive_crawl(archive, "c1", pages)
+    assert not archive.add_page("c1", {"url": "https://a.pt/3", "text": "sem DOM"}, [])
+
+    files = archive_files([str(tmp_path)])
+    assert len(files) == 1
+    # Readable while still open (no gzip trailer yet)
+    assert [record["type"] for record in read_records(files)] == ["page", "page", "crawl"]
+    archive.close()
+    records = list(read_records(files))
+    assert records[0]["html"] == pages[0]["html"]
+    assert records[2]["site"] == "https://a.pt/"
+    assert archive.stats()["pages"] == 2
+
+
+def test_file_cut_short(tmp_path):
+    archive = CrawlArchive(str(tmp_path))
+    archive_crawl(archive, "c1", [crawled_page("https://a.pt/", "Olá", [0])])
+    archive_crawl(archive, "c2", [crawled_page("https://b.pt/", "Olá", [0])])
+    archive.close()
+    path = archive_files([str(tmp_path)])[0]
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:len(data) - 40])
+    records = list(read_records([path]))
+    assert 0 < len(records) < 4
+    assert all(isinstance(record, dict) for record in records)
+
+
+def test_replay(tmp_path):
+    archive = CrawlArchive(str(tmp_path / "archive"))
+    archive_crawl(archive, "old", [crawled_page("https://a.pt/", "Crédito fácil", [0])])
+    archive_crawl(archive, "new", [crawled_page("https://a.pt/", "Crédito fácil", [0]),
+                                   crawled_page("https://a.pt/2", "Taxa de 5%", [1, 0])])
+    archive_crawl(archive, "other", [crawled_page("https://b.pt/", "Sem juros!", [0])])
+    archive.close()
+    files = archive_files([str(tmp_path / "archive")])
+    assert latest_crawls(files) == {"new", "other"}
+
+    output = tmp_path / "replay.jsonl"
+    totals = asyncio.run(replay(files, str(output), workers=0, latest=True))
+    assert (totals["crawls"], totals["pages"], totals["changed"]) == (2, 3, 0)
+    reports = {report["crawl"]: report for report in map(json.loads, output.read_text().splitlines())}
+    assert set(reports) == {"new", "other"}
+    assert reports["new"]["before"] == reports["new"]["after"]
+    assert reports["new"]["complete"] and reports["new"]["pages"] == 2
+
+
+def test_diff_issues():
+    def issue(rule):
+        return {"url": "https://a.pt/", "rule": rule, "severity": "high", "description": rule}
+    added, removed = diff_issues([issue("A"), issue("B")], [issue("B"), issue("C")])
+    assert (added, removed) == ([issue("C")], [issue("A")])
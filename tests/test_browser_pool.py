@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+
+from backend.browser_pool import BrowserPool
+
+
+class FakeContext:
+    def __init__(self):
+        self.closed = False
+        self.handlers = {}
+
+    def on(self, event, handler):
+        self.handlers[event] = handler
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self, failures=0):
+        self.failures = failures  # new_context calls that fail before one succeeds
+        self.closed = False
+
+    def on(self, event, handler):
+        pass
+
+    def is_connected(self):
+        return not self.closed
+
+    async def new_context(self, **options):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("Target closed")
+        return FakeContext()
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeChromium:
+    def __init__(self, failures):
+        self.failures = list(failures)  # per launched browser
+        self.browsers = []
+
+    async def launch(self, **options):
+        browser = FakeBrowser(self.failures.pop(0) if self.failures else 0)
+        self.browsers.append(browser)
+        return browser
+
+
+class FakePlaywright:
+    def __init__(self, *failures):
+        self.chromium = FakeChromium(failures)
+
+    async def stop(self):
+        pass
+
+
+def pool_with(*failures, **kwargs):
+    pool = BrowserPool(**kwargs)
+    pool._playwright = FakePlaywright(*failures)
+    return pool
+
+
+def browsers(pool):
+    return pool._playwright.chromium.browsers
+
+
+def test_contexts_share_one_browser():
+    pool = pool_with(max_contexts=2)
+
+    async def main():
+        async with pool.context() as first, pool.context() as second:
+            assert pool.stats()["active_contexts"] == 2
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first.closed and second.closed
+    assert len(browsers(pool)) == 1
+    assert pool.stats()["active_contexts"] == 0
+
+
+def test_failing_browser_is_closed_and_replaced():
+    pool = pool_with(1, max_contexts=2)
+
+    async def main():
+        async with pool.context():
+            pass
+
+    asyncio.run(main())
+    assert [browser.closed for browser in browsers(pool)] == [True, False]
+    assert pool.stats()["launches"] == 2
+
+
+def test_second_failure_is_raised_and_the_pool_recovers():
+    pool = pool_with(1, 1, max_contexts=2)
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            async with pool.context():
+                pass
+        assert [browser.closed for browser in browsers(pool)] == [True, True]
+        assert pool._semaphore._value == 2
+        async with pool.context():
+            pass
+
+    asyncio.run(main())
+    assert pool.stats()["launches"] == 3
+
+
+def test_busy_browser_closes_after_its_last_context():
+    pool = pool_with(max_contexts=3)
+
+    async def main():
+        async with pool.context():
+            busy = browsers(pool)[0]
+            busy.failures = 1
+            async with pool.context():
+                # Replaced, but still running the outer crawl
+                assert not busy.closed
+                assert pool.stats()["retiring_browsers"] == 1
+            assert not busy.closed
+        assert busy.closed
+
+    asyncio.run(main())
+
+
+def test_browser_recycled_after_its_pages():
+    pool = pool_with(max_contexts=2, recycle_after_pages=2)
+
+    async def main():
+        for _ in range(2):
+            async with pool.context() as context:
+                context.handlers["page"](None)
+        async with pool.context():
+            pass
+
+    asyncio.run(main())
+    assert [browser.closed for browser in browsers(pool)] == [True, False]
+    assert pool.stats()["pages_total"] == 2
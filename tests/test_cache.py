@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+from backend import cache
+from backend.cache import CacheLevel, MemoryStore, SQLiteStore, content_digest, crawl_key, without_dom
+from backend.urls import normalize_url
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStore(max_bytes=10)
+    return SQLiteStore(str(tmp_path / "cache.sqlite3"), "test_cache", max_bytes=10)
+
+
+def test_least_recently_used_entries_go_first(store):
+    store.set("a", 1, ttl=60, size=4)
+    store.set("b", 2, ttl=60, size=4)
+    assert store.get("a") == 1
+    store.set("c", 3, ttl=60, size=4)
+    assert (store.get("a"), store.get("b"), store.get("c")) == (1, None, 3)
+    assert len(store) == 2
+
+
+def test_expired_entries(store):
+    store.set("a", 1, ttl=-1, size=1)
+    assert store.get("a") is None
+
+
+def test_cache_level_counts_hits():
+    level = CacheLevel("test", ttl=60, backend="memory")
+    assert level.get("x") is None
+    level.set("x", {"issues": []})
+    assert level.get("x") == {"issues": []}
+    assert level.stats()["hit_rate"] == 0.5
+
+
+def test_crawl_key():
+    assert crawl_key("https://X.pt/a/?utm_source=n&b=2#topo", pages=3) == "https://x.pt/a?b=2|pages=3"
+    assert normalize_url("https://x.pt:443") == "https://x.pt/"
+
+
+def test_content_digest_survives_without_dom():
+    page = {"url": "https://x.pt/", "text": "Olá", "html": "<p>Olá</p>"}
+    stripped = without_dom(page)
+    assert "html" not in stripped
+    assert content_digest(stripped) == content_digest(page) != content_digest(dict(page, html="<p>Adeus</p>"))
+    assert cache.content_key(page).startswith(cache.RULES_VERSION + ":")
+
+
+def test_rules_version_covers_the_indexes():
+    assert {"dom_index.py", "rule_engine.py", "normalized_text.py"} <= set(cache.RULE_FILES)
+    assert all(os.path.exists(os.path.join(cache._BACKEND_DIR, name)) for name in cache.RULE_FILES)
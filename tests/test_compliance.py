@@ -0,0 +1,76 @@
+import asyncio
+
+from backend.compliance import analyze_compliance, analyze_page
+from backend.dom_index import DomTextIndex
+
+FOOTER = ("<footer><p>Somos Intermediário de Crédito vinculado, registado no Banco de Portugal"
+          " com o Registo n.º 1234. Financiamento e crédito pessoal.</p></footer>")
+FILLER = "<p>" + "Conheça as nossas soluções de financiamento para a sua família. " * 4 + "</p>"
+
+
+def page(body, url="https://credito.example.pt/"):
+    html = f"<html><body>{body}{FILLER}{FOOTER}</body></html>"
+    text = "\n".join(node.text.strip() for node in DomTextIndex.from_html(html).nodes)
+    return {"url": url, "text": text, "html": html, "screenshot": "page.jpg"}
+
+
+def findings(issues, rule):
+    return [issue for issue in issues if issue["rule"] == rule]
+
+
+def test_compliant_page():
+    issues = analyze_page(page("<p>Crédito pessoal com TAN 6,2% e TAEG 7,5%.</p>"))
+    assert {issue["severity"] for issue in issues} == {"success"}
+    assert {issue["rule"] for issue in issues} >= {"Identificação de Registo", "Menção à Atividade",
+                                                   "Termos Proibidos", "Exibição de TAEG"}
+
+
+def test_forbidden_term_located_in_the_dom():
+    issues = analyze_page(page('<div class="promo"><span>Cré&shy;dito&nbsp; FÁCIL</span> e rápido!</div>'))
+    found = findings(issues, "Termo Proibido Detectado")
+    assert len(found) == 1
+    assert found[0]["severity"] == "critical"
+    assert found[0]["location_guide"] == "Tag: <span>"
+    assert found[0]["node_path"] == "html > body > div.promo > span"
+
+
+def test_forbidden_terms_match_whole_words():
+    issues = analyze_page(page("<p>Sem jurosidade nenhuma.</p>"))
+    assert findings(issues, "Termo Proibido Detectado") == []
+
+
+def test_one_taeg_finding_per_offer():
+    card = '<div class="card"><div class="body"><div class="price"><p>Taxa de {}</p></div></div></div>'
+    issues = analyze_page(page("".join(card.format(rate) for rate in ("5%", "6%", "7%"))))
+    found = findings(issues, "Falta de TAEG")
+    assert [issue["node_path"].rsplit(" > ", 4)[1] for issue in found] == [
+        "div.card", "div.card:nth-of-type(2)", "div.card:nth-of-type(3)"]
+
+
+def test_table_cells_are_merged_into_one_finding():
+    rows = "".join(f"<tr><td>Prazo {n} anos</td><td>{rate}</td></tr>" for n, rate in ((5, "5%"), (6, "6%"), (7, "6%")))
+    issues = analyze_page(page(f"<table class='simulador'><tbody>{rows}</tbody></table>"))
+    found = findings(issues, "Falta de TAEG")
+    assert len(found) == 1
+    assert found[0]["context"].endswith("(taxas sem TAEG: 5%, 6%)")
+
+
+def test_page_from_browser_nodes():
+    html_page = page("<p>Crédito fácil</p>")
+    nodes = [{"text": n.text, "tag": n.tag, "classes": list(n.classes), "path": n.path}
+             for n in DomTextIndex.from_html(html_page.pop("html")).nodes]
+    found = findings(analyze_page(dict(html_page, nodes=nodes)), "Termo Proibido Detectado")
+    assert found[0]["node_path"] == "html > body > p"
+
+
+def test_empty_page():
+    issues = analyze_page({"url": "https://vazio.example.pt/", "text": "", "html": "", "screenshot": ""})
+    assert [issue["rule"] for issue in issues] == ["Erro de Leitura"]
+
+
+def test_analyze_compliance_summarizes_the_site():
+    pages = [page("<p>Crédito fácil</p>"), page("<p>Crédito fácil</p>", url="https://credito.example.pt/2")]
+    result = asyncio.run(analyze_compliance(pages))
+    assert result["scanned_pages"] == 2
+    # The same finding on every page counts once
+    assert len(findings(result["issues"], "Termo Proibido Detectado")) == 1
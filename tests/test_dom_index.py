@@ -0,0 +1,57 @@
+import pytest
+
+from backend.dom_index import DomTextIndex, describe_tag
+from backend.matcher import compile_terms
+from backend.normalized_text import NormalizedText
+
+PARSERS = ["html.parser", "lxml"]
+
+CARDS = """<html><body>
+<div class="card"><p>Crédito A</p><p>TAEG 7,5%</p></div>
+<div class="card"><p>Crédito B</p></div>
+<script>var taeg = "9%";</script><noscript>Ative o JavaScript</noscript><template><p>modelo</p></template>
+</body></html>"""
+
+
+@pytest.mark.parametrize("parser", PARSERS)
+@pytest.mark.parametrize("html", ["", "   ", "<!-- nada -->", "<!DOCTYPE html>"])
+def test_empty_html(parser, html):
+    index = DomTextIndex.from_html(html, parser)
+    assert index.nodes == []
+    assert index.text == ""
+
+
+@pytest.mark.parametrize("parser", PARSERS)
+def test_sibling_positions_in_paths(parser):
+    index = DomTextIndex.from_html(CARDS, parser)
+    assert [(node.text, node.path) for node in index.nodes] == [
+        ("Crédito A", "html > body > div.card > p"),
+        ("TAEG 7,5%", "html > body > div.card > p:nth-of-type(2)"),
+        ("Crédito B", "html > body > div.card:nth-of-type(2) > p"),
+    ]
+    assert describe_tag(index.nodes[2]) == "Tag: <p>"
+
+
+@pytest.mark.parametrize("parser", PARSERS)
+def test_parsers_agree(parser):
+    html = "<div><b>um</b> dois <i>três</i> quatro<br>cinco</div>"
+    assert [(n.text, n.tag) for n in DomTextIndex.from_html(html, parser).nodes] == [
+        ("um", "b"), (" dois ", "div"), ("três", "i"), (" quatro", "div"), ("cinco", "div")]
+
+
+def test_position_maps_offsets_to_nodes():
+    index = DomTextIndex.from_html(CARDS, "html.parser")
+    offset = index.text.index("TAEG")
+    assert index.position(offset) == (1, 0)
+    node, inner = index.node_at(index.text.index("B"))
+    assert (node.text, inner) == ("Crédito B", 8)
+
+
+def test_first_matches():
+    index = DomTextIndex.from_html("<p>Crédito</p><p>Cré&shy;dito fácil</p><p>crédito fácil</p>", "html.parser")
+    pattern = compile_terms(["credito facil", "credito"], words=True)
+    matches = index.first_matches(pattern, NormalizedText(index.text))
+    node, start, end = matches["credito facil"]
+    assert node.text[start:end] == "Cré­dito fácil"
+    node, start, end = matches["credito"]
+    assert (node.text, start, end) == ("Crédito", 0, 7)
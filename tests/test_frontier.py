@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from backend import frontier
+from backend.cache import MemoryStore
+from backend.frontier import Frontier, is_excluded, link_score
+
+ROBOTS = "User-agent: *\nDisallow: /privado\nSitemap: https://x.pt/mapa.xml\n"
+SITEMAP = ('<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+           "<url><loc>https://x.pt/simulador-credito</loc></url><url><loc>https://x.pt/blog</loc></url>"
+           "<url><loc>https://x.pt/privado/dados</loc></url></urlset>")
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.is_success = text is not None
+
+
+class FakeClient:
+    """Stands in for the HTTP tier's httpx client."""
+
+    def __init__(self, files):
+        self.files = files
+        self.fetched = []
+
+    async def get(self, url, **kwargs):
+        self.fetched.append(url)
+        return FakeResponse(self.files.get(url))
+
+
+@pytest.fixture(autouse=True)
+def site_info(monkeypatch):
+    store = MemoryStore(frontier.SITE_INFO_MAX_ORIGINS)
+    monkeypatch.setattr(frontier, "_site_info", store)
+    return store
+
+
+def drain(queue):
+    return [queue.pop()[1] for _ in range(len(queue))]
+
+
+def test_duplicates_are_queued_once():
+    queue = Frontier("https://x.pt/")
+    queue.add_links((0, 0, 0), ["https://x.pt/#topo", "https://x.pt/?utm_source=news", "https://www.x.pt/",
+                                "https://x.pt/sobre/", "https://x.pt/sobre", "https://www.x.pt/sobre#equipa"])
+    assert drain(queue) == ["https://x.pt/", "https://x.pt/sobre/"]
+    assert queue.stats["duplicates"] == 5
+
+
+def test_offsite_and_excluded_links():
+    queue = Frontier("https://x.pt/")
+    queue.add_links((0, 0, 0), ["https://outro.pt/credito", "https://x.pt/precario.pdf", "https://x.pt/login",
+                                "https://x.pt/feed/", "https://x.pt/contactos"])
+    assert drain(queue) == ["https://x.pt/", "https://x.pt/contactos"]
+    assert queue.stats["excluded"] == 4
+    assert is_excluded("https://x.pt/wp-admin/") and not is_excluded("https://x.pt/login-facil-guia")
+
+
+def test_priority_then_discovery_order():
+    queue = Frontier("https://x.pt/")
+    queue.add_links((0, 0, 0), [
+        {"url": "https://x.pt/blog", "text": "Blog"},
+        {"url": "https://x.pt/a", "text": "Simulador de crédito"},
+        {"url": "https://x.pt/legal", "text": "Informação legal", "footer": True},
+        {"url": "https://x.pt/equipa", "text": "Equipa"},
+    ])
+    assert drain(queue) == ["https://x.pt/", "https://x.pt/a", "https://x.pt/legal",
+                            "https://x.pt/blog", "https://x.pt/equipa"]
+
+
+def test_depth_breaks_ties():
+    queue = Frontier("https://x.pt/")
+    queue.add_links((1, 0, 1, 0), ["https://x.pt/fundo"])
+    queue.add_links((0, 0, 0), ["https://x.pt/topo"])
+    assert drain(queue) == ["https://x.pt/", "https://x.pt/topo", "https://x.pt/fundo"]
+
+
+def test_link_score():
+    assert link_score("https://x.pt/simulador-credito") == 6
+    assert link_score("https://x.pt/p?id=1", "Preçário", footer=True) == 4
+    assert link_score("https://x.pt/blog") == 0
+
+
+def test_seed_reads_robots_and_sitemap():
+    client = FakeClient({"https://x.pt/robots.txt": ROBOTS, "https://x.pt/mapa.xml": SITEMAP})
+    queue = Frontier("https://x.pt/")
+    asyncio.run(queue.seed(client))
+    assert queue.stats["sitemap"] == 2
+    assert queue.stats["disallowed"] == 1
+    assert not queue.add("https://x.pt/privado/outra", (1, 0, 1))
+    assert drain(queue) == ["https://x.pt/", "https://x.pt/simulador-credito", "https://x.pt/blog"]
+
+
+def test_site_info_is_cached_per_origin(site_info, monkeypatch):
+    client = FakeClient({"https://x.pt/robots.txt": ROBOTS, "https://x.pt/mapa.xml": SITEMAP})
+    asyncio.run(Frontier("https://x.pt/").seed(client))
+    fetched = len(client.fetched)
+    asyncio.run(Frontier("https://x.pt/outra").seed(client))
+    assert len(client.fetched) == fetched
+    assert len(site_info) == 1
+
+
+def test_site_info_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(frontier, "_site_info", MemoryStore(2))
+    client = FakeClient({})
+    for host in ("a", "b", "a", "c", "b"):
+        asyncio.run(Frontier(f"https://{host}.pt/").seed(client))
+    robots = [url for url in client.fetched if url.endswith("/robots.txt")]
+    # "b" was the least recently used when "c" came in
+    assert robots == ["https://a.pt/robots.txt", "https://b.pt/robots.txt", "https://c.pt/robots.txt",
+                      "https://b.pt/robots.txt"]
+    assert len(frontier._site_info) == 2
@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from backend import http_fetch
+from backend.dom_index import DomTextIndex
+from backend.http_fetch import extract_links, fetch_page, html_encoding, needs_browser, rendered_text
+
+TEXT = "Crédito pessoal com TAEG de 7,5%. " * 10
+PAGE = (f"<html><head><title>Crédito</title></head><body><p>{TEXT}</p>"
+        "<a href='/simulador'>Simulador</a><a href='https://outro.pt/'>Outro</a>"
+        "<footer><a href='/legal#topo'>Informação legal</a></footer></body></html>")
+HTML = {"content-type": "text/html; charset=utf-8"}
+
+
+def html_response(body, status=200, headers=HTML):
+    return httpx.Response(status, headers=headers, content=body.encode("utf-8") if isinstance(body, str) else body)
+
+
+def fetch(handler, url="https://x.pt/", profile="full", **kwargs):
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await fetch_page(client, url, profile, **kwargs)
+    return asyncio.run(main())
+
+
+def test_server_rendered_page():
+    page, links, reason = fetch(lambda request: html_response(PAGE, headers=dict(HTML, etag='"v1"')))
+    assert reason is None
+    assert page["tier"] == "http"
+    assert page["text"].startswith("Crédito pessoal")
+    assert "Crédito\n" not in page["text"]  # <head> is not page text
+    assert page["nodes"][0]["path"] == "html > body > p"
+    assert page["fingerprint"]["etag"] == '"v1"'
+    assert page["network"]["bytes"] == len(PAGE.encode("utf-8"))
+    assert links == [{"url": "https://x.pt/simulador", "text": "Simulador", "footer": False},
+                     {"url": "https://x.pt/legal#topo", "text": "Informação legal", "footer": True}]
+
+
+@pytest.mark.parametrize("body", ["", "   ", "<!-- vazio -->"])
+def test_empty_body_goes_to_the_browser(body):
+    assert fetch(lambda request: html_response(body)) == (None, [], "little_text")
+
+
+def test_body_over_the_limit(monkeypatch):
+    monkeypatch.setattr(http_fetch, "HTTP_MAX_BYTES", 500)
+    assert len(PAGE.encode("utf-8")) > 500
+    # Declared by Content-Length
+    assert fetch(lambda request: html_response(PAGE))[2] == "too_large"
+    # Streamed without a length
+    async def chunks():
+        for _ in range(5):
+            yield b"<p>" + b"a" * 200 + b"</p>"
+
+    response = httpx.Response(200, headers=HTML, content=chunks())
+    assert "content-length" not in response.headers
+    assert fetch(lambda request: response)[2] == "too_large"
+
+
+def test_pages_that_need_a_browser():
+    cases = {
+        "bot_wall": html_response("<title>Just a moment...</title>" + PAGE, status=503),
+        "status_404": html_response(PAGE, status=404),
+        "not_html": httpx.Response(200, headers={"content-type": "application/pdf"}, content=b"%PDF-1.4"),
+        "spa": html_response(f'<html><body><div id="root"></div><p>{TEXT}</p></body></html>'),
+        "client_redirect": html_response(f'<meta http-equiv="refresh" content="0; url=/pt"><p>{TEXT}</p>'),
+    }
+    for reason, response in cases.items():
+        assert fetch(lambda request: response) == (None, [], reason)
+
+
+def test_unreadable_html_goes_to_the_browser(monkeypatch):
+    def broken(html, parser=None):
+        raise ValueError("markup")
+    monkeypatch.setattr(http_fetch.DomTextIndex, "from_html", broken)
+    assert fetch(lambda request: html_response(PAGE)) == (None, [], "parse_error (ValueError)")
+
+
+def test_connection_error():
+    def refuse(request):
+        raise httpx.ConnectError("recusada")
+    assert fetch(refuse) == (None, [], "error (ConnectError)")
+
+
+def test_not_modified_reuses_the_previous_scan():
+    previous = {"etag": '"v1"', "last_modified": None, "text_hash": "h", "links": [{"url": "https://x.pt/a"}],
+                "screenshot": "antes.jpg", "issues": [{"rule": "Falta de TAEG"}]}
+
+    def handler(request):
+        assert request.headers["if-none-match"] == '"v1"'
+        return httpx.Response(304)
+
+    page, links, reason = fetch(handler, previous=previous)
+    assert reason is None
+    assert (page["reused"], page["screenshot"], page["issues"]) == ("not_modified", "antes.jpg", previous["issues"])
+    assert links == previous["links"]
+
+
+def test_needs_browser_little_text():
+    assert needs_browser(200, "text/html", "<p>Olá</p>", "Olá") == "little_text"
+    assert needs_browser(200, "text/html", PAGE, TEXT) is None
+
+
+@pytest.mark.parametrize("parser", ["lxml", "html.parser"])
+def test_extract_links_of_an_empty_document(parser, monkeypatch):
+    monkeypatch.setattr(http_fetch, "available_parser", lambda: parser)
+    assert extract_links("", "https://x.pt/") == []
+    assert extract_links(PAGE, "https://x.pt/")[0]["url"] == "https://x.pt/simulador"
+
+
+def test_charset_declared_in_the_markup():
+    body = f'<html><head><meta charset="iso-8859-1"></head><body><p>{TEXT}</p></body></html>'
+    # No charset in the header: the <meta> says how the bytes are encoded
+    response = html_response(body.encode("latin-1"), headers={"content-type": "text/html"})
+    page, _, reason = fetch(lambda request: response)
+    assert reason is None
+    assert page["text"].startswith("Crédito pessoal")
+
+
+@pytest.mark.parametrize("content, declared, expected", [
+    ("<p>Crédito</p>".encode("utf-8"), None, "utf-8"),
+    ("<p>Crédito</p>".encode("cp1252"), None, "cp1252"),
+    (b'<meta http-equiv="Content-Type" content="text/html; charset=ISO-8859-1">', None, "cp1252"),
+    (b'<meta charset="utf-8">', "windows-1252", "cp1252"),
+    (b'<meta charset="nada">', None, "utf-8"),
+    ("\ufeff<p>Olá</p>".encode("utf-8"), None, "utf-8-sig"),
+])
+def test_html_encoding(content, declared, expected):
+    assert html_encoding(content, declared) == expected
+
+
+def test_rendered_text_keeps_inline_runs_together():
+    html = ("<div><p><b>TAEG</b>: 10%, <a href='#'>ver <em>condições</em></a>.</p>"
+            "<p>Linha um<br>linha dois</p>Fim</div>")
+    assert rendered_text(DomTextIndex.from_html(html).nodes) == "TAEG: 10%, ver condições.\nLinha um\nlinha dois\nFim"
+    assert rendered_text([]) == ""
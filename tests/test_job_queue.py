@@ -0,0 +1,144 @@
+import asyncio
+import time
+
+import pytest
+
+from backend import job_queue
+from backend.jobs import QueueFullError
+from backend.job_queue import JobGoneError, SharedJobManager, SQLiteJobQueue
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_POLL_INTERVAL", 0.01)
+    return SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"), max_queue=3)
+
+
+def test_submit_claim_finish(queue):
+    queue.register("w1", slots=2)
+    job = queue.submit("https://a.pt/", {"refresh": True})
+    assert queue.counts() == {"queued": 1}
+
+    claimed = queue.claim("w1")
+    assert (claimed.id, claimed.url, claimed.options) == (job.id, "https://a.pt/", {"refresh": True})
+    assert queue.claim("w1") is None
+    queue.emit(job.id, {"type": "page", "url": "https://a.pt/"})
+    queue.finish("w1", job.id, "done", {"score": 90})
+
+    done = queue.get(job.id)
+    assert (done.status, done.result) == ("done", {"score": 90})
+    assert [event["type"] for event in queue.events_since(job.id, 0)] == ["queued", "started", "page", "done"]
+    assert queue.workers()[0]["done"] == 1
+
+
+def test_finish_ignored_when_the_job_was_taken_away(queue):
+    job = queue.submit("https://a.pt/")
+    queue.claim("w1")
+    queue.finish("w2", job.id, "done", {"score": 90})
+    assert queue.status(job.id) == "running"
+
+
+def test_queue_full(queue):
+    for i in range(3):
+        queue.submit(f"https://{i}.pt/")
+    with pytest.raises(QueueFullError):
+        queue.submit("https://cheia.pt/")
+
+
+def test_cancel(queue):
+    running, queued = queue.submit("https://a.pt/"), queue.submit("https://b.pt/")
+    queue.claim("w1")
+    queue.cancel(running.id)
+    queue.cancel(queued.id)
+    assert queue.status(queued.id) == "cancelled"
+    # A running job is only flagged; its worker hears of it on the next heartbeat
+    assert queue.status(running.id) == "running"
+    queue.register("w1", slots=1)
+    assert queue.heartbeat("w1", 1, [running.id]) == [running.id]
+
+
+def test_jobs_of_dead_workers_are_requeued(queue, monkeypatch):
+    queue.register("w1", slots=1)
+    job = queue.submit("https://a.pt/")
+    queue.claim("w1")
+    assert queue.recover() == 0
+    monkeypatch.setattr(job_queue, "WORKER_TIMEOUT", -1)
+    assert queue.recover() == 1
+    assert queue.status(job.id) == "queued"
+    assert queue.workers() == []
+
+
+def test_wait(queue):
+    manager = SharedJobManager(queue)
+    job = queue.submit("https://a.pt/")
+
+    async def worker():
+        await asyncio.sleep(0.05)
+        queue.claim("w1")
+        queue.finish("w1", job.id, "done", {"score": 70})
+
+    async def main():
+        _, done = await asyncio.gather(worker(), manager.wait(job.id, timeout=5))
+        return done
+
+    assert asyncio.run(main()).result == {"score": 70}
+
+
+def test_wait_for_a_missing_job(queue):
+    manager = SharedJobManager(queue)
+    job = queue.submit("https://a.pt/")
+
+    async def drop():
+        await asyncio.sleep(0.05)
+        with queue._write():
+            queue._db.execute("DELETE FROM jobs WHERE id = ?", (job.id,))
+
+    async def main():
+        await asyncio.gather(drop(), manager.wait(job.id, timeout=5))
+
+    with pytest.raises(JobGoneError):
+        asyncio.run(main())
+    with pytest.raises(JobGoneError):
+        asyncio.run(manager.wait("nenhum"))
+
+
+def test_wait_timeout(queue):
+    manager = SharedJobManager(queue)
+    job = queue.submit("https://a.pt/")
+    start = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(manager.wait(job.id, timeout=0.1))
+    assert time.monotonic() - start < 2
+
+
+def test_events_end_when_the_job_is_gone(queue):
+    manager = SharedJobManager(queue)
+    job = queue.submit("https://a.pt/")
+
+    async def follow():
+        return [event["type"] async for event in manager.events(job.id)]
+
+    async def drop():
+        await asyncio.sleep(0.05)
+        with queue._write():
+            queue._db.execute("DELETE FROM jobs WHERE id = ?", (job.id,))
+
+    async def main():
+        events, _ = await asyncio.wait_for(asyncio.gather(follow(), drop()), 5)
+        return events
+
+    assert asyncio.run(main()) == ["queued"]
+    assert asyncio.run(asyncio.wait_for(_collect(manager.events("nenhum")), 5)) == []
+
+
+async def _collect(events):
+    return [event async for event in events]
+
+
+def test_live_workers(queue, monkeypatch):
+    manager = SharedJobManager(queue)
+    assert manager.live_workers() == 0
+    queue.register("w1", slots=2)
+    assert manager.live_workers() == 1
+    monkeypatch.setattr(job_queue, "WORKER_TIMEOUT", -1)
+    assert manager.live_workers() == 0
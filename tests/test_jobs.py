@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from backend.jobs import JobManager, QueueFullError, retry_after
+
+
+def run_jobs(runner, body, **kwargs):
+    async def main():
+        jobs = JobManager(runner, **kwargs)
+        await jobs.start()
+        try:
+            return await body(jobs)
+        finally:
+            await jobs.stop()
+    return asyncio.run(main())
+
+
+async def analysis(job, emit):
+    emit({"type": "page", "url": job.url})
+    return {"score": 100}
+
+
+def test_job_runs_and_streams_its_events():
+    async def body(jobs):
+        job = jobs.submit("https://a.pt/")
+        events = [event["type"] async for event in jobs.events(job.id)]
+        return job, events
+
+    job, events = run_jobs(analysis, body)
+    assert events == ["queued", "started", "page", "done"]
+    assert job.status == "done" and job.result == {"score": 100}
+
+
+def test_failed_job():
+    async def broken(job, emit):
+        raise ValueError("sem rede")
+
+    async def body(jobs):
+        job = jobs.submit("https://a.pt/")
+        return job, [event async for event in jobs.events(job.id)][-1]
+
+    job, last = run_jobs(broken, body)
+    assert (job.status, job.error) == ("failed", "ValueError: sem rede")
+    assert (last["type"], last["error"]) == ("failed", "ValueError: sem rede")
+
+
+def test_cancel_running_job():
+    async def slow(job, emit):
+        await asyncio.sleep(10)
+
+    async def body(jobs):
+        job = jobs.submit("https://a.pt/")
+        await asyncio.sleep(0.05)
+        jobs.cancel(job.id)
+        return [event["type"] async for event in jobs.events(job.id)]
+
+    assert run_jobs(slow, body) == ["queued", "started", "cancelled"]
+
+
+def test_full_queue():
+    async def body(jobs):
+        jobs.submit("https://a.pt/")
+        with pytest.raises(QueueFullError) as e:
+            jobs.submit("https://b.pt/")
+        return e.value.retry_after
+
+    # No workers started: the first job stays queued
+    assert run_jobs(analysis, body, max_queue=1, workers=0) >= 1
+
+
+def test_cancelled_queued_job_frees_its_slot():
+    async def body(jobs):
+        first = jobs.submit("https://a.pt/")
+        jobs.cancel(first.id)
+        second = jobs.submit("https://b.pt/")
+        return first.status, second.status, jobs.queue_depth()
+
+    assert run_jobs(analysis, body, max_queue=1, workers=0) == ("cancelled", "queued", 1)
+
+
+def test_events_of_unknown_job():
+    async def body(jobs):
+        return [event async for event in jobs.events("nope")]
+
+    assert run_jobs(analysis, body) == []
+
+
+def test_retry_after():
+    assert retry_after(10, 2, [6.0, 4.0]) == 25
+    assert retry_after(0, 0, []) == 1
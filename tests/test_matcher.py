@@ -0,0 +1,31 @@
+from backend.matcher import FORBIDDEN_FOLDED, FORBIDDEN_PATTERN, compile_terms, find_terms, first_occurrences
+from backend.normalized_text import fold
+from backend.rules import FORBIDDEN_TERMS
+
+
+def test_forbidden_terms_are_folded():
+    assert set(FORBIDDEN_FOLDED.values()) == set(FORBIDDEN_TERMS)
+    assert all(term == fold(term) for term in FORBIDDEN_FOLDED)
+
+
+def test_whole_words_only():
+    pattern = compile_terms(["tan", "taeg", "5"], words=True)
+    assert find_terms("importante: a tan e a taeg de 5 (ou 15)", pattern) == [
+        (14, 17, "tan"), (22, 26, "taeg"), (30, 31, "5")]
+    assert find_terms("tangente taegx", pattern) == []
+
+
+def test_longest_term_wins_and_overlaps_are_reported():
+    pattern = compile_terms(["credito", "credito facil", "facil"], words=True)
+    assert find_terms("credito facil", pattern) == [(0, 13, "credito facil"), (8, 13, "facil")]
+
+
+def test_substrings_without_words():
+    pattern = compile_terms(["ab", "b"])
+    assert [term for _, _, term in find_terms("xabx", pattern)] == ["ab", "b"]
+
+
+def test_first_occurrences():
+    pattern = compile_terms(["tan", "taeg"], words=True)
+    assert first_occurrences("tan taeg tan", pattern) == {"tan": (0, 3), "taeg": (4, 8)}
+    assert first_occurrences("", FORBIDDEN_PATTERN) == {}
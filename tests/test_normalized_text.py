@@ -0,0 +1,52 @@
+from backend.normalized_text import NormalizedText, clean, fold
+
+
+def original(normalized, span):
+    return normalized.original[slice(*normalized.original_span(*span))]
+
+
+def test_fold_case_and_accents():
+    assert fold("Crédito FÁCIL") == "credito facil"
+    # Ordinal indicators are kept (NFKD would make "nº" the word "no")
+    assert fold("Registo nº 5") == "registo nº 5"
+
+
+def test_whitespace_and_invisible_characters():
+    text = "Cré­dito  \n FÁCIL"
+    normalized = NormalizedText(text)
+    assert normalized.text == "credito facil"
+    span = normalized.find("crédito fácil")
+    assert span == (0, 13)
+    assert original(normalized, span) == text
+
+
+def test_offsets_map_back_to_the_original():
+    text = "Somos  Intermediário\tde ﬁnanciamento:  TAN 5%"
+    normalized = NormalizedText(text)
+    for term, expected in [("intermediario de", "Intermediário\tde"), ("financiamento", "ﬁnanciamento"),
+                           ("tan 5", "TAN 5")]:
+        assert original(normalized, normalized.find(term)) == expected
+    # Context snippets come from the original text, whitespace collapsed
+    assert normalized.snippet(*normalized.find("tan"), width=4) == "o: TAN 5%"
+
+
+def test_whole_words_only():
+    normalized = NormalizedText("Importante: a TAN é fixa. Créditos pessoais.")
+    assert normalized.find_all("tan") == [(14, 17)]
+    assert not normalized.contains("credito")
+    assert normalized.contains("credito*")
+    assert not normalized.contains("pessoa")
+
+
+def test_words_missing_from_the_page_rule_the_term_out():
+    normalized = NormalizedText("crédito pessoal")
+    assert normalized.has_words("crédito")
+    assert not normalized.has_words("crédito fácil")
+    assert normalized.find("credito facil") is None
+
+
+def test_empty_text():
+    normalized = NormalizedText("")
+    assert normalized.text == ""
+    assert normalized.find("crédito") is None
+    assert clean("  a­ b  ") == "a b"
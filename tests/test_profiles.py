@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from backend import profiles
+from backend.profiles import get_profile, install_resource_blocking, is_tracker
+
+
+class FakeRequest:
+    def __init__(self, url, resource_type):
+        self.url = url
+        self.resource_type = resource_type
+
+
+class FakeRoute:
+    def __init__(self, url, resource_type):
+        self.request = FakeRequest(url, resource_type)
+        self.outcome = None
+
+    async def abort(self):
+        self.outcome = "aborted"
+
+    async def continue_(self):
+        self.outcome = "continued"
+
+
+class FakePage:
+    def __init__(self):
+        self.handler = None
+
+    def on(self, event, handler):
+        pass
+
+    async def route(self, pattern, handler):
+        self.handler = handler
+
+
+def route_all(profile, requests):
+    async def main():
+        page = FakePage()
+        stats = await install_resource_blocking(page, profile)
+        routes = [FakeRoute(url, kind) for url, kind in requests]
+        if page.handler is not None:
+            for route in routes:
+                await page.handler(route)
+        return stats, [route.outcome for route in routes]
+    return asyncio.run(main())
+
+
+REQUESTS = [("https://x.pt/", "document"), ("https://x.pt/letra.woff2", "font"), ("https://x.pt/foto.jpg", "image"),
+            ("https://www.google-analytics.com/g/collect", "script")]
+
+
+def test_light_profile():
+    stats, outcomes = route_all("light", REQUESTS)
+    # Fonts load: the screenshot and its highlight boxes stay as on a real visit
+    assert outcomes == ["continued", "continued", "continued", "aborted"]
+    assert stats["blocked_by_type"] == {"tracker": 1}
+    assert stats["bytes_saved_estimate"] == profiles.BLOCKED_SIZE_ESTIMATES["tracker"]
+
+
+def test_text_profile_blocks_images():
+    stats, outcomes = route_all("text", REQUESTS)
+    assert outcomes == ["continued", "aborted", "aborted", "aborted"]
+    assert stats["blocked"] == 3
+    assert not get_profile("text")["screenshot"]
+
+
+def test_full_profile_routes_nothing():
+    stats, outcomes = route_all("full", REQUESTS)
+    assert outcomes == [None] * 4
+    assert stats["blocked"] == stats["bytes_saved_estimate"] == 0
+
+
+def test_unknown_kind_uses_the_default_estimate(monkeypatch):
+    monkeypatch.setattr(profiles, "EXTRA_BLOCK_TYPES", {"websocket"})
+    stats, _ = route_all("full", [("wss://x.pt/live", "websocket")])
+    assert stats["bytes_saved_estimate"] == profiles.DEFAULT_BLOCKED_SIZE
+
+
+def test_trackers_and_unknown_profiles():
+    assert is_tracker("https://connect.facebook.net/pt_PT/sdk.js")
+    assert not is_tracker("https://notfacebook.net/")
+    with pytest.raises(ValueError):
+        get_profile("turbo")
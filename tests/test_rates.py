@@ -0,0 +1,59 @@
+from backend.dom_index import DomTextIndex
+from backend.rates import ACCOMPANIED, IGNORED, TAEG, UNACCOMPANIED, extract_rates, offer_path, text_index
+
+
+def statuses(html, **kwargs):
+    return [(rate.raw, rate.status) for rate in extract_rates(DomTextIndex.from_html(html, "html.parser"), **kwargs)]
+
+
+def test_rate_labelled_taeg():
+    rates = extract_rates(DomTextIndex.from_html("<p>TAN 6,2% e TAEG 7,5%</p>", "html.parser"))
+    assert [(rate.value, rate.label, rate.status) for rate in rates] == [(6.2, "TAN", ACCOMPANIED), (7.5, "TAEG", TAEG)]
+    assert rates[0].labels == frozenset({"TAN", "TAEG"})
+    assert rates[0].taeg_distance == 0
+
+
+def test_taeg_in_the_table_header_accompanies_its_cells():
+    html = ("<table><thead><tr><th>TAN</th><th>TAEG</th></tr></thead>"
+            "<tbody><tr><td>6,2%</td><td>7,5%</td></tr></tbody></table>")
+    assert statuses(html) == [("6,2%", ACCOMPANIED), ("7,5%", ACCOMPANIED)]
+
+
+def test_proximity_is_counted_in_levels():
+    html = ("<div><section><div><p>TAEG 7,5%</p></div></section>"
+            "<section><div><p><span>Juro 5%</span></p></div></section></div>")
+    # Common ancestor four levels above the rate's <p>
+    assert statuses(html)[-1] == ("5%", UNACCOMPANIED)
+    assert statuses(html, proximity=4)[-1] == ("5%", ACCOMPANIED)
+
+
+def test_separate_offers():
+    # Each card is its own block: the TAEG of the first does not cover the second
+    card = '<div class="card"><div class="body"><div class="price"><p>Taxa de {}</p></div>{}</div></div>'
+    html = ('<div class="offers">' + card.format("5%", '<p class="legal">TAEG 7,5%</p>')
+            + card.format("6%", "") + "</div>")
+    assert statuses(html) == [("5%", ACCOMPANIED), ("7,5%", TAEG), ("6%", UNACCOMPANIED)]
+
+
+def test_percentages_that_are_not_rates():
+    assert statuses("<p>100% Online</p><p>Top 5% dos clientes</p>") == [("100%", IGNORED), ("5%", IGNORED)]
+
+
+def test_offer_path():
+    assert offer_path("html > body > table.rates > tbody > tr:nth-of-type(2) > td") == "html > body > table.rates"
+    assert offer_path("html > body > table:nth-of-type(2) > tr > td") == "html > body > table:nth-of-type(2)"
+    # Nested tables: the innermost one
+    assert offer_path("table > tr > td > table.inner > tr > td") == "table > tr > td > table.inner"
+    assert offer_path("html > body > div.table-wrap > p") == "html > body > div.table-wrap > p"
+    assert offer_path("html > body > tablet > p") == "html > body > tablet > p"
+
+
+def test_text_index_puts_every_line_together():
+    index = text_index("Crédito pessoal\n\nTaxa 5%\nTAEG 7,5%")
+    assert len(index.nodes) == 3
+    assert [rate.status for rate in extract_rates(index)] == [ACCOMPANIED, TAEG]
+
+
+def test_page_without_rates():
+    assert extract_rates(DomTextIndex.from_html("", "html.parser")) == []
+    assert statuses("<p>Sem percentagens</p>") == []
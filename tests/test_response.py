@@ -0,0 +1,68 @@
+import gzip
+import json
+
+from backend.response import RESULT_MAX_LIMIT, compact_result, full_result, json_response, page_issues
+
+
+def issue(rule, severity, url, screenshot, **extra):
+    return dict(rule=rule, description=f"{rule} ({severity})", severity=severity, suggestion="s", context=None,
+                url=url, screenshot=screenshot, **extra)
+
+
+RESULT = {
+    "score": 80, "status": "Requer Atenção", "scanned_pages": 2,
+    "page_tiers": {"https://a.pt/": "http", "https://a.pt/2": "browser"},
+    "reused_pages": ["https://a.pt/2"],
+    "issues": [
+        issue("Identificação de Registo", "success", "https://a.pt/", "a.jpg"),
+        issue("Termo Proibido Detectado", "critical", "https://a.pt/", "a.jpg", location_guide="Tag: <p>"),
+        issue("Falta de TAEG", "high", "https://a.pt/", "crop.jpg"),
+        issue("Identificação de Registo", "success", "https://a.pt/2", "b.jpg"),
+        issue("Falta de TAEG", "high", "https://a.pt/2", "b.jpg"),
+    ],
+}
+
+
+def test_compact_result():
+    compact = compact_result(RESULT)
+    assert compact["pages"] == [{"url": "https://a.pt/", "screenshot": "a.jpg", "tier": "http"},
+                                {"url": "https://a.pt/2", "screenshot": "b.jpg", "tier": "browser", "reused": True}]
+    assert compact["successes"] == {"Identificação de Registo": 2}
+    assert compact["total_issues"] == 3
+    assert [(i["rule"], i["page"], i.get("screenshot")) for i in compact["issues"]] == [
+        ("Termo Proibido Detectado", 0, None), ("Falta de TAEG", 0, "crop.jpg"), ("Falta de TAEG", 1, None)]
+    assert compact["issues"][0]["location_guide"] == "Tag: <p>"
+    assert "context" not in compact["issues"][0]
+
+
+def test_paging():
+    compact = compact_result(RESULT, offset=1, limit=1)
+    assert [(i["rule"], i["page"]) for i in compact["issues"]] == [("Falta de TAEG", 0)]
+    assert (compact["offset"], compact["total_issues"]) == (1, 3)
+
+    full = full_result(RESULT, offset=3)
+    assert [i["url"] for i in full["issues"]] == ["https://a.pt/2", "https://a.pt/2"]
+    assert full["total_issues"] == 5
+    assert full_result(RESULT) is RESULT
+
+
+def test_page_issues_bounds():
+    issues = list(range(RESULT_MAX_LIMIT + 10))
+    assert page_issues(issues, -5, 2) == [0, 1]
+    assert len(page_issues(issues, 0, RESULT_MAX_LIMIT * 2)) == RESULT_MAX_LIMIT
+    assert page_issues(issues, 5, 0) == []
+    assert page_issues([], 3) == []
+
+
+def test_empty_result():
+    compact = compact_result({"score": 100, "status": "Conforme", "scanned_pages": 0, "issues": []})
+    assert (compact["pages"], compact["issues"], compact["successes"]) == ([], [], {})
+
+
+def test_json_response_compression():
+    payload = {"issues": ["Falta de TAEG"] * 200}
+    response = json_response(payload, "gzip, deflate")
+    assert response.headers["content-encoding"] == "gzip"
+    assert json.loads(gzip.decompress(response.body)) == payload
+    assert "content-encoding" not in json_response(payload, "identity").headers
+    assert "content-encoding" not in json_response({"ok": True}, "gzip").headers
@@ -0,0 +1,49 @@
+import os
+import time
+
+from backend.crawler import _screenshot_reusable, _snapshot_document
+from backend.screenshots import ScreenshotStore
+
+
+def stored(store, name, age):
+    path = os.path.join(store.directory, name)
+    with open(path, "wb") as f:
+        f.write(b"x" * 100)
+    os.utime(path, (time.time() - age, time.time() - age))
+    return "screenshots/" + name
+
+
+def test_touched_screenshots_outlive_older_ones(tmp_path):
+    store = ScreenshotStore(str(tmp_path), max_bytes=100, max_age=3600)
+    reused = stored(store, "a.jpg", 600)
+    stored(store, "b.jpg", 60)
+    assert store.touch([reused])
+    store.enforce_retention()
+    assert store.exists(reused)
+    assert not store.exists("screenshots/b.jpg")
+
+
+def test_touch_reports_evicted_screenshots(tmp_path):
+    store = ScreenshotStore(str(tmp_path))
+    assert store.touch(["", None])
+    assert not store.touch([stored(store, "a.jpg", 0), "screenshots/gone.jpg"])
+    assert not store.touch(["api/screenshots/expired"])
+
+
+def test_previous_scan_is_not_reused_once_a_crop_is_gone(tmp_path):
+    store = ScreenshotStore(str(tmp_path))
+    page = stored(store, "page.jpg", 0)
+    previous = {"screenshot": page, "issues": [{"screenshot": page}, {"screenshot": "screenshots/crop.jpg"}]}
+    assert not _screenshot_reusable(previous, "full", store)
+    previous["issues"].pop()
+    assert _screenshot_reusable(previous, "full", store)
+
+
+def test_snapshot_document_cannot_run_scripts():
+    html = ("<html><head><meta http-equiv='refresh' content='0;url=/x'><script>alert(1)</script></head>"
+            "<body onload=\"undo()\"><a href=\" Java&#83;cript:undo()\" class=cta>Simular</a>"
+            "<img src=\"/a.png\" alt=\"1 > 0\" ONERROR='undo()'><a href=\"/legal\">Legal</a></body></html>")
+    document = _snapshot_document(html, "https://x.pt/")
+    assert document == ('<html><head><base href="https://x.pt/"></head>'
+                        "<body><a class=cta>Simular</a>"
+                        "<img src=\"/a.png\" alt=\"1 > 0\"><a href=\"/legal\">Legal</a></body></html>")
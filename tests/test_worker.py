@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+import pytest
+
+from backend import job_queue
+from backend.job_queue import SQLiteJobQueue
+from backend.worker import Worker
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_POLL_INTERVAL", 0.01)
+    return SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"))
+
+
+def work(queue, runner, until):
+    """Runs a one-slot worker until `until()` holds; returns how often the loop got to run meanwhile."""
+    async def main():
+        worker = Worker(queue, runner, slots=1)
+        serving = asyncio.create_task(worker.run())
+        ticks = 0
+        while not until():
+            await asyncio.sleep(0.01)
+            ticks += 1
+        worker.stop()
+        await serving
+        return ticks
+    return asyncio.run(asyncio.wait_for(main(), 10))
+
+
+def test_worker_runs_a_job(queue):
+    async def runner(job, emit):
+        for i in range(3):
+            emit({"type": "page", "n": i})
+            await asyncio.sleep(0)
+        return {"score": 100}
+
+    job = queue.submit("https://a.pt/")
+    work(queue, runner, lambda: queue.status(job.id) == "done")
+    assert queue.get(job.id).result == {"score": 100}
+    events = queue.events_since(job.id, 0)
+    assert [(event["type"], event.get("n")) for event in events] == [
+        ("queued", None), ("started", None), ("page", 0), ("page", 1), ("page", 2), ("done", None)]
+    assert queue.workers() == []
+
+
+def test_slow_queue_writes_do_not_block_the_loop(queue, monkeypatch):
+    emit = queue.emit
+
+    def slow_emit(job_id, event):
+        time.sleep(0.3)  # another process holds the write lock
+        emit(job_id, event)
+
+    monkeypatch.setattr(queue, "emit", slow_emit)
+
+    async def runner(job, emit):
+        emit({"type": "page"})
+        return {"score": 100}
+
+    job = queue.submit("https://a.pt/")
+    ticks = work(queue, runner, lambda: queue.status(job.id) == "done")
+    assert ticks >= 10
+    assert [event["type"] for event in queue.events_since(job.id, 0)] == ["queued", "started", "page", "done"]
+
+
+def test_failed_job(queue):
+    async def runner(job, emit):
+        raise RuntimeError("Chromium caiu")
+
+    job = queue.submit("https://a.pt/")
+    work(queue, runner, lambda: queue.status(job.id) == "failed")
+    assert queue.get(job.id).error == "RuntimeError: Chromium caiu"